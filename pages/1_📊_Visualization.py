@@ -1,7 +1,10 @@
+import os
 import streamlit as st
 from datetime import datetime, timedelta
 import util.visualization_util as viz
 import util.openai_util as openai_util
+import util.curve_shape_util as curve_shape_util
+import util.ai_batch_util as ai_batch_util
 
 # VISUALIZATION PAGE
 st.set_page_config(
@@ -33,23 +36,57 @@ if "ai_summary_trend_response" not in st.session_state:
     st.session_state.ai_summary_trend_response = None
 if "ai_summary_multi_response" not in st.session_state:
     st.session_state.ai_summary_multi_response = None
+if "ai_streams" not in st.session_state:
+    st.session_state.ai_streams = {}  # AI requests still streaming, by summary
+
+# Stop AI requests whose answer would no longer match the page
+def cancel_ai_streams(*names):
+    for name in names:
+        stream = st.session_state.ai_streams.pop(name, None)
+        if stream is not None:
+            stream.cancel()
+
+# Answer a prompt: precomputed by the batch job if it is there, otherwise streamed from the API
+def request_ai_summary(name, response_key, prompt, basic=False):
+    cancel_ai_streams(name)
+    precomputed = ai_batch_util.find_summary(prompt, basic)
+    if precomputed is not None:
+        st.session_state[response_key] = precomputed
+    else:
+        st.session_state.ai_streams[name] = openai_util.start_openai_stream(prompt, basic)
+
+# Show an AI response, streaming it while its request is still running
+def show_ai_response(name, response_key, label):
+    stream = st.session_state.ai_streams.get(name)
+    if stream is not None:
+        with st.expander(label, expanded=True):
+            st.write_stream(stream.stream())
+        st.session_state[response_key] = stream.result()
+        del st.session_state.ai_streams[name]
+    elif st.session_state[response_key]:
+        with st.expander(label):
+            st.markdown(st.session_state[response_key])
 
 # Callback function to update session state
 def update_country():
     st.session_state.country = st.session_state["country_picker"]
     st.session_state.ai_summary_single_response = None
+    cancel_ai_streams("single", "trend", "multi")
 
 def update_selected_date():
     st.session_state.selected_date = datetime.combine(st.session_state["selected_date_picker"], datetime.min.time())
     st.session_state.ai_summary_single_response = None # clear AI summary for the previously selected date
+    cancel_ai_streams("single")
 
 def update_start_date():
     st.session_state.start_date = datetime.combine(st.session_state["start_date_picker"], datetime.min.time())
     st.session_state.ai_summary_trend_response = None
+    cancel_ai_streams("trend", "multi")
 
 def update_end_date():
     st.session_state.end_date = datetime.combine(st.session_state["end_date_picker"], datetime.min.time())
     st.session_state.ai_summary_trend_response = None
+    cancel_ai_streams("trend", "multi")
 
 # Dropdown to select country
 st.sidebar.selectbox(
@@ -105,8 +142,14 @@ if "prev_selected_graphs" not in st.session_state:
 
 if selected_graphs != st.session_state.prev_selected_graphs:
     st.session_state.ai_summary_multi_response = None  # Clear AI response when graphs change
+    cancel_ai_streams("multi")
     st.session_state.prev_selected_graphs = selected_graphs  # Update stored graphs
 
+# Query cache counters (set SHOW_CACHE_STATS=1 to display)
+if os.getenv("SHOW_CACHE_STATS") == "1":
+    with st.sidebar.expander("Query cache"):
+        st.json(viz.query_cache_stats())
+
 # Main page -------------------------------------
 st.title(st.session_state.country)
 
@@ -124,34 +167,36 @@ if df is not None:
 if df is not None:
     df_filtered = viz.select_yield_for_one_day(df, st.session_state.selected_date, st.session_state.country)
     if df_filtered is not None and not df_filtered.empty:
+        # Shape of the curve, precomputed for every day
+        shape = curve_shape_util.shape_on(st.session_state.country, st.session_state.selected_date, viz.get_store())
+        if shape is not None:
+            st.markdown(f"**Curve shape:** {curve_shape_util.shape_names[shape]}")
         
         if st.button("💡 AI Summary", key="ai_summary_single"):
-            # Call OpenAI API and get response
-            prompt = openai_util.generate_prompt_for_a_single_day(df_filtered, st.session_state.selected_date, st.session_state.country)
-            with st.status("🔄 Analyzing the Yield Curve...", expanded=False):
-                st.session_state.ai_summary_single_response = openai_util.get_openai_response(prompt, basic=True)
-
-if st.session_state.ai_summary_single_response:
-    # Display response in an expander
-    with st.expander("📊 AI-Generated Analysis"):
-        st.markdown(st.session_state.ai_summary_single_response)
+            # Call OpenAI API in the background and stream its response
+            prompt = openai_util.generate_prompt_for_a_single_day(df_filtered, st.session_state.selected_date, st.session_state.country, shape)
+            request_ai_summary("single", "ai_summary_single_response", prompt, basic=True)
+
+# Display response in an expander
+show_ai_response("single", "ai_summary_single_response", "📊 AI-Generated Analysis")
         
 
 # 2. Visualization for a period:
 st.header("Visualization for a Selected Period")
 summary_for_prompt = []
+trend_sections = []  # (title, columns) of each summary, for the multi-factor prompt
 
 if "invalid_date" not in st.session_state or st.session_state.invalid_date == False:
-    tab1, tab2, tab3, tab4 = st.tabs(["📈 Yield Curve Trends", "🌍 3D Yield Curve", "🔥 Yield Curve Heatmap", "🎞️ Yield Curve Animation"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📈 Yield Curve Trends", "🌍 3D Yield Curve", "🔥 Yield Curve Heatmap", "🎞️ Yield Curve Animation", "🧭 Yield Curve Shapes"])
     # Line plot of yield curve trends
     title = f"{st.session_state.country} Government Bond Yield Trends by Maturity"
     with tab1:
        st.markdown(f"##### **{title}**")
        required_columns = viz.yield_columns[st.session_state.country]
-       df_filtered_yields = viz.filter_dataframe(df, st.session_state.start_date, st.session_state.end_date, required_columns=required_columns)
+       df_filtered_yields = viz.load_chart_series(required_columns, st.session_state.start_date, st.session_state.end_date)
        # Remove suffix _Close
        required_columns = [col.replace("_Close", "") for col in required_columns]
-       df_filtered_yields.columns = [col.replace("_Close", "") for col in df_filtered_yields.columns]
+       df_filtered_yields = df_filtered_yields.rename(columns=lambda col: col.replace("_Close", ""))
        viz.plot_multiple_lines(df_filtered_yields, st.session_state.start_date, st.session_state.end_date, required_columns, title, is_filtered=True)
     # 3D yield curve
     with tab2:
@@ -165,24 +210,26 @@ if "invalid_date" not in st.session_state or st.session_state.invalid_date == Fa
     with tab4:
         st.markdown(f"##### **{st.session_state.country} Government Bond Yield Curve Animation**")
         viz.plot_animated_yield_curve(df, st.session_state.country, st.session_state.start_date, st.session_state.end_date, st.session_state.selected_date)
+    # Shape regimes over the period
+    with tab5:
+        st.markdown(f"##### **{st.session_state.country} Government Bond Yield Curve Shapes**")
+        regimes = curve_shape_util.shape_regimes(st.session_state.country, st.session_state.start_date, st.session_state.end_date, viz.get_store())
+        viz.plot_shape_regimes(regimes, curve_shape_util.shape_names)
 
     # Summary of key trends
     required_columns = viz.yield_columns[st.session_state.country]
-    df_filtered = viz.filter_dataframe(df, st.session_state.start_date, st.session_state.end_date, required_columns)
-    summary_yield_curve_key_trends = openai_util.summarize_basic_trends(df_filtered, st.session_state.start_date, st.session_state.end_date, title)
+    summary_yield_curve_key_trends = openai_util.summarize_trends(required_columns, st.session_state.start_date, st.session_state.end_date, title, viz.get_store()) or "No data to analyze."
     summary_for_prompt.append(summary_yield_curve_key_trends)
+    trend_sections.append((title, required_columns))
     with st.expander("📑 Key Trend Insights"):
         st.markdown(summary_yield_curve_key_trends)
 
     # Get AI Summary for the whole yield curve during this period
     if st.button("💡 AI Summary", key="ai_summary_trend"):
         prompt_trend = openai_util.generate_yield_curve_trend_prompt(st.session_state.country, st.session_state.start_date, st.session_state.end_date, summary_yield_curve_key_trends)
-        with st.status("🔄 Analyzing the Yield Curve over a period...", expanded=False):
-            st.session_state.ai_summary_trend_response = openai_util.get_openai_response(prompt_trend)
+        request_ai_summary("trend", "ai_summary_trend_response", prompt_trend)
 
-    if st.session_state.ai_summary_trend_response:
-        with st.expander("📊 AI Analysis (Trend)"):
-            st.markdown(st.session_state.ai_summary_trend_response)
+    show_ai_response("trend", "ai_summary_trend_response", "📊 AI Analysis (Trend)")
 
     st.divider()
     # Plot additional graphs
@@ -194,22 +241,24 @@ if "invalid_date" not in st.session_state or st.session_state.invalid_date == Fa
         if sg in viz.yield_mapping:
             title = f"{st.session_state.country} {viz.yield_mapping[sg]['title']}"
             st.markdown(f"##### **{title}**")
-            df_y = viz.filter_ticker_columns(df, viz.yield_mapping[sg][st.session_state.country])
-            ma_columns = viz.find_moving_average_columns(df_y)
-            required_columns = ["Close"] + list(ma_columns.values())
-            viz.plot_multiple_lines(df_y, st.session_state.start_date, st.session_state.end_date, required_columns, title)
+            ticker = viz.yield_mapping[sg][st.session_state.country]
+            required_columns = ["Close"] + viz.moving_average_columns()
+            df_y_chart = viz.load_chart_with_moving_averages(ticker, st.session_state.start_date, st.session_state.end_date)
+            viz.plot_multiple_lines(df_y_chart, st.session_state.start_date, st.session_state.end_date, required_columns, title, is_filtered=True)
         
         # Special case for China Loan Prime Rate
         elif st.session_state.country == "China" and sg == "Loan Prime Rate":
             st.markdown("##### **China Loan Prime Rate**")
-            df_china_loan = viz.load_data("data/combined_data/china_loan_prime_rate_combined.csv")
-            df_china_loan_filtered = viz.filter_data_by_frequency(df_china_loan, st.session_state.start_date, st.session_state.end_date, "monthly")
+            df_china_loan_filtered = viz.query_data("data/combined_data/china_loan_prime_rate_combined.csv", st.session_state.start_date, st.session_state.end_date, frequency="monthly")
             required_columns_china_loan = ["CHLRLPR1_Last Price", "CHLRLPR5_Last Price"]
             viz.plot_multiple_lines(df_china_loan_filtered, st.session_state.start_date, st.session_state.end_date, required_columns_china_loan, "China Loan Prime Rate", is_filtered=True)
 
             if df_china_loan_filtered is not None and not df_china_loan_filtered.empty:
-                summary_china_loan = openai_util.summarize_basic_trends(df_china_loan_filtered, st.session_state.start_date, st.session_state.end_date, "China Loan Prime Rate")
+                # Summarize the same whole months the chart shows
+                lower, upper = viz.frequency_range(st.session_state.start_date, st.session_state.end_date, "monthly")
+                summary_china_loan = openai_util.summarize_trends(required_columns_china_loan, lower, upper, "China Loan Prime Rate", viz.get_store()) or "No data to analyze."
                 summary_for_prompt.append(summary_china_loan)
+                trend_sections.append(("China Loan Prime Rate", required_columns_china_loan))
                 with st.expander("📑 Key Trend Insights"):
                     st.markdown(summary_china_loan)
         
@@ -217,14 +266,14 @@ if "invalid_date" not in st.session_state or st.session_state.invalid_date == Fa
         elif sg in viz.multiple_lines_mapping:
             title = viz.multiple_lines_mapping[sg]["title"]
             st.markdown(f"##### **{title}**")
-            df_temp = viz.load_data(viz.multiple_lines_mapping[sg]["file_path"])
             required_columns = viz.multiple_lines_mapping[sg]["required_columns"]
-            df_temp_filtered = viz.filter_dataframe(df_temp, st.session_state.start_date, st.session_state.end_date, required_columns)
-            viz.plot_multiple_lines(df_temp_filtered, st.session_state.start_date, st.session_state.end_date, required_columns, title, is_filtered=True)
+            df_temp_chart = viz.load_chart_series(required_columns, st.session_state.start_date, st.session_state.end_date)
+            viz.plot_multiple_lines(df_temp_chart, st.session_state.start_date, st.session_state.end_date, required_columns, title, is_filtered=True)
 
-            if df_temp_filtered is not None and not df_temp_filtered.empty:
-                summary_temp = openai_util.summarize_basic_trends(df_temp_filtered, st.session_state.start_date, st.session_state.end_date, title)
+            summary_temp = openai_util.summarize_trends(required_columns, st.session_state.start_date, st.session_state.end_date, title, viz.get_store())
+            if summary_temp:
                 summary_for_prompt.append(summary_temp)
+                trend_sections.append((title, required_columns))
                 with st.expander("📑 Key Trend Insights"):
                     st.markdown(summary_temp)
 
@@ -232,16 +281,15 @@ if "invalid_date" not in st.session_state or st.session_state.invalid_date == Fa
         elif sg in viz.multiple_lines_mapping_with_ma:
             title = viz.multiple_lines_mapping_with_ma[sg]["title"]
             st.markdown(f"##### **{title}**")
-            df_temp = viz.load_data(viz.multiple_lines_mapping_with_ma[sg]["file_path"])
-            df_temp.columns = [col.replace("on Close", "").strip() for col in df_temp.columns]
-            ma_columns = viz.find_moving_average_columns(df_temp)
-            required_columns = ["Close"] + list(ma_columns.values())
-            df_temp_filtered = viz.filter_dataframe(df_temp, st.session_state.start_date, st.session_state.end_date, required_columns)
-            viz.plot_multiple_lines(df_temp_filtered, st.session_state.start_date, st.session_state.end_date, required_columns, title, is_filtered=True)
+            ticker = viz.multiple_lines_mapping_with_ma[sg]["ticker"]
+            required_columns = ["Close"] + viz.moving_average_columns()
+            df_temp_chart = viz.load_chart_with_moving_averages(ticker, st.session_state.start_date, st.session_state.end_date)
+            viz.plot_multiple_lines(df_temp_chart, st.session_state.start_date, st.session_state.end_date, required_columns, title, is_filtered=True)
 
-            if df_temp_filtered is not None and not df_temp_filtered.empty:
-                summary_temp = openai_util.summarize_basic_trends(df_temp_filtered, st.session_state.start_date, st.session_state.end_date, title)
+            summary_temp = openai_util.summarize_trends([f"{ticker}_Close"], st.session_state.start_date, st.session_state.end_date, title, viz.get_store())
+            if summary_temp:
                 summary_for_prompt.append(summary_temp)
+                trend_sections.append((title, [f"{ticker}_Close"]))
                 with st.expander("📑 Key Trend Insights"):
                     st.markdown(summary_temp)
 
@@ -252,13 +300,15 @@ if "invalid_date" not in st.session_state or st.session_state.invalid_date == Fa
             col_name = viz.others_mapping[sg][st.session_state.country]["col"]
             frequency = viz.others_mapping[sg][st.session_state.country]["frequency"]
             st.markdown(f"##### **{st.session_state.country} {title}**")
-            df_temp = viz.load_data(file_path)
-            df_temp_filtered = viz.filter_data_by_frequency(df_temp, st.session_state.start_date, st.session_state.end_date, frequency)
+            df_temp_filtered = viz.query_data(file_path, st.session_state.start_date, st.session_state.end_date, frequency=frequency)
             viz.plot_or_show_table(df_temp_filtered, col_name, st.session_state.start_date, st.session_state.end_date, frequency, is_filtered=True)
 
             if df_temp_filtered is not None and not df_temp_filtered.empty:
-                summary_temp = openai_util.summarize_basic_trends(df_temp_filtered, st.session_state.start_date, st.session_state.end_date, title)
+                # Summarize the same whole periods the chart shows
+                lower, upper = viz.frequency_range(st.session_state.start_date, st.session_state.end_date, frequency)
+                summary_temp = openai_util.summarize_trends(viz.file_columns(file_path), lower, upper, title, viz.get_store()) or "No data to analyze."
                 summary_for_prompt.append(summary_temp)
+                trend_sections.append((title, viz.file_columns(file_path)))
                 with st.expander("📑 Key Trend Insights"):
                     st.markdown(summary_temp)
 
@@ -268,17 +318,15 @@ if "invalid_date" not in st.session_state or st.session_state.invalid_date == Fa
     # Generate the AI Summary button only if additional insights exist
     if len(summary_for_prompt) > 1:
         if st.button("💡 AI Summary (Multi-Factor Analysis)", key="ai_summary_multi"):
-            with st.status("🔄 Generating AI insights for Multi-Factor Analysis...", expanded=False):
-                prompt = openai_util.generate_multi_data_prompt(
-                    st.session_state.country,
-                    st.session_state.start_date.strftime('%d/%m/%Y'),
-                    st.session_state.end_date.strftime('%d/%m/%Y'),
-                    summary_for_prompt
-                )
-                st.session_state.ai_summary_multi_response = openai_util.get_openai_response(prompt)
+            prompt = openai_util.generate_multi_data_prompt(
+                st.session_state.country,
+                st.session_state.start_date,
+                st.session_state.end_date,
+                trend_sections,
+                store=viz.get_store(),
+            )
+            request_ai_summary("multi", "ai_summary_multi_response", prompt)
 
     # Display AI response if available
-    if st.session_state.ai_summary_multi_response:
-        with st.expander("📊 AI Analysis (Multi-Factor Impact)"):
-            st.markdown(st.session_state.ai_summary_multi_response)
+    show_ai_response("multi", "ai_summary_multi_response", "📊 AI Analysis (Multi-Factor Impact)")
 
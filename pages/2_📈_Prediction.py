@@ -1,9 +1,156 @@
 import streamlit as st
+from concurrent.futures import as_completed
+import pandas as pd
+import plotly.graph_objects as go
+import util.visualization_util as viz
+import util.model_util as model_util
+import util.batch_forecast_util as batch_forecast_util
+import util.forecast_server_util as forecast_server_util
 
-# VISUALIZATION PAGE
+# PREDICTION PAGE
+# Forecasts are precomputed by the nightly job (python -m util.batch_forecast_util), or
+# requested from the forecast server when FORECAST_SERVER_URL is set
+# (python -m util.forecast_server_util). Either way this page never loads a model.
+# Server requests run in the background and each section is drawn as its answer arrives.
 st.set_page_config(
     page_title="Prediction",
     page_icon="📈",
 )
 
+# Tuned 1-feature LSTMs, by horizon
+lstm_horizons = {
+    "Next day (5 days of history)": "lstm-1-feature-5i1o-tuned",
+    "Next 5 days (30 days of history)": "lstm-1-feature-30i5o-tuned",
+    "Next 7 days (60 days of history)": "lstm-1-feature-60i7o-tuned",
+    "Next 30 days (90 days of history)": "lstm-1-feature-90i30o-tuned",
+}
+
+# Days of history drawn before the forecast
+history_days = 180
+
+# Side bar -------------------------------------
+if "country" not in st.session_state:
+    st.session_state.country = "Japan"
+
+country = st.sidebar.selectbox(
+    "Select country",
+    ["Japan", "China", "Australia"],
+    index=["Japan", "China", "Australia"].index(st.session_state.country),
+)
+horizon = st.sidebar.selectbox("Forecast horizon", list(lstm_horizons), index=2)
+model_name = lstm_horizons[horizon]
+
+# Main page -------------------------------------
 st.title("Prediction")
+st.header(f"{country} Government Bond Yield Forecast")
+
+columns = viz.yield_columns[country]
+tickers = [col.split("_")[0] for col in columns]
+
+# Forecast chart of the selected horizon
+def draw_point_forecast(df_all):
+    if df_all is None:
+        st.info("Forecasts have not been computed yet. Run `python -m util.batch_forecast_util`.")
+        return
+
+    df_forecast = batch_forecast_util.forecast_points(df_all, tickers, model_name)
+    if df_forecast.empty:
+        st.warning(f"No {horizon.lower()} forecasts available for {country}.")
+        return
+
+    as_of = df_all.loc[df_all["ticker"].isin(tickers) & (df_all["model"] == model_name), "as_of"].max()
+    st.caption(f"Based on data up to {as_of.strftime('%d/%m/%Y')}.")
+
+    # History shown before the forecast
+    df_history = viz.load_series(columns, as_of - pd.Timedelta(days=history_days), as_of)
+
+    fig = go.Figure()
+    for idx, ticker in enumerate(df_forecast.columns):
+        color = viz.plotly_colors[idx % len(viz.plotly_colors)]
+        history = df_history[f"{ticker}_Close"].dropna()
+        fig.add_trace(go.Scatter(x=history.index, y=history, mode="lines", name=ticker, line=dict(color=color)))
+        # Join the forecast to the last observed value
+        forecast = pd.concat([history.iloc[-1:], df_forecast[ticker]])
+        fig.add_trace(go.Scatter(x=forecast.index, y=forecast, mode="lines+markers", name=f"{ticker} (forecast)",
+                                 line=dict(color=color, dash="dash")))
+
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Yield (%)",
+        height=500,
+        margin=dict(t=40, b=40, l=30, r=30),
+        legend_title="Legend",
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("📋 Forecast values"):
+        st.dataframe(viz.format_date_column(df_forecast))
+
+# Probabilistic forecast of the transformers
+def draw_fans(df_all):
+    if df_all is None:
+        return
+    df_fans = df_all[df_all["ticker"].isin(tickers) & df_all["p50"].notna()]
+    if df_fans.empty:
+        return
+
+    st.header("Probabilistic Forecast (Transformer)")
+    fan_tickers = [ticker for ticker in tickers if ticker in set(df_fans["ticker"])]
+    ticker = st.selectbox("Maturity", fan_tickers)
+    fan_models = sorted(set(df_fans.loc[df_fans["ticker"] == ticker, "model"]))
+    fan_model = st.selectbox("Model", fan_models, index=len(fan_models) - 1)
+    df_fan = df_fans[(df_fans["ticker"] == ticker) & (df_fans["model"] == fan_model)].set_index("Date")
+
+    as_of = df_fan["as_of"].max()
+    column = f"{ticker}_Close"
+    history = viz.load_series([column], as_of - pd.Timedelta(days=history_days), as_of)[column].dropna()
+    fig_fan = go.Figure()
+    fig_fan.add_trace(go.Scatter(x=history.index, y=history, mode="lines", name=ticker, line=dict(color=viz.plotly_colors[0])))
+    fig_fan.add_trace(go.Scatter(x=df_fan.index, y=df_fan["p95"], mode="lines", line=dict(width=0), showlegend=False))
+    fig_fan.add_trace(go.Scatter(x=df_fan.index, y=df_fan["p5"], mode="lines", line=dict(width=0), fill="tonexty",
+                                 fillcolor="rgba(99, 110, 250, 0.2)", name="P5-P95"))
+    fig_fan.add_trace(go.Scatter(x=df_fan.index, y=df_fan["p50"], mode="lines+markers", name="P50",
+                                 line=dict(color=viz.plotly_colors[0], dash="dash")))
+    fig_fan.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Yield (%)",
+        height=500,
+        margin=dict(t=40, b=40, l=30, r=30),
+        legend_title="Legend",
+    )
+    st.plotly_chart(fig_fan, use_container_width=True)
+
+# Each section has its own slot so it can be drawn as soon as its forecasts arrive
+sections = [(st.container(), draw_point_forecast), (st.container(), draw_fans)]
+
+if forecast_server_util.server_url:
+    # The LSTM and transformer requests run in the background as separate futures;
+    # whichever completes first is drawn first, while the other keeps its placeholder
+    transformers = model_util.find_models(architecture="time_series_transformer")
+    transformers = transformers[transformers["ticker"].isin(tickers)]
+    section_requests = [
+        [(ticker, model_name) for ticker in tickers],
+        list(zip(transformers["ticker"], transformers["name"])),
+    ]
+    pending = {}
+    for (container, draw), requests in zip(sections, section_requests):
+        if requests:
+            placeholder = container.empty()
+            placeholder.info("Waiting for the forecast server...")
+            pending[forecast_server_util.submit_forecasts(requests)] = (container, placeholder, draw)
+
+    for future in as_completed(pending):
+        container, placeholder, draw = pending[future]
+        placeholder.empty()
+        with container:
+            try:
+                df_all = future.result()
+            except Exception as e:
+                st.warning(f"The forecast server is unavailable ({e}); showing the precomputed forecasts.")
+                df_all = batch_forecast_util.load_forecasts()
+            draw(df_all)
+else:
+    df_all = batch_forecast_util.load_forecasts()
+    for container, draw in sections:
+        with container:
+            draw(df_all)
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import util.store_util as store_util
+import util.model_util as model_util
+import util.openai_util as openai_util
+
+# Run from the repository root: python -m pytest -q
+# Tests that load shipped models are skipped when TensorFlow / onnxruntime are not installed.
+
+
+@pytest.fixture(scope="session")
+def store():
+    return store_util.build_default_store()
+
+
+# A models/ folder holding copies of a few shipped models (exports and fine-tuned
+# versions are written next to the models, so tests never touch the real folder)
+@pytest.fixture
+def models_root(tmp_path, monkeypatch):
+    shipped = model_util.models_dir
+
+    def copy(ticker, *names):
+        folder = tmp_path / "models" / ticker
+        folder.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            for suffix in [".keras", "-scaler.pkl"]:
+                shutil.copy(os.path.join(shipped, ticker, name + suffix), folder)
+
+    monkeypatch.setattr(model_util, "models_dir", str(tmp_path / "models"))
+    return copy
+
+
+# A local stand-in for the OpenAI chat completions endpoint
+class OpenAIStub:
+    """
+    Answers every request with `answer`, streamed word by word (`delay` seconds apart)
+    when asked to stream. `failures` holds (status, headers) answers sent first, in order.
+    """
+
+    def __init__(self, answer="Yields rose across the curve.", delay=0.0):
+        self.answer = answer
+        self.delay = delay
+        self.requests = []
+        self.failures = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append(request)
+                if stub.failures:
+                    status, headers = stub.failures.pop(0)
+                    self.send_json(status, {"error": {"message": "stub error", "type": "stub"}}, headers)
+                    return
+
+                reply = {"id": "stub", "created": 0, "model": request["model"]}
+                if not request.get("stream"):
+                    message = {"role": "assistant", "content": stub.answer}
+                    self.send_json(200, {**reply, "object": "chat.completion",
+                                         "choices": [{"index": 0, "message": message, "finish_reason": "stop"}]})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                try:
+                    for i, word in enumerate(stub.answer.split(" ")):
+                        delta = {"content": word if i == 0 else " " + word}
+                        chunk = {**reply, "object": "chat.completion.chunk",
+                                 "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        time.sleep(stub.delay)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+# openai_util pointed at a stub server, with an empty response cache
+@pytest.fixture
+def openai_stub(tmp_path, monkeypatch):
+    stub = OpenAIStub()
+    monkeypatch.setattr(openai_util, "openai_base_url", stub.url)
+    monkeypatch.setattr(openai_util, "openai_api_key", "test")
+    monkeypatch.setattr(openai_util, "_client", None)
+    monkeypatch.setattr(openai_util, "_response_cache", openai_util.ResponseCache(str(tmp_path / "responses.sqlite")))
+    yield stub
+    stub.server.shutdown()
@@ -0,0 +1,88 @@
+import time
+import asyncio
+import openai
+import pandas as pd
+import pytest
+import util.ai_batch_util as ai_batch_util
+
+
+def test_token_bucket_waits_for_refills():
+    async def timed_acquires():
+        bucket = ai_batch_util.TokenBucket(rate=10, capacity=2)
+        times = []
+        start = time.monotonic()
+        for amount in [1, 1, 1, 5]:
+            await bucket.acquire(amount)
+            times.append(time.monotonic() - start)
+        return times
+
+    times = asyncio.run(timed_acquires())
+    # The full bucket pays for two units at once, then one unit comes every 0.1 s;
+    # an amount above the capacity waits for a full bucket
+    assert times[1] < 0.05
+    assert 0.08 < times[2] < 0.2
+    assert 0.27 < times[3] < 0.45
+
+
+def run_one_job(stub):
+    async def run():
+        client = openai.AsyncOpenAI(api_key="test", base_url=stub.url, max_retries=0)
+        bucket = ai_batch_util.TokenBucket(rate=1000, capacity=1e6)
+        job = {"model": "gpt-4o", "prompt": "Summarize the curve."}
+        try:
+            return await ai_batch_util.run_job(client, job, bucket, bucket, asyncio.Semaphore(1))
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_run_job_retries_with_retry_after_then_backoff(openai_stub, monkeypatch):
+    monkeypatch.setattr(ai_batch_util, "backoff_base", 0.05)
+    retry_delay, delays = ai_batch_util.retry_delay, []
+
+    def recorded_delay(error, attempt):
+        delays.append(retry_delay(error, attempt))
+        return delays[-1]
+
+    monkeypatch.setattr(ai_batch_util, "retry_delay", recorded_delay)
+    openai_stub.failures = [(429, {"Retry-After": "0.2"}), (500, {})]
+
+    assert run_one_job(openai_stub) == openai_stub.answer
+    assert len(openai_stub.requests) == 3
+    # The server's Retry-After first, then exponential backoff with jitter (attempt 1)
+    assert delays[0] == 0.2
+    assert 0.05 <= delays[1] <= 0.1
+
+
+def test_run_job_gives_up_after_max_retries(openai_stub, monkeypatch):
+    monkeypatch.setattr(ai_batch_util, "max_retries", 1)
+    openai_stub.failures = [(429, {"Retry-After": "0"}), (429, {"Retry-After": "0"})]
+    with pytest.raises(openai.RateLimitError):
+        run_one_job(openai_stub)
+    assert len(openai_stub.requests) == 2
+
+
+def test_run_jobs_writes_checkpoints(openai_stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_batch_util, "checkpoint_every", 2)
+    write_summaries, written = ai_batch_util.write_summaries, []
+
+    def recorded_write(rows, path=None):
+        written.append(len(rows))
+        return write_summaries(rows, path)
+
+    monkeypatch.setattr(ai_batch_util, "write_summaries", recorded_write)
+    month_end = pd.Timestamp("2024-10-31")
+    jobs = [
+        {"key": f"key-{i}", "country": "Japan", "kind": "single", "start": month_end, "end": month_end,
+         "model": "gpt-3.5-turbo", "prompt": f"Prompt {i}"}
+        for i in range(5)
+    ]
+
+    path = str(tmp_path / "summaries.arrow")
+    answered, failed = asyncio.run(ai_batch_util.run_jobs(jobs, path))
+    assert len(answered) == 5 and failed == []
+    assert written == [2, 4, 5]
+    table = ai_batch_util.load_summaries(path)
+    assert sorted(table["key"]) == [job["key"] for job in jobs]
+    assert (table["response"] == openai_stub.answer).all()
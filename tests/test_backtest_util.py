@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import util.model_util as model_util
+import util.backtest_util as backtest_util
+
+
+def test_origin_windows_pair_inputs_with_the_following_values():
+    values = np.arange(10.0)
+    dates = pd.date_range("2024-01-01", periods=10).values
+    inputs, targets, origins = backtest_util.origin_windows(values, dates, 3, 2, start_date="2024-01-04", step=1)
+
+    np.testing.assert_array_equal(inputs[0], [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(targets[0], [4.0, 5.0])
+    assert pd.Timestamp(origins[0]) == pd.Timestamp("2024-01-04")
+    assert len(inputs) == len(targets) == len(origins) == 5
+
+
+def test_feature_origin_windows_target_the_next_closes(store):
+    spec = model_util.get_model_spec("GJGB5", features="important-features", input_window=60, output_window=7, tuned=False)
+    inputs, targets, origins = backtest_util.feature_origin_windows(spec, store, start_date="2023-01-01", step=5)
+
+    assert inputs.ndim == 3 and inputs.shape[1] == 60 and len(inputs) == len(targets) == len(origins) > 0
+    assert not np.isnan(inputs).any() and not np.isnan(targets).any()
+    assert pd.Timestamp(origins[0]) >= pd.Timestamp("2023-01-01")
+
+    # The target close is the last input, so the targets are the closes of the following days
+    closes = store.get("GJGB5_Close")["GJGB5_Close"].dropna()
+    position = closes.index.get_loc(pd.Timestamp(origins[0]))
+    np.testing.assert_allclose(inputs[0, :, -1], closes.iloc[position - 59: position + 1])
+    np.testing.assert_allclose(targets[0], closes.iloc[position + 1: position + 8])
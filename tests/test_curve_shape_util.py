@@ -0,0 +1,21 @@
+import numpy as np
+import util.curve_shape_util as curve_shape_util
+
+
+def test_classify_curves_labels_each_shape():
+    # 3M, 2Y, 5Y, 10Y, 30Y
+    curves = np.array([
+        [1.0, 1.5, 2.0, 2.5, 3.0],             # normal
+        [3.0, 2.5, 2.0, 1.5, 1.0],             # inverted
+        [2.0, 2.1, 2.0, 2.2, 2.1],             # flat
+        [1.0, 2.0, 2.5, 2.0, 1.5],             # humped
+        [2.0, 1.0, 0.5, 1.0, 1.5],             # reverse humped
+        [1.0, np.nan, np.nan, np.nan, 2.0],    # too few tenors
+        [np.nan, 1.0, np.nan, 2.0, 3.0],       # normal, from the valid tenors only
+    ])
+    result = curve_shape_util.classify_curves(curves)
+
+    labels = [curve_shape_util.shape_labels[code] if code >= 0 else None for code in result["code"]]
+    assert labels == ["normal", "inverted", "flat", "humped", "reverse humped", None, "normal"]
+    np.testing.assert_allclose(result["slope"][:2], [2.0, -2.0])
+    np.testing.assert_allclose(result["slope"][6], 2.0)
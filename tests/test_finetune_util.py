@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import util.model_util as model_util
+import util.forecast_util as forecast_util
+import util.finetune_util as finetune_util
+import util.backtest_util as backtest_util
+
+
+def test_finetune_writes_a_servable_version(models_root, store, monkeypatch):
+    pytest.importorskip("tensorflow")
+    models_root("GJGB5", "lstm-1-feature-60i7o-tuned")
+    monkeypatch.setattr(finetune_util, "base_trained_until", "2024-06-30")
+    monkeypatch.setattr(forecast_util, "forecast_backend", "keras")
+
+    spec = model_util.get_model_spec("GJGB5", input_window=60, output_window=7)
+    metadata = finetune_util.finetune_model(spec, epochs=1)
+    assert metadata["version"] == 2
+    assert metadata["trained_until"] == "2024-10-31"
+
+    # The version is saved with the (x_scaler, y_scaler) pair the loader expects
+    served = model_util.get_model_spec("GJGB5", input_window=60, output_window=7)
+    assert served["version"] == 2
+    scalers = model_util.load_scaler(served["scaler_path"])
+    closes = store.get("GJGB5_Close")["GJGB5_Close"].dropna()
+    assert scalers.y_scaler.data_max_[0] >= closes.max()
+    assert not hasattr(scalers.x_scaler, "scale_")
+
+    df = forecast_util.forecast_lstm(["GJGB5"], 60, 7, store=store)
+    assert np.isfinite(df.to_numpy()).all()
+    assert backtest_util.served_version(spec) == 2
+
+    monkeypatch.setattr(model_util, "serve_version", "base")
+    assert backtest_util.served_version(spec) == 1
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+import util.model_util as model_util
+import util.forecast_util as forecast_util
+import util.forecast_server_util as forecast_server_util
+
+pytest.importorskip("tensorflow")
+
+
+def test_run_requests_serves_both_lstm_kinds(monkeypatch, store):
+    monkeypatch.setattr(forecast_util, "forecast_backend", "keras")
+    monkeypatch.setattr(model_util, "serve_version", "base")
+    requests = [
+        ("GJGB5", "lstm-1-feature-60i7o-tuned"),
+        ("GJGB5", "lstm-important-features-60i7o"),
+        ("GJGB5", "no-such-model"),
+    ]
+
+    results = forecast_server_util.run_requests(model_util.get_registry(), requests, store)
+    for request in requests[:2]:
+        rows = results[request]
+        assert rows["step"].tolist() == list(range(1, 8))
+        assert np.isfinite(rows["point"]).all()
+        # LSTMs give no bands
+        assert rows[["p5", "p50", "p95"]].isna().all().all()
+    assert isinstance(results[requests[2]], KeyError)
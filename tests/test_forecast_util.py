@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import util.model_util as model_util
+import util.forecast_util as forecast_util
+import util.feature_util as feature_util
+
+
+def test_last_windows_skips_missing_values():
+    values = np.array([
+        [1.0, 10.0],
+        [2.0, np.nan],
+        [np.nan, 30.0],
+        [4.0, 40.0],
+    ])
+    windows, last_rows = forecast_util.last_windows(values, 2)
+    np.testing.assert_array_equal(windows, [[2.0, 4.0], [30.0, 40.0]])
+    np.testing.assert_array_equal(last_rows, [3, 3])
+
+    with pytest.raises(ValueError):
+        forecast_util.last_windows(values, 4)
+
+
+def test_lstm_forecast_with_shipped_scalers(monkeypatch, store):
+    pytest.importorskip("tensorflow")
+    monkeypatch.setattr(forecast_util, "forecast_backend", "keras")
+    monkeypatch.setattr(model_util, "serve_version", "base")
+    tickers = ["GJGB2", "GJGB10"]
+
+    df = forecast_util.forecast_lstm(tickers, 60, 7, store=store)
+    assert df.shape == (7, 2)
+    assert np.isfinite(df.to_numpy()).all()
+
+    # Same numbers as scikit-learn's transform / inverse_transform on the pickled scalers
+    windows, _ = forecast_util.build_windows(store, tickers, 60)
+    for i, ticker in enumerate(tickers):
+        loaded = model_util.get_model(ticker, input_window=60, output_window=7)
+        y_scaler = loaded["scalers"].y_scaler
+        scaled = y_scaler.transform(windows[i].reshape(-1, 1)).reshape(1, 60, 1)
+        output = np.asarray(loaded["model"](scaled.astype(np.float32), training=False)).reshape(-1, 1)
+        expected = y_scaler.inverse_transform(output).ravel()
+        np.testing.assert_allclose(df[f"{ticker}_Close"].to_numpy(), expected, atol=1e-5)
+        # A week ahead stays close to the last close
+        assert np.abs(expected - windows[i, -1]).max() < 1.0
+
+
+def test_lstm_forecast_dates_follow_each_ticker(monkeypatch, store):
+    pytest.importorskip("tensorflow")
+    monkeypatch.setattr(forecast_util, "forecast_backend", "keras")
+    monkeypatch.setattr(model_util, "serve_version", "base")
+
+    # GJGB10's data ends three rows before GJGB2's
+    class ShortStore:
+        def get(self, columns, start=None, end=None):
+            df = store.get(columns, start, end)
+            return df.assign(GJGB10_Close=df["GJGB10_Close"].where(np.arange(len(df)) < len(df) - 3))
+
+    _, last_dates = forecast_util.build_windows(ShortStore(), ["GJGB2", "GJGB10"], 60)
+    df = forecast_util.forecast_lstm(["GJGB2", "GJGB10"], 60, 7, store=ShortStore())
+    for ticker, last_date in zip(["GJGB2", "GJGB10"], last_dates):
+        forecast = df[f"{ticker}_Close"].dropna()
+        assert forecast.index.equals(forecast_util.forecast_dates(last_date, 7))
+    assert last_dates[1] < last_dates[0]
+
+
+def test_feature_lstm_forecast_starts_after_the_matrix(monkeypatch, store):
+    pytest.importorskip("tensorflow")
+    monkeypatch.setattr(forecast_util, "forecast_backend", "keras")
+    monkeypatch.setattr(model_util, "serve_version", "base")
+    spec = model_util.get_model_spec("GJGB5", features="important-features", input_window=60, output_window=7, tuned=False)
+
+    df = forecast_util.forecast_feature_lstm(spec, store=store)
+    _, dates = feature_util.feature_windows(spec, store=store)
+    assert df.columns.tolist() == ["GJGB5_Close"]
+    assert df.index.equals(forecast_util.forecast_dates(dates[-1], 7))
+    assert np.isfinite(df.to_numpy()).all()
@@ -0,0 +1,39 @@
+import pytest
+import util.model_util as model_util
+import util.onnx_util as onnx_util
+import util.forecast_util as forecast_util
+
+pytest.importorskip("tensorflow")
+pytest.importorskip("tf2onnx")
+pytest.importorskip("onnxruntime")
+
+
+def test_export_matches_keras(models_root, store):
+    models_root("GJGB5", "lstm-1-feature-60i7o-tuned", "lstm-important-features-60i7o")
+
+    exported = onnx_util.export_all()
+    assert len(exported) == 2
+
+    for spec in model_util.find_models(architecture="lstm").to_dict("records"):
+        result = onnx_util.check_parity(spec, n_windows=16, store=store)
+        assert result["max_abs_diff"] < 1e-4, spec["name"]
+
+
+def test_check_all_covers_every_export(models_root):
+    models_root("GJGB10", "lstm-1-feature-30i5o-tuned")
+    onnx_util.export_all()
+
+    results = onnx_util.check_all()
+    assert [result["ok"] for result in results] == [True]
+
+
+def test_onnx_backend_matches_keras_backend(models_root, store, monkeypatch):
+    models_root("GJGB2", "lstm-1-feature-60i7o-tuned")
+    models_root("GJGB10", "lstm-1-feature-60i7o-tuned")
+    onnx_util.export_all()
+
+    monkeypatch.setattr(forecast_util, "forecast_backend", "keras")
+    expected = forecast_util.forecast_lstm(["GJGB2", "GJGB10"], 60, 7, store=store)
+    monkeypatch.setattr(forecast_util, "forecast_backend", "onnx")
+    actual = forecast_util.forecast_lstm(["GJGB2", "GJGB10"], 60, 7, store=store)
+    assert (abs(actual - expected) < 1e-4).all().all()
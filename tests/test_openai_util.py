@@ -0,0 +1,80 @@
+import time
+import util.openai_util as openai_util
+
+
+def test_response_cache_expires_and_evicts(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(openai_util.time, "time", lambda: now[0])
+    cache = openai_util.ResponseCache(str(tmp_path / "responses.sqlite"), ttl=60, max_entries=2)
+
+    cache.put("a", "gpt-4o", 0.2, "answer a")
+    now[0] += 1
+    cache.put("b", "gpt-4o", 0.2, "answer b")
+    now[0] += 1
+    assert cache.get("a") == "answer a"  # a is now more recently used than b
+
+    # A third entry evicts the least recently used one
+    now[0] += 1
+    cache.put("c", "gpt-4o", 0.2, "answer c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "answer a"
+
+    # Entries expire ttl seconds after they were written, however often they are read
+    now[0] += 60
+    assert cache.get("a") is None
+    assert cache.get("c") == "answer c"
+
+
+def test_response_key_covers_model_prompt_and_settings():
+    key = openai_util.response_key("gpt-4o", "prompt", 0.2)
+    assert key == openai_util.response_key("gpt-4o", "prompt", 0.2, openai_util.max_response_tokens)
+    assert key.startswith("gpt-4o:") and key.endswith(":0.2")
+    assert key != openai_util.response_key("gpt-3.5-turbo", "prompt", 0.2)
+    assert key != openai_util.response_key("gpt-4o", "other prompt", 0.2)
+    assert key != openai_util.response_key("gpt-4o", "prompt", 0.7)
+    assert key != openai_util.response_key("gpt-4o", "prompt", 0.2, max_tokens=100)
+
+
+def cached_answer(prompt):
+    key = openai_util.response_key(openai_util.response_model(), prompt, openai_util.response_temperature)
+    return openai_util.get_response_cache().get(key)
+
+
+def test_stream_delivers_the_tokens_and_caches_the_answer(openai_stub):
+    response = openai_util.start_openai_stream("Summarize the curve.")
+    pieces = list(response.stream())
+    assert len(pieces) > 1 and "".join(pieces) == openai_stub.answer
+    assert response.result() == openai_stub.answer
+    response.shared.future.result(timeout=10)
+    assert cached_answer("Summarize the curve.") == openai_stub.answer
+
+    # The same prompt is answered from the cache
+    again = openai_util.start_openai_stream("Summarize the curve.")
+    assert "".join(again.stream()) == openai_stub.answer
+    assert len(openai_stub.requests) == 1
+
+
+def test_identical_concurrent_requests_share_one_call(openai_stub):
+    openai_stub.delay = 0.05
+    first = openai_util.start_openai_stream("Summarize the curve.")
+    second = openai_util.start_openai_stream("Summarize the curve.")
+    assert second.shared is first.shared
+
+    # Cancelling one caller leaves the call running for the other
+    first.cancel()
+    assert first.cancelled() and list(first.stream()) == []
+    assert "".join(second.stream()) == openai_stub.answer
+    assert len(openai_stub.requests) == 1
+
+
+def test_cancel_stops_the_request_and_caches_nothing(openai_stub):
+    openai_stub.delay = 0.2
+    response = openai_util.start_openai_stream("Summarize the curve.")
+    assert next(response.stream()) == "Yields"
+    response.cancel()
+    assert response.cancelled() and response.shared.future.cancelled()
+    assert list(response.stream()) == []
+
+    time.sleep(1.5)  # past the end of the stub's answer
+    assert cached_answer("Summarize the curve.") is None
+    assert not openai_util._inflight
@@ -0,0 +1,13 @@
+import util.pyramid_util as pyramid_util
+
+
+def test_choose_level_returns_the_coarsest_level_with_enough_points(monkeypatch):
+    # 20 years: every level gives more than 100 points, so the coarsest one is used
+    assert pyramid_util.choose_level("2000-01-01", "2019-12-31", 100) == "quarterly"
+    assert pyramid_util.choose_level("2000-01-01", "2019-12-31", 400) == "monthly"
+    assert pyramid_util.choose_level("2000-01-01", "2019-12-31", 2000) == "weekly"
+    assert pyramid_util.choose_level("2019-01-01", "2019-12-31", 2000) is None
+
+    # The order of the settings does not matter
+    monkeypatch.setattr(pyramid_util, "pyramid_levels", {"weekly": 7.0, "monthly": 30.44, "quarterly": 91.31})
+    assert pyramid_util.choose_level("2000-01-01", "2019-12-31", 100) == "quarterly"
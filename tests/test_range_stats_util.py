@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import util.range_stats_util as range_stats_util
+
+
+def test_sparse_table_matches_brute_force():
+    values = np.random.default_rng(0).normal(size=37)
+    min_table = range_stats_util.SparseTable(values, np.minimum)
+    max_table = range_stats_util.SparseTable(values, np.maximum)
+    for lo in range(len(values)):
+        for hi in range(lo, len(values)):
+            assert min_table.query(lo, hi) == values[lo: hi + 1].min()
+            assert max_table.query(lo, hi) == values[lo: hi + 1].max()
+
+
+def test_range_stats_index_skips_missing_values():
+    dates = pd.date_range("2024-01-01", periods=6).values.astype("datetime64[ns]").view(np.int64)
+    values = np.array([3.0, np.nan, 1.0, 5.0, np.nan, 2.0])
+    index = range_stats_util.RangeStatsIndex(dates, values)
+
+    stats = index.query("2024-01-02", "2024-01-05")
+    assert (stats["count"], stats["first"], stats["last"]) == (2, 1.0, 5.0)
+    assert (stats["min"], stats["max"]) == (1.0, 5.0)
+    assert stats["first_date"] == pd.Timestamp("2024-01-03").value
+
+    assert index.query()["count"] == 4
+    assert index.query("2024-01-05", "2024-01-05") is None
+    assert index.query("2025-01-01") is None
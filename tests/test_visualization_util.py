@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+import util.visualization_util as viz
+
+
+def test_frequency_bounds_cover_whole_periods():
+    start, end = pd.Timestamp("2024-11-13"), pd.Timestamp("2024-12-18")
+    assert viz.frequency_bounds(start, end, "daily") == (pd.Timestamp("2024-11-13"), pd.Timestamp("2024-12-19"))
+    # 2024-11-13 is a Wednesday, 2024-12-18 too
+    assert viz.frequency_bounds(start, end, "weekly") == (pd.Timestamp("2024-11-11"), pd.Timestamp("2024-12-23"))
+    assert viz.frequency_bounds(start, end, "monthly") == (pd.Timestamp("2024-11-01"), pd.Timestamp("2025-01-01"))
+    assert viz.frequency_bounds(start, end, "quarterly") == (pd.Timestamp("2024-10-01"), pd.Timestamp("2025-01-01"))
+    assert viz.frequency_bounds(start, end, "yearly") == (pd.Timestamp("2024-01-01"), pd.Timestamp("2025-01-01"))
+    assert viz.frequency_bounds(start, end, "hourly") == (None, None)
+
+    # Inclusive form used by the trend summaries
+    assert viz.frequency_range(start, end, "quarterly") == (pd.Timestamp("2024-10-01"), pd.Timestamp("2024-12-31"))
+    assert viz.frequency_range(start, end, "hourly") == (None, None)
+
+
+def test_minmax_indices_keep_each_bucket_extremes():
+    values = np.sin(np.linspace(0, 20, 1000))
+    values[[100, 700]] = [5.0, -5.0]
+    values[300:310] = np.nan
+    positions = viz.minmax_indices(values, 50)
+
+    assert len(positions) <= 102
+    assert {0, 999, 100, 700} <= set(positions)
+    assert not np.isnan(values[positions]).any()
+    for bucket in range(50):
+        lo, hi = bucket * 20, bucket * 20 + 20
+        picked = values[positions[(positions >= lo) & (positions < hi)]]
+        assert np.nanmin(values[lo:hi]) in picked and np.nanmax(values[lo:hi]) in picked
+
+    # Short series are kept whole (without their gaps)
+    np.testing.assert_array_equal(viz.minmax_indices([1.0, np.nan, 2.0], 50), [0, 2])
+
+
+def test_downsample_minmax_keeps_rows_in_order():
+    df = pd.DataFrame(
+        {"a": np.arange(1000.0), "b": np.cos(np.arange(1000.0))},
+        index=pd.date_range("2000-01-01", periods=1000, name="Date"),
+    )
+    sampled = viz.downsample_minmax(df, target_points=100)
+    assert len(sampled) < len(df)
+    assert sampled.index.is_monotonic_increasing
+    assert sampled["a"].iloc[[0, -1]].tolist() == [0.0, 999.0]
+    assert sampled["b"].max() == df["b"].max() and sampled["b"].min() == df["b"].min()
+    assert viz.downsample_minmax(df, target_points=2000) is df
+
+
+def test_cached_frames_reject_writes():
+    start, end = pd.Timestamp("2020-01-01"), pd.Timestamp("2020-12-31")
+    frames = [
+        viz.load_shared_data("data/combined_data/japan_full_yields_only.csv"),
+        viz.query_data("data/combined_data/japan_full_yields_only.csv", start, end),
+        viz.query_data("data/combined_data/china_loan_prime_rate_combined.csv", start, end, frequency="monthly"),
+        viz.load_series(["GJGB2_Close"], start, end),
+    ]
+    for df in frames:
+        with pytest.raises(ValueError):
+            df.iloc[0, 0] = 0.0
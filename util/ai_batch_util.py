@@ -0,0 +1,263 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import openai
+import util.cache_util as cache_util
+import util.query_util as query_util
+import util.store_util as store_util
+import util.openai_util as openai_util
+import util.curve_shape_util as curve_shape_util
+import util.mapping_util as mapping_util
+
+# BATCH AI SUMMARIES
+# Precomputes the AI commentary of every month-end for a grid of countries:
+#   python -m util.ai_batch_util --start 2024-01-01 --end 2024-10-31
+# For each (country, month) it builds the same prompts as the Visualization page (the
+# curve on the last trading day, and the trend over the month) and sends them
+# concurrently under a token-bucket rate limit, retrying rate-limit and server errors
+# with exponential backoff. Answers are appended to one table keyed by the response
+# cache key, so the page finds a precomputed answer for the same prompt instantly and a
+# rerun of the job only sends the prompts it has not answered yet.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Where the answers are kept (override with AI_SUMMARY_TABLE)
+summary_table_path = os.getenv("AI_SUMMARY_TABLE", "data/ai_summaries/summaries.arrow")
+
+# 1.2. Columns of the table
+summary_columns = ["key", "country", "kind", "start", "end", "model", "response", "created"]
+
+# 1.3. API limits of the account (override with AI_REQUESTS_PER_MINUTE / AI_TOKENS_PER_MINUTE)
+requests_per_minute = float(os.getenv("AI_REQUESTS_PER_MINUTE", "60"))
+tokens_per_minute = float(os.getenv("AI_TOKENS_PER_MINUTE", "60000"))
+
+# 1.4. Requests in flight at once, and retries of a failed request
+max_concurrency = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+max_retries = 5
+backoff_base = 1.0  # seconds, doubled on every retry
+backoff_max = 60.0
+
+# 1.5. Errors worth retrying
+retryable_errors = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+# 1.6. Answers written every this many completions (a crash loses little)
+checkpoint_every = 20
+
+# 1.7. Loaded tables
+table_cache = query_util.LRUCache(max_entries=2)
+
+# 2. RATE LIMITING-------------------------------------
+class TokenBucket:
+    """
+    Holds up to `capacity` units and refills at `rate` units per second; acquire()
+    waits until enough units are available. One bucket limits requests, another tokens.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    # 2.1. Wait for `amount` units (amounts above the capacity wait for a full bucket)
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+# 2.2. Tokens a request may use (its prompt plus the longest answer)
+def estimate_tokens(prompt, model="gpt-4o", max_tokens=None):
+    return openai_util.count_tokens(openai_util.system_prompt + prompt, model) + (max_tokens or openai_util.max_response_tokens)
+
+# 2.3. Seconds to wait before retrying (the server's Retry-After when it sends one)
+def retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(backoff_max, float(retry_after))
+    except (TypeError, ValueError):
+        return min(backoff_max, backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+# 3. JOBS-------------------------------------
+# 3.1. Last trading day of every month of a country between two dates
+def month_ends(country, start_date, end_date, store):
+    dates = store.get(mapping_util.yield_columns[country], start_date, end_date).index
+    return pd.DatetimeIndex(dates.to_series().groupby(dates.to_period("M")).max().to_numpy())
+
+# 3.2. Prompts of a (country, month) grid, built as on the Visualization page
+def build_jobs(countries, start_date, end_date, store=None):
+    """
+    Returns:
+        list: One dict per prompt with key, country, kind ("single" or "trend"), start,
+        end, model and prompt.
+    """
+    store = store or store_util.build_default_store()
+    jobs = []
+    for country in countries:
+        columns = mapping_util.yield_columns[country]
+        for month_end in month_ends(country, start_date, end_date, store):
+            month_end = month_end.to_pydatetime()
+            month_start = month_end.replace(day=1)
+
+            # Curve on the month-end (the page's single-day summary, GPT-3.5)
+            df_day = store.get(columns, month_end, month_end)
+            shape = curve_shape_util.shape_on(country, month_end, store)
+            prompt = openai_util.generate_prompt_for_a_single_day(df_day, month_end, country, shape)
+            jobs.append({"country": country, "kind": "single", "start": month_end, "end": month_end,
+                         "model": openai_util.response_model(basic=True), "prompt": prompt})
+
+            # Trend over the month (the page's period summary, GPT-4o)
+            title = f"{country} Government Bond Yield Trends by Maturity"
+            summary = openai_util.summarize_trends(columns, month_start, month_end, title, store) or "No data to analyze."
+            prompt = openai_util.generate_yield_curve_trend_prompt(country, month_start, month_end, summary)
+            jobs.append({"country": country, "kind": "trend", "start": month_start, "end": month_end,
+                         "model": openai_util.response_model(basic=False), "prompt": prompt})
+
+    for job in jobs:
+        job["key"] = openai_util.response_key(job["model"], job["prompt"], openai_util.response_temperature)
+    return [job for job in jobs if job["prompt"]]
+
+# 3.3. Send one prompt, retrying transient errors
+async def run_job(client, job, request_bucket, token_bucket, semaphore):
+    """
+    Returns:
+        str: The response text.
+
+    Raises:
+        openai.OpenAIError: If the request fails for good (after max_retries retries).
+    """
+    for attempt in range(max_retries + 1):
+        await request_bucket.acquire()
+        await token_bucket.acquire(estimate_tokens(job["prompt"], job["model"]))
+        async with semaphore:
+            try:
+                response = await client.chat.completions.create(
+                    model=job["model"],
+                    messages=[
+                        {"role": "system", "content": openai_util.system_prompt},
+                        {"role": "user", "content": job["prompt"]},
+                    ],
+                    max_tokens=openai_util.max_response_tokens,
+                    temperature=openai_util.response_temperature,
+                )
+                return response.choices[0].message.content.strip()
+            except retryable_errors as e:
+                if attempt == max_retries:
+                    raise
+                delay = retry_delay(e, attempt)
+        await asyncio.sleep(delay)
+
+# 3.4. Run every job concurrently, writing the answers as they arrive
+async def run_jobs(jobs, path=None):
+    client = openai.AsyncOpenAI(api_key=openai_util.openai_api_key, base_url=openai_util.openai_base_url, max_retries=0)
+    request_bucket = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60 * 5))
+    token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 6)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(job):
+        try:
+            return job, await run_job(client, job, request_bucket, token_bucket, semaphore), None
+        except Exception as e:
+            return job, None, e
+
+    answered, failed = [], []
+    try:
+        for next_done in asyncio.as_completed([run(job) for job in jobs]):
+            job, response, error = await next_done
+            if error is not None:
+                failed.append((job, error))
+                continue
+            answered.append({**job, "response": response, "created": datetime.now()})
+            if len(answered) % checkpoint_every == 0:
+                write_summaries(answered, path)
+    finally:
+        write_summaries(answered, path)
+        await client.close()
+    return answered, failed
+
+# 4. TABLE-------------------------------------
+# 4.1. Add answers to the table (a newer answer to the same key replaces the old one)
+def write_summaries(rows, path=None):
+    path = path or summary_table_path
+    if not rows:
+        return None
+    df = pd.DataFrame(rows)[summary_columns]
+    existing = load_summaries(path)
+    if existing is not None:
+        df = pd.concat([existing[~existing["key"].isin(df["key"])], df], ignore_index=True)
+
+    df = df.sort_values(["country", "kind", "end"]).reset_index(drop=True)
+    arrays = [pa.array(df[col].astype(str)) for col in ["key", "country", "kind"]]
+    arrays[1], arrays[2] = arrays[1].dictionary_encode(), arrays[2].dictionary_encode()
+    arrays += [pa.array(pd.to_datetime(df[col]).to_numpy(dtype="datetime64[ns]"), type=pa.timestamp("ns")) for col in ["start", "end"]]
+    arrays += [pa.array(df["model"].astype(str)).dictionary_encode(), pa.array(df["response"].astype(str))]
+    arrays += [pa.array(pd.to_datetime(df["created"]).to_numpy(dtype="datetime64[ns]"), type=pa.timestamp("ns"))]
+    return cache_util.write_arrow(pa.Table.from_arrays(arrays, names=summary_columns), path)
+
+# 4.2. Read the table (None if the job has not run yet)
+def load_summaries(path=None):
+    path = path or summary_table_path
+    version = query_util.dataset_version(path)
+    if version is None:
+        return None
+
+    def compute():
+        df = cache_util.open_arrow(path).to_pandas()
+        for col in ["country", "kind", "model"]:
+            df[col] = df[col].astype(str)
+        return df
+
+    return table_cache.get_or_compute((os.path.abspath(path), version), compute)
+
+# 4.3. Precomputed answer to a prompt (None if the job has not answered it)
+def find_summary(prompt, basic=False, path=None):
+    df = load_summaries(path)
+    if df is None:
+        return None
+    key = openai_util.response_key(openai_util.response_model(basic), prompt, openai_util.response_temperature)
+    match = df.loc[df["key"] == key, "response"]
+    return match.iloc[-1] if not match.empty else None
+
+# 5. JOB-------------------------------------
+# 5.1. Answer every prompt of the grid that the table does not hold yet
+def run_batch(countries=None, start_date=None, end_date=None, force=False, path=None):
+    """
+    Returns:
+        tuple: (number of answers written, list of (job, error) that failed for good).
+    """
+    countries = countries or list(mapping_util.yield_columns)
+    jobs = build_jobs(countries, start_date, end_date)
+    existing = load_summaries(path)
+    if existing is not None and not force:
+        jobs = [job for job in jobs if job["key"] not in set(existing["key"])]
+    if not jobs:
+        return 0, []
+
+    answered, failed = asyncio.run(run_jobs(jobs, path))
+    return len(answered), failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the AI summaries of every month-end.")
+    parser.add_argument("--countries", nargs="*", default=None, help="Only these countries.")
+    parser.add_argument("--start", default=None, help="First month (YYYY-MM-DD).")
+    parser.add_argument("--end", default=None, help="Last month (YYYY-MM-DD).")
+    parser.add_argument("--force", action="store_true", help="Ask again for prompts already answered.")
+    args = parser.parse_args()
+
+    count, failed = run_batch(args.countries, args.start, args.end, args.force)
+    print(f"Wrote {count} summaries into {summary_table_path}")
+    for job, error in failed:
+        print(f"Failed {job['country']} {job['kind']} {job['end'].date()}: {error}")
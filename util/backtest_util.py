@@ -0,0 +1,246 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import util.store_util as store_util
+import util.model_util as model_util
+import util.feature_util as feature_util
+import util.forecast_util as forecast_util
+import util.transformer_util as transformer_util
+import util.batch_forecast_util as batch_forecast_util
+
+# WALK-FORWARD BACKTEST
+# Scores every shipped model on every rolling origin of its ticker's history:
+#   python -m util.backtest_util --start 2022-01-01
+# All (input, target) windows are strided views of one array, so cutting thousands of
+# origins copies nothing; models then run on large batches of origins at once.
+# Multi-feature LSTMs are fed windows of their country's aligned feature matrix.
+# Origins before the end of a model's training data flatter it, so pass --start.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Where the results are written
+backtest_dir = os.getenv("BACKTEST_DIR", "data/backtests")
+
+# 1.2. Origins per inference call for 1-input models (bounds the memory of the scaled
+# copy); models with more inputs take proportionally fewer
+batch_size = 4096
+
+# 1.3. Transformers draw 100 paths per origin: score them on fewer origins
+transformer_batch_size = 64
+transformer_max_origins = 512
+
+# 2. WINDOWS-------------------------------------
+# 2.1. Every (input, target) pair of a series as views, one row per origin
+def origin_windows(values, dates, input_window, output_window, start_date=None, step=1):
+    """
+    Args:
+        values (np.ndarray): The series, without NaN.
+        dates (np.ndarray): Its dates (datetime64).
+        input_window (int): Values the model sees.
+        output_window (int): Values it forecasts.
+        start_date (datetime, optional): First forecast origin (the last input date).
+        step (int): Keep every step-th origin.
+
+    Returns:
+        tuple: (inputs, targets, origin dates); inputs and targets are views of values.
+    """
+    span = input_window + output_window
+    if len(values) < span:
+        empty = np.empty((0, input_window))
+        return empty, np.empty((0, output_window)), dates[:0]
+
+    windows = sliding_window_view(values, span)[::step]
+    origins = dates[input_window - 1: len(dates) - output_window][::step]
+    if start_date is not None:
+        first = np.searchsorted(origins, np.datetime64(pd.Timestamp(start_date)), side="left")
+        windows, origins = windows[first:], origins[first:]
+    return windows[:, :input_window], windows[:, input_window:], origins
+
+# 2.2. History of one ticker from the store
+def ticker_history(store, ticker):
+    column = f"{ticker}_{forecast_util.target_field}"
+    series = store.get(column)[column].dropna()
+    return series.to_numpy(dtype=np.float64), series.index.values
+
+# 2.3. (input, target) pairs of a multi-feature model, from its feature matrix
+def feature_origin_windows(spec, store, start_date=None, step=1):
+    """
+    The target close is the model's last input, so the targets of an origin are the
+    last input values of the next output_window origins. Origins whose inputs or
+    targets have a gap (series not yet published) are dropped.
+
+    Returns:
+        tuple: (inputs of shape (n, input_window, n_inputs), targets, origin dates).
+    """
+    windows, origins = feature_util.feature_windows(spec, all_origins=True, store=store)
+    output_window = spec["output_window"]
+    if len(windows) <= output_window:
+        return windows[:0], np.empty((0, output_window)), origins[:0].values
+
+    closes = windows[:, -1, -1]
+    targets = sliding_window_view(closes[1:], output_window)[: len(windows) - output_window]
+    inputs, origins = windows[: len(targets)], origins.values[: len(targets)]
+    keep = np.zeros(len(targets), dtype=bool)
+    keep[::step] = True
+    if start_date is not None:
+        keep &= origins >= np.datetime64(pd.Timestamp(start_date))
+    keep &= ~np.isnan(targets).any(axis=1)
+    keep[keep] = ~np.isnan(inputs[keep]).any(axis=(1, 2))
+    return inputs[keep], targets[keep], origins[keep]
+
+# 3. PREDICTIONS-------------------------------------
+# 3.1. LSTM forecasts for a batch of origins ((n, window) or (n, window, n_inputs) inputs)
+def predict_lstm(spec, inputs):
+    group = forecast_util.load_lstm_group([spec["ticker"]], spec["input_window"], spec["output_window"], spec["features"], spec["tuned"])
+    chunk = max(1, batch_size // (inputs.shape[2] if inputs.ndim == 3 else 1))
+    chunks = [
+        forecast_util.predict_group(group, inputs[None, lo: lo + chunk])[0]
+        for lo in range(0, len(inputs), chunk)
+    ]
+    return np.concatenate(chunks) if chunks else np.empty((0, spec["output_window"]))
+
+# 3.2. Transformer point forecasts (transformer_util.point_band) for a batch of origins
+def predict_transformer(spec, inputs, input_dates):
+    model = model_util.load_model(spec)["model"]
+    chunks = []
+    for lo in range(0, len(inputs), transformer_batch_size):
+        batch = inputs[lo: lo + transformer_batch_size]
+        batch_dates = [pd.DatetimeIndex(dates) for dates in input_dates[lo: lo + transformer_batch_size]]
+        model_inputs = transformer_util.build_inputs(batch, batch_dates, spec["output_window"])
+        samples = transformer_util.sample_paths(model, model_inputs)
+        chunks.append(transformer_util.summarize_samples(samples)[transformer_util.point_band])
+    return np.concatenate(chunks) if chunks else np.empty((0, spec["output_window"]))
+
+# 3.3. Version a backtest scores: fine-tuned LSTMs are served under their base name
+# (model_util.serve_version), so the version is recorded next to it
+def served_version(spec):
+    if spec["architecture"] != "lstm":
+        return 1
+    served = model_util.get_model_spec(spec["ticker"], "lstm", spec["features"], spec["input_window"], spec["output_window"], spec["tuned"])
+    return served.get("version", 1)
+
+# 4. SCORING-------------------------------------
+# 4.1. Error metrics per horizon step
+def score_forecasts(predictions, targets, last_inputs):
+    """
+    Returns:
+        pd.DataFrame: One row per horizon step with n, rmse, mae and directional_accuracy
+        (share of origins where the forecast moves the same way as the actual value).
+    """
+    errors = predictions - targets
+    predicted_move = np.sign(predictions - last_inputs[:, None])
+    actual_move = np.sign(targets - last_inputs[:, None])
+    return pd.DataFrame({
+        "horizon": np.arange(1, targets.shape[1] + 1),
+        "n": len(targets),
+        "rmse": np.sqrt(np.mean(errors ** 2, axis=0)),
+        "mae": np.mean(np.abs(errors), axis=0),
+        "directional_accuracy": np.mean(predicted_move == actual_move, axis=0),
+    })
+
+# 4.2. Backtest one model (runs inside a worker process)
+def backtest_model(spec, start_date=None, step=1):
+    store = store_util.build_default_store()
+    values, dates = ticker_history(store, spec["ticker"])
+
+    if spec["features"] != "1-feature":
+        inputs, targets, origins = feature_origin_windows(spec, store, start_date, step)
+        predictions = predict_lstm(spec, inputs)
+        inputs = inputs[:, :, -1]
+    elif spec["architecture"] == "lstm":
+        inputs, targets, origins = origin_windows(values, dates, spec["input_window"], spec["output_window"], start_date, step)
+        predictions = predict_lstm(spec, inputs)
+    else:
+        inputs, targets, origins = origin_windows(values, dates, spec["input_window"], spec["output_window"], start_date, step)
+        # The same windows over the dates feed the time features; origins are thinned
+        # evenly over the test period to bound the number of sample paths
+        input_dates, _, _ = origin_windows(dates, dates, spec["input_window"], spec["output_window"], start_date, step)
+        thin = max(1, -(-len(inputs) // transformer_max_origins))
+        inputs, targets, origins, input_dates = inputs[::thin], targets[::thin], origins[::thin], input_dates[::thin]
+        predictions = predict_transformer(spec, inputs, input_dates)
+
+    if len(targets) == 0:
+        return None
+    metrics = score_forecasts(predictions, targets, inputs[:, -1])
+    metrics.insert(0, "version", served_version(spec))
+    metrics.insert(0, "model", spec["name"])
+    metrics.insert(0, "ticker", spec["ticker"])
+    metrics["first_origin"] = pd.Timestamp(origins[0])
+    metrics["last_origin"] = pd.Timestamp(origins[-1])
+    return metrics
+
+# 5. LEADERBOARD-------------------------------------
+# 5.1. Rank the models of each ticker by their average RMSE over the horizon
+def build_leaderboard(metrics):
+    # Only models forecasting the same number of steps are ranked against each other
+    summary = metrics.groupby(["ticker", "model", "version"], as_index=False).agg(
+        horizon=("horizon", "max"),
+        n=("n", "max"),
+        rmse=("rmse", "mean"),
+        mae=("mae", "mean"),
+        directional_accuracy=("directional_accuracy", "mean"),
+    )
+    summary["rank"] = summary.groupby(["ticker", "horizon"])["rmse"].rank(method="min").astype(int)
+    return summary.sort_values(["ticker", "horizon", "rank"]).reset_index(drop=True)
+
+# 5.2. Backtest every model of the given tickers in parallel
+def run_backtest(tickers=None, start_date=None, step=1, max_workers=None, out_dir=None):
+    """
+    A model that fails is left out of the metrics and reported with its error.
+
+    Returns:
+        tuple: (metrics per horizon, leaderboard, list of (spec, error) that failed). The
+        metrics and leaderboard are also written as CSV, and are None if every model failed.
+    """
+    specs = model_util.get_registry()
+    if tickers:
+        specs = specs[specs["ticker"].isin(tickers)]
+    specs = specs.to_dict("records")
+    for spec in specs:
+        spec["scaler_path"] = spec["scaler_path"] if isinstance(spec["scaler_path"], str) else None
+
+    # Feature matrices are built (or brought up to date) once, before the workers read them
+    store = store_util.build_default_store()
+    for country in {feature_util.ticker_country(spec["ticker"]) for spec in specs if spec["features"] != "1-feature"}:
+        feature_util.get_feature_matrix(country, store)
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=batch_forecast_util.limit_threads) as executor:
+        futures = [(spec, executor.submit(backtest_model, spec, start_date, step)) for spec in specs]
+        frames, failed = [], []
+        for spec, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                failed.append((spec, e))
+                continue
+            if result is not None:
+                frames.append(result)
+
+    if not frames:
+        return None, None, failed
+    metrics = pd.concat(frames, ignore_index=True)
+    leaderboard = build_leaderboard(metrics)
+
+    out_dir = out_dir or backtest_dir
+    os.makedirs(out_dir, exist_ok=True)
+    metrics.to_csv(os.path.join(out_dir, "metrics.csv"), index=False)
+    leaderboard.to_csv(os.path.join(out_dir, "leaderboard.csv"), index=False)
+    return metrics, leaderboard, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the shipped models.")
+    parser.add_argument("--tickers", nargs="*", default=None, help="Only these tickers.")
+    parser.add_argument("--start", default=None, help="First forecast origin (YYYY-MM-DD).")
+    parser.add_argument("--step", type=int, default=1, help="Use every step-th origin.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    args = parser.parse_args()
+
+    _, leaderboard, failed = run_backtest(args.tickers, args.start, args.step, args.workers)
+    if leaderboard is not None:
+        print(leaderboard.to_string(index=False))
+    for spec, error in failed:
+        print(f"Failed {spec['path']}: {error}")
+    raise SystemExit(1 if failed or leaderboard is None else 0)
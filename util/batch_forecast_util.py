@@ -0,0 +1,240 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import util.cache_util as cache_util
+import util.query_util as query_util
+import util.store_util as store_util
+import util.model_util as model_util
+import util.forecast_util as forecast_util
+import util.feature_util as feature_util
+import util.transformer_util as transformer_util
+import util.mapping_util as mapping_util
+
+# NIGHTLY FORECAST TABLE
+# Runs every shipped model on the latest data and writes all forecasts into one
+# columnar table, which is all the Prediction page reads. Run after the ingestion job:
+#   python -m util.batch_forecast_util            (only models whose data moved)
+#   python -m util.batch_forecast_util --force    (recompute everything)
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Where the forecast table lives (override with FORECAST_TABLE)
+forecast_table_path = os.getenv("FORECAST_TABLE", "data/forecasts/forecasts.arrow")
+
+# 1.2. Columns of the table
+forecast_columns = ["ticker", "model", "as_of", "step", "Date", "point", "p5", "p50", "p95"]
+
+# 1.3. Loaded tables (the page reads the file once per version)
+table_cache = query_util.LRUCache(max_entries=2)
+
+# 2. TASKS-------------------------------------
+# 2.1. One task per group of models that run in a single call
+def build_tasks(countries=None):
+    """
+    1-feature LSTMs of one country sharing a window and tuned flag are one task
+    (forecast_lstm runs them in one call); each multi-feature LSTM (fed from its
+    country's feature matrix) and each transformer checkpoint is its own task.
+    """
+    registry = model_util.get_registry()
+    tasks = []
+    for country, columns in mapping_util.yield_columns.items():
+        if countries and country not in countries:
+            continue
+        tickers = [col.split("_")[0] for col in columns]
+        models = registry[registry["ticker"].isin(tickers)]
+
+        lstms = models[(models["architecture"] == "lstm") & (models["features"] == "1-feature")]
+        for (input_window, output_window, tuned), group in lstms.groupby(["input_window", "output_window", "tuned"]):
+            tasks.append({
+                "kind": "lstm",
+                "tickers": sorted(group["ticker"], key=tickers.index),
+                "names": dict(zip(group["ticker"], group["name"])),
+                "input_window": int(input_window),
+                "output_window": int(output_window),
+                "tuned": bool(tuned),
+            })
+
+        feature_lstms = models[(models["architecture"] == "lstm") & (models["features"] != "1-feature")]
+        for spec in feature_lstms.to_dict("records"):
+            tasks.append({"kind": "feature_lstm", "tickers": [spec["ticker"]], "names": {spec["ticker"]: spec["name"]}, "spec": spec})
+
+        for spec in models[models["architecture"] == "time_series_transformer"].to_dict("records"):
+            spec["scaler_path"] = None
+            tasks.append({"kind": "transformer", "tickers": [spec["ticker"]], "names": {spec["ticker"]: spec["name"]}, "spec": spec})
+    return tasks
+
+# 2.2. Keep each worker to one thread so the pool does not oversubscribe the cores
+def limit_threads():
+    for var in ["OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS", "MKL_NUM_THREADS"]:
+        os.environ[var] = "1"
+
+# 2.3. Run one task (inside a worker process)
+def run_task(task):
+    """
+    Returns:
+        pd.DataFrame: Rows of the forecast table for the task's tickers.
+    """
+    store = store_util.build_default_store()
+    rows = []
+
+    if task["kind"] == "lstm":
+        df = forecast_util.forecast_lstm(
+            task["tickers"], task["input_window"], task["output_window"], tuned=task["tuned"], store=store
+        )
+        _, last_dates = forecast_util.build_windows(store, task["tickers"], task["input_window"])
+        for ticker, as_of in zip(task["tickers"], last_dates):
+            point = df[f"{ticker}_{forecast_util.target_field}"].dropna()
+            rows.append(pd.DataFrame({
+                "ticker": ticker,
+                "model": task["names"][ticker],
+                "as_of": as_of,
+                "step": np.arange(1, len(point) + 1),
+                "Date": point.index,
+                "point": point.to_numpy(),
+                "p5": np.nan,
+                "p50": np.nan,
+                "p95": np.nan,
+            }))
+    elif task["kind"] == "feature_lstm":
+        ticker, spec = task["tickers"][0], task["spec"]
+        column = f"{ticker}_{forecast_util.target_field}"
+        point = forecast_util.forecast_feature_lstm(spec, store=store)[column]
+        rows.append(pd.DataFrame({
+            "ticker": ticker,
+            "model": spec["name"],
+            "as_of": store.date_bounds(column)[1],
+            "step": np.arange(1, len(point) + 1),
+            "Date": point.index,
+            "point": point.to_numpy(),
+            "p5": np.nan,
+            "p50": np.nan,
+            "p95": np.nan,
+        }))
+    else:
+        ticker, spec = task["tickers"][0], task["spec"]
+        df = transformer_util.forecast_quantiles([(ticker, spec)], store)[(ticker, spec["name"])]
+        column = f"{ticker}_{forecast_util.target_field}"
+        rows.append(pd.DataFrame({
+            "ticker": ticker,
+            "model": spec["name"],
+            "as_of": store.date_bounds(column)[1],
+            "step": np.arange(1, len(df) + 1),
+            "Date": df.index,
+            "point": df[transformer_util.point_band].to_numpy(),
+            "p5": df["p5"].to_numpy(),
+            "p50": df["p50"].to_numpy(),
+            "p95": df["p95"].to_numpy(),
+        }))
+
+    return pd.concat(rows, ignore_index=True)[forecast_columns]
+
+# 2.4. Whether a task's stored forecasts are already based on the latest data
+def is_up_to_date(task, existing, store):
+    if existing is None:
+        return False
+    for ticker in task["tickers"]:
+        stored = existing[(existing["ticker"] == ticker) & (existing["model"] == task["names"][ticker])]
+        last_date = store.date_bounds(f"{ticker}_{forecast_util.target_field}")[1]
+        if stored.empty or stored["as_of"].iloc[0] != last_date:
+            return False
+    return True
+
+# 3. TABLE-------------------------------------
+# 3.1. Write the table (ticker and model names are dictionary-encoded)
+def write_forecasts(df, path=None):
+    path = path or forecast_table_path
+    df = df.sort_values(["ticker", "model", "step"]).reset_index(drop=True)
+    arrays = [
+        pa.array(df["ticker"].astype(str)).dictionary_encode(),
+        pa.array(df["model"].astype(str)).dictionary_encode(),
+        pa.array(df["as_of"].to_numpy(dtype="datetime64[ns]"), type=pa.timestamp("ns")),
+        pa.array(df["step"].to_numpy(dtype=np.int16)),
+        pa.array(df["Date"].to_numpy(dtype="datetime64[ns]"), type=pa.timestamp("ns")),
+    ] + [pa.array(df[col].to_numpy(dtype=np.float32), from_pandas=True) for col in ["point", "p5", "p50", "p95"]]
+    return cache_util.write_arrow(pa.Table.from_arrays(arrays, names=forecast_columns), path)
+
+# 3.2. Read the table (None if the job has not run yet)
+def load_forecasts(path=None):
+    path = path or forecast_table_path
+    version = query_util.dataset_version(path)
+    if version is None:
+        return None
+
+    def compute():
+        df = cache_util.open_arrow(path).to_pandas()
+        df["ticker"] = df["ticker"].astype(str)
+        df["model"] = df["model"].astype(str)
+        return df
+
+    return table_cache.get_or_compute((os.path.abspath(path), version), compute)
+
+# 3.3. Forecasts of some tickers and one model, as a Date x ticker table of points
+def forecast_points(df, tickers, model):
+    rows = df[df["ticker"].isin(tickers) & (df["model"] == model)]
+    return rows.pivot(index="Date", columns="ticker", values="point")[[t for t in tickers if t in set(rows["ticker"])]]
+
+# 4. JOB-------------------------------------
+# 4.1. Recompute the forecasts whose data moved and rewrite the table
+def run_batch(force=False, max_workers=None, countries=None, path=None):
+    """
+    A task that fails keeps the previous forecasts of its models. When every task of a
+    kind ("lstm", "feature_lstm" or "transformer") fails, the run is broken rather than
+    unlucky, and nothing is written.
+
+    Returns:
+        tuple: (number of tasks recomputed, list of (task, error) that failed).
+
+    Raises:
+        RuntimeError: If every task of a kind failed (the table is left unchanged).
+    """
+    store = store_util.build_default_store()
+    existing = load_forecasts(path)
+    tasks = build_tasks(countries)
+    if not force:
+        tasks = [task for task in tasks if not is_up_to_date(task, existing, store)]
+    if not tasks:
+        return 0, []
+
+    # Feature matrices are built (or brought up to date) once, before the workers read them
+    for country in {feature_util.ticker_country(task["tickers"][0]) for task in tasks if task["kind"] == "feature_lstm"}:
+        feature_util.get_feature_matrix(country, store)
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=limit_threads) as executor:
+        futures = [(task, executor.submit(run_task, task)) for task in tasks]
+        frames, failed = [], []
+        for task, future in futures:
+            try:
+                frames.append(future.result())
+            except Exception as e:
+                failed.append((task, e))
+
+    for kind in {task["kind"] for task in tasks}:
+        kind_failures = [(task, e) for task, e in failed if task["kind"] == kind]
+        if len(kind_failures) == sum(task["kind"] == kind for task in tasks):
+            task, error = kind_failures[0]
+            raise RuntimeError(f"Every {kind} task failed ({len(kind_failures)}), e.g. {task['tickers']}: {error}")
+
+    new_rows = pd.concat(frames, ignore_index=True)
+    if existing is not None:
+        refreshed = set(zip(new_rows["ticker"], new_rows["model"]))
+        keep = [pair not in refreshed for pair in zip(existing["ticker"], existing["model"])]
+        new_rows = pd.concat([existing[keep], new_rows], ignore_index=True)
+
+    write_forecasts(new_rows, path)
+    return len(frames), failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the forecasts of every model.")
+    parser.add_argument("--force", action="store_true", help="Recompute forecasts even if the data did not move.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--countries", nargs="*", default=None, help="Only these countries.")
+    args = parser.parse_args()
+
+    count, failed = run_batch(force=args.force, max_workers=args.workers, countries=args.countries)
+    print(f"Recomputed {count} forecast groups into {forecast_table_path}")
+    for task, error in failed:
+        print(f"Failed {task['kind']} {task['tickers']} (previous forecasts kept): {error}")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,208 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Where the converted Arrow files live (override with DATA_CACHE_DIR)
+CACHE_DIR = os.getenv("DATA_CACHE_DIR", "data/cache")
+
+# 1.2. Bump this when the conversion logic changes so old caches are rebuilt
+CACHE_FORMAT_VERSION = 1
+
+# 2. CACHE KEYS-------------------------------------
+# 2.1. Cache file names are derived from the absolute source path
+def get_cache_paths(file_path, cache_dir=None):
+    """
+    Returns (arrow_path, meta_path) for the cached copy of a source file.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    abs_path = os.path.abspath(file_path)
+    key = hashlib.sha1(abs_path.encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(file_path))[0].split(" ")[0]
+    base = os.path.join(cache_dir, f"{stem}-{key}")
+    return base + ".arrow", base + ".json"
+
+# 2.2. Hash of the source file content (only computed when mtime/size changed)
+def file_sha256(file_path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# 2.3. Signature of the source file as seen by the file system
+def source_signature(file_path):
+    stat = os.stat(file_path)
+    return {
+        "source_path": os.path.abspath(file_path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "format_version": CACHE_FORMAT_VERSION,
+    }
+
+# 2.4. Check whether the cached copy still matches the source workbook
+def is_cache_fresh(file_path, arrow_path, meta_path):
+    """
+    The cache is fresh if mtime and size are unchanged. If only the mtime moved
+    (e.g. a fresh git checkout), the content hash decides and the metadata is re-stamped.
+    """
+    if not (os.path.exists(arrow_path) and os.path.exists(meta_path)):
+        return False
+
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    current = source_signature(file_path)
+    if meta.get("format_version") != CACHE_FORMAT_VERSION:
+        return False
+    if meta.get("mtime_ns") == current["mtime_ns"] and meta.get("size") == current["size"]:
+        return True
+
+    # Same bytes, new timestamp: keep the converted file
+    if meta.get("size") == current["size"] and meta.get("sha256") == file_sha256(file_path):
+        current["sha256"] = meta["sha256"]
+        _write_json_atomic(meta_path, current)
+        return True
+
+    return False
+
+# 3. CONVERSION-------------------------------------
+# 3.1. Write a file via a temporary name so readers never see half a file
+def _write_json_atomic(path, payload):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+# 3.2. Convert a DataFrame with a DatetimeIndex to an Arrow table
+def dataframe_to_arrow(df):
+    """
+    Keeps NaN as float values (not Arrow nulls) so that float columns can later be
+    handed to pandas without a copy.
+    """
+    index = pd.DatetimeIndex(df.index).as_unit("ns")
+    arrays = [pa.array(index.values, type=pa.timestamp("ns"))]
+    names = ["Date"]
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if values.dtype.kind in "fiu":
+            values = values.astype(np.float64, copy=False)
+            arrays.append(pa.array(values, from_pandas=False))
+        else:
+            arrays.append(pa.array(values, from_pandas=True))
+        names.append(str(col))
+    return pa.Table.from_arrays(arrays, names=names)
+
+# 3.3. Convert an Arrow table back to a DataFrame indexed by Date
+def arrow_to_dataframe(table, columns=None):
+    if columns is not None:
+        table = table.select(["Date"] + [col for col in columns if col != "Date"])
+    df = table.to_pandas(split_blocks=True, self_destruct=False)
+    df = df.set_index("Date")
+    return df
+
+# 3.4. Parse a source file into a sorted DataFrame with a typed DatetimeIndex
+def read_source(file_path):
+    if file_path.endswith(".csv"):
+        df = pd.read_csv(file_path)
+    else:
+        df = pd.read_excel(file_path)
+    df["Date"] = pd.to_datetime(df["Date"])
+    df.set_index("Date", inplace=True)
+    return df.sort_index()
+
+# 3.5. Write an Arrow table to disk via a temporary name
+def write_arrow(table, arrow_path):
+    os.makedirs(os.path.dirname(arrow_path) or ".", exist_ok=True)
+
+    # Uncompressed IPC files can be memory-mapped without decoding
+    tmp_path = f"{arrow_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, arrow_path)
+    return arrow_path
+
+# 3.6. Build (or rebuild) the cached Arrow file for a workbook or CSV
+def build_cache(file_path, cache_dir=None):
+    arrow_path, meta_path = get_cache_paths(file_path, cache_dir)
+    os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+
+    df = read_source(file_path)
+    write_arrow(dataframe_to_arrow(df), arrow_path)
+
+    meta = source_signature(file_path)
+    meta["sha256"] = file_sha256(file_path)
+    meta["rows"] = len(df)
+    _write_json_atomic(meta_path, meta)
+
+    return arrow_path
+
+# 4. LOADING-------------------------------------
+# 4.1. Memory-map a cached Arrow file (data pages are only read when touched)
+def open_arrow(arrow_path):
+    source = pa.memory_map(arrow_path, "r")
+    return pa.ipc.open_file(source).read_all()
+
+# 4.2. Memory-map a cached Arrow file as a DataFrame
+def read_arrow(arrow_path, columns=None):
+    return arrow_to_dataframe(open_arrow(arrow_path), columns)
+
+# 4.3. Make sure the cache of a source file exists and is up to date
+def ensure_cache(file_path, cache_dir=None):
+    """
+    Returns the path of the cached Arrow file, converting the source on first use.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(file_path)
+
+    arrow_path, meta_path = get_cache_paths(file_path, cache_dir)
+    if not is_cache_fresh(file_path, arrow_path, meta_path):
+        build_cache(file_path, cache_dir)
+    return arrow_path
+
+# 4.4. Load a workbook through the cache, converting it on first use
+def read_excel_cached(file_path, columns=None, cache_dir=None):
+    """
+    Loads an Excel export as a DataFrame indexed by Date, using the on-disk Arrow cache.
+
+    Args:
+        file_path (str): Path to the .xlsx/.xls source.
+        columns (list, optional): Only read these columns from the cache.
+        cache_dir (str, optional): Override for CACHE_DIR.
+
+    Returns:
+        pd.DataFrame: Sorted DataFrame with a DatetimeIndex named "Date".
+    """
+    try:
+        return read_arrow(ensure_cache(file_path, cache_dir), columns)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # Read-only or full disk: fall back to parsing the workbook directly
+        df = read_source(file_path)
+        return df if columns is None else df[columns]
+
+# 4.5. Convert every source file in a folder up front (e.g. at deploy time)
+def warm_cache(folder="data/others", cache_dir=None):
+    converted = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith((".xlsx", ".xls", ".csv")):
+            file_path = os.path.join(folder, name)
+            arrow_path, meta_path = get_cache_paths(file_path, cache_dir)
+            if not is_cache_fresh(file_path, arrow_path, meta_path):
+                build_cache(file_path, cache_dir)
+                converted.append(file_path)
+    return converted
+
+
+if __name__ == "__main__":
+    for folder in ["data/others", "data/yields", "data/combined_data"]:
+        for path in warm_cache(folder):
+            print(f"Cached {path}")
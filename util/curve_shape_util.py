@@ -0,0 +1,176 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import util.cache_util as cache_util
+import util.query_util as query_util
+import util.store_util as store_util
+import util.mapping_util as mapping_util
+
+# YIELD CURVE SHAPES
+# Labels the curve of every day as one of the shapes described on the Homepage, from
+# the 3M/2Y/5Y/10Y/30Y closes, in a few array operations over all dates at once:
+#   flat            all tenors within flat_threshold of each other
+#   humped          a middle tenor (2Y/5Y/10Y) above both ends by more than hump_threshold
+#   reverse humped  a middle tenor below both ends by more than hump_threshold
+#   normal          otherwise, 30Y above 3M
+#   inverted        otherwise, 30Y below 3M
+# The daily labels of a country are stored as Arrow and rebuilt when its yields change.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Shapes, in the order of their codes in the table
+shape_labels = ["normal", "inverted", "flat", "humped", "reverse humped"]
+
+# 1.2. How the page names them (as on the Homepage)
+shape_names = {
+    "normal": "🔼 Upward-Sloping (Normal)",
+    "inverted": "🔽 Downward-Sloping (Inverted)",
+    "flat": "〰️ Flat",
+    "humped": "🔄 Humped",
+    "reverse humped": "🔄 Reverse Humped",
+}
+
+# 1.3. Thresholds in percentage points (override with CURVE_FLAT_THRESHOLD / CURVE_HUMP_THRESHOLD)
+flat_threshold = float(os.getenv("CURVE_FLAT_THRESHOLD", "0.25"))
+hump_threshold = float(os.getenv("CURVE_HUMP_THRESHOLD", "0.10"))
+
+# 1.4. Fewer valid tenors than this leave a day unlabelled
+min_tenors = 3
+
+# 1.5. Loaded tables
+shape_cache = query_util.LRUCache(max_entries=8)
+
+# 2. CLASSIFIER-------------------------------------
+# 2.1. Shape code of every row of a (dates x tenors) matrix, short to long maturity
+def classify_curves(values):
+    """
+    Args:
+        values (np.ndarray): Shape (n_dates, n_tenors), NaN where a tenor has no close.
+
+    Returns:
+        dict: "code" (index into shape_labels, -1 when unlabelled), "slope" (longest minus
+        shortest valid tenor) and "curvature" (2 x middle tenor minus both ends).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    n_rows, n_tenors = values.shape
+    rows = np.arange(n_rows)
+
+    # Shortest and longest valid tenor of each row
+    first = np.argmax(valid, axis=1)
+    last = n_tenors - 1 - np.argmax(valid[:, ::-1], axis=1)
+    short, long = values[rows, first], values[rows, last]
+
+    # Middle tenors are the valid ones strictly between the two ends
+    positions = np.arange(n_tenors)
+    middle = valid & (positions > first[:, None]) & (positions < last[:, None])
+    mid_max = np.max(np.where(middle, values, -np.inf), axis=1)
+    mid_min = np.min(np.where(middle, values, np.inf), axis=1)
+    spread = np.max(np.where(valid, values, -np.inf), axis=1) - np.min(np.where(valid, values, np.inf), axis=1)
+
+    slope = long - short
+    code = np.where(slope > 0, shape_labels.index("normal"), shape_labels.index("inverted"))
+    code = np.where(np.minimum(short, long) - mid_min > hump_threshold, shape_labels.index("reverse humped"), code)
+    code = np.where(mid_max - np.maximum(short, long) > hump_threshold, shape_labels.index("humped"), code)
+    code = np.where(spread <= flat_threshold, shape_labels.index("flat"), code)
+    code = np.where(valid.sum(axis=1) >= min_tenors, code, -1)
+
+    centre = n_tenors // 2
+    curvature = 2 * values[:, centre] - short - long
+    return {"code": code.astype(np.int8), "slope": slope, "curvature": curvature}
+
+# 2.2. Labels of a DataFrame of yields (columns short to long maturity)
+def classify_frame(df):
+    result = classify_curves(df.to_numpy(dtype=np.float64, na_value=np.nan))
+    labels = pd.Categorical.from_codes(result["code"], categories=shape_labels)
+    return pd.DataFrame({"shape": labels, "slope": result["slope"], "curvature": result["curvature"]}, index=df.index)
+
+# 3. DAILY TABLE-------------------------------------
+# 3.1. Files of a country's table
+def shape_paths(country, cache_dir=None):
+    base = os.path.join(cache_dir or cache_util.CACHE_DIR, "curve_shapes", country.lower())
+    return base + ".arrow", base + ".json"
+
+# 3.2. Classify every day of a country and store the result
+def build_shape_table(country, store, cache_dir=None):
+    df = classify_frame(store.get(mapping_util.yield_columns[country]))
+    arrow_path, meta_path = shape_paths(country, cache_dir)
+    table = pa.Table.from_arrays(
+        [
+            pa.array(df.index.values.astype("datetime64[ns]"), type=pa.timestamp("ns")),
+            pa.array(df["shape"].astype(object), type=pa.string()).dictionary_encode(),
+            pa.array(df["slope"].to_numpy(dtype=np.float32), from_pandas=True),
+            pa.array(df["curvature"].to_numpy(dtype=np.float32), from_pandas=True),
+        ],
+        names=["Date", "shape", "slope", "curvature"],
+    )
+    cache_util.write_arrow(table, arrow_path)
+    meta = {
+        "version": [list(v) for v in store.version(mapping_util.yield_columns[country])],
+        "flat_threshold": flat_threshold,
+        "hump_threshold": hump_threshold,
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return df
+
+# 3.3. Daily shapes of a country (rebuilt when its yields or the thresholds change)
+def get_shape_table(country, store=None, cache_dir=None):
+    """
+    Returns:
+        pd.DataFrame: Indexed by Date with shape (categorical, NaN when unlabelled), slope and curvature.
+    """
+    store = store or store_util.build_default_store()
+    version = store.version(mapping_util.yield_columns[country])
+
+    def compute():
+        arrow_path, meta_path = shape_paths(country, cache_dir)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            fresh = meta == {
+                "version": [list(v) for v in version],
+                "flat_threshold": flat_threshold,
+                "hump_threshold": hump_threshold,
+            }
+        except (OSError, ValueError):
+            fresh = False
+        if not fresh:
+            return build_shape_table(country, store, cache_dir)
+
+        df = cache_util.open_arrow(arrow_path).to_pandas().set_index("Date")
+        df["shape"] = pd.Categorical(df["shape"].astype(object), categories=shape_labels)
+        return df
+
+    return shape_cache.get_or_compute((country, version, flat_threshold, hump_threshold, cache_dir), compute)
+
+# 3.4. Shape of one day (None if the day has no label)
+def shape_on(country, date, store=None):
+    df = get_shape_table(country, store)
+    date = pd.Timestamp(date)
+    if date not in df.index or pd.isna(df.at[date, "shape"]):
+        return None
+    return df.at[date, "shape"]
+
+# 3.5. Consecutive runs of the same shape between two dates
+def shape_regimes(country, start_date=None, end_date=None, store=None):
+    """
+    Returns:
+        pd.DataFrame: One row per regime with start, end, shape and days (trading days).
+    """
+    df = get_shape_table(country, store).loc[start_date:end_date]
+    df = df[df["shape"].notna()]
+    if df.empty:
+        return pd.DataFrame(columns=["start", "end", "shape", "days"])
+
+    codes = df["shape"].cat.codes.to_numpy()
+    breaks = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(codes)]]) - 1
+    return pd.DataFrame({
+        "start": df.index[starts],
+        "end": df.index[ends],
+        "shape": df["shape"].to_numpy()[starts],
+        "days": ends - starts + 1,
+    })
@@ -0,0 +1,211 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import util.cache_util as cache_util
+import util.query_util as query_util
+import util.store_util as store_util
+import util.model_util as model_util
+import util.mapping_util as mapping_util
+
+# FEATURE MATRIX
+# Inputs of the multi-feature LSTMs: every daily market series and the monthly/quarterly
+# macro series of a country, aligned onto one trading-day calendar (the days its yield
+# curve trades). Each series takes its last known value on every calendar day (an as-of
+# join), which forward-fills macro releases and market holidays alike.
+# The aligned matrix of a country is cached as Arrow and only new days are appended.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Where the aligned matrices live
+def features_dir(cache_dir=None):
+    return os.path.join(cache_dir or cache_util.CACHE_DIR, "features")
+
+# 1.2. Series not listed in the chart mappings
+extra_feature_columns = {
+    "China": ["CHLRLPR1_Last Price", "CHLRLPR5_Last Price"],
+}
+
+# 1.3. Loaded matrices
+matrix_cache = query_util.LRUCache(max_entries=8)
+
+# 2. COLUMNS-------------------------------------
+# 2.1. Default feature set of a country: its yields (all fields) and every insight series
+def country_feature_columns(store, country):
+    columns = []
+    for col in mapping_util.yield_columns[country]:
+        columns += store.ticker_columns(col.split("_")[0])
+
+    for sg in mapping_util.additional_graphs[country]:
+        if sg in mapping_util.multiple_lines_mapping:
+            columns += mapping_util.multiple_lines_mapping[sg]["required_columns"]
+        elif sg in mapping_util.multiple_lines_mapping_with_ma:
+            columns += store.ticker_columns(mapping_util.multiple_lines_mapping_with_ma[sg]["ticker"])
+        elif sg in mapping_util.others_mapping and country in mapping_util.others_mapping[sg]:
+            source = mapping_util.others_mapping[sg][country]
+            columns.append(f"{store_util.ticker_from_path(source['file_path'])}_{source['col']}")
+
+    columns += extra_feature_columns.get(country, [])
+    return list(dict.fromkeys(columns))
+
+# 2.2. Store column of a feature named as in the training data
+def store_column(store, name):
+    """
+    Combined tables keep the vendor field names ("JYSO2_SMAVG (50)  on Close"), single
+    exports are read with cleaned ones ("USDJPY_SMAVG (50)"), and a "%" in a ticker is
+    "_" in its file name ("IGS%JPN" is read from "IGS_JPN ....xlsx").
+
+    Raises:
+        KeyError: If the store has no such series.
+    """
+    ticker, field = name.split("_", 1)
+    ticker = ticker.replace("%", "_")
+    candidates = [f"{ticker}_{field}", f"{ticker}_{store_util.clean_field_name(field)}"]
+    for col in candidates:
+        try:
+            store.resolve(col)
+            return col
+        except KeyError:
+            pass
+    # Tickers containing "_" are only indexed once their source is opened
+    try:
+        columns = store.ticker_columns(ticker)
+    except KeyError:
+        columns = []
+    for col in candidates:
+        if col in columns:
+            return col
+    raise KeyError(f"No series in data/ for the feature {name}")
+
+# 2.2.1. Store columns a multi-feature model reads, in its input order
+def model_feature_columns(spec, store):
+    """
+    The feature scaler (x_scaler) was fitted on a DataFrame, so its feature_names_in_
+    lists the training columns in order; the model reads them followed by its target
+    close, which the target scaler (y_scaler) was fitted on.
+
+    Returns:
+        list: Store columns, the target "<TICKER>_Close" last.
+    """
+    x_scaler, y_scaler = model_util.load_scaler(spec["scaler_path"])
+    names = [str(name) for name in x_scaler.feature_names_in_] + [str(name) for name in y_scaler.feature_names_in_]
+    return [store_column(store, name) for name in names]
+
+# 2.3. Country whose yield curve contains a ticker
+def ticker_country(ticker):
+    for country, columns in mapping_util.yield_columns.items():
+        if f"{ticker}_Close" in columns:
+            return country
+    raise KeyError(f"{ticker} is not part of any yield curve")
+
+# 3. ALIGNMENT-------------------------------------
+# 3.1. Trading days of a country: the days any tenor of its curve has a close
+def trading_calendar(store, country, start=None, end=None):
+    df = store.get(mapping_util.yield_columns[country], start, end)
+    return df.index.values.astype("datetime64[ns]")
+
+# 3.2. As-of join of some columns onto a calendar
+def align_columns(store, columns, calendar):
+    """
+    Vectorized as-of join: each source file is forward-filled once, then every calendar
+    day picks the row at searchsorted(source dates, day, "right") - 1.
+
+    Returns:
+        pd.DataFrame: float64 matrix indexed by the calendar, columns in the given order.
+    """
+    by_source = {}
+    for col in columns:
+        by_source.setdefault(store.resolve(col), []).append(col)
+
+    data = {}
+    for cols in by_source.values():
+        df = store.get(cols, end=pd.Timestamp(calendar[-1]), dropna=False).ffill()
+        dates = df.index.values.astype("datetime64[ns]")
+        positions = np.searchsorted(dates, calendar, side="right") - 1
+        values = df.to_numpy(dtype=np.float64, na_value=np.nan)
+        aligned = np.where((positions >= 0)[:, None], values[np.clip(positions, 0, None)], np.nan)
+        data.update({col: aligned[:, i] for i, col in enumerate(cols)})
+
+    return pd.DataFrame(data, index=pd.DatetimeIndex(calendar, name="Date"))[list(columns)]
+
+# 4. CACHED MATRICES-------------------------------------
+# 4.1. Files of a country's matrix
+def matrix_paths(country, cache_dir=None):
+    base = os.path.join(features_dir(cache_dir), country.lower())
+    return base + ".arrow", base + ".json"
+
+# 4.2. Read a stored matrix and its metadata (None if missing or unreadable)
+def read_matrix(country, cache_dir=None):
+    arrow_path, meta_path = matrix_paths(country, cache_dir)
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        return cache_util.read_arrow(arrow_path), meta
+    except (OSError, ValueError):
+        return None, None
+
+# 4.3. Write a matrix and its metadata
+def write_matrix(country, df, columns, version, cache_dir=None):
+    arrow_path, meta_path = matrix_paths(country, cache_dir)
+    cache_util.write_arrow(cache_util.dataframe_to_arrow(df), arrow_path)
+    meta = {"columns": list(columns), "version": [list(v) for v in version], "last_date": str(df.index[-1].date())}
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+
+# 4.4. Aligned feature matrix of a country, appending only the days added since the last build
+def get_feature_matrix(country, store=None, columns=None, full=False, cache_dir=None):
+    """
+    Args:
+        country (str): "Japan", "China" or "Australia".
+        store (TimeSeriesStore, optional): Data source. Defaults to the store under data/.
+        columns (list, optional): Feature columns. Defaults to country_feature_columns().
+        full (bool): Rebuild from scratch (e.g. after past values were revised).
+
+    Returns:
+        pd.DataFrame: Trading days x features, read-only when served from the cache.
+    """
+    store = store or store_util.build_default_store()
+    columns = list(columns or country_feature_columns(store, country))
+    version = store.version(columns)
+
+    def compute():
+        stored, meta = (None, None) if full else read_matrix(country, cache_dir)
+        if stored is not None and meta["columns"] == columns:
+            if meta["version"] == [list(v) for v in version]:
+                return stored
+            # Only the days after the stored matrix are aligned
+            new_days = trading_calendar(store, country, start=stored.index[-1] + pd.Timedelta(days=1))
+            df = pd.concat([stored, align_columns(store, columns, new_days)]) if len(new_days) else stored
+        else:
+            df = align_columns(store, columns, trading_calendar(store, country))
+
+        write_matrix(country, df, columns, version, cache_dir)
+        return df
+
+    return matrix_cache.get_or_compute((country, tuple(columns), version, full, cache_dir), compute)
+
+# 5. MODEL INPUTS-------------------------------------
+# 5.1. Feature windows of a multi-feature model
+def feature_windows(spec, end_date=None, all_origins=False, store=None):
+    """
+    Returns the model's input columns (see model_feature_columns), unscaled, cut into
+    input windows.
+
+    Returns:
+        tuple: (windows, dates). windows has shape (input_window, n_inputs) for the last
+        origin up to end_date, or (n_origins, input_window, n_inputs) as a strided
+        view of the matrix when all_origins is True. dates are the origins (last input dates).
+    """
+    store = store or store_util.build_default_store()
+    columns = model_feature_columns(spec, store)
+    matrix = get_feature_matrix(ticker_country(spec["ticker"]), store)
+    missing = [col for col in columns if col not in matrix.columns]
+    if missing:
+        matrix = matrix.join(align_columns(store, missing, matrix.index.values))
+
+    df = matrix[columns] if end_date is None else matrix.loc[:end_date, columns]
+    values = df.to_numpy(dtype=np.float64, na_value=np.nan)
+    if all_origins:
+        windows = sliding_window_view(values, spec["input_window"], axis=0).transpose(0, 2, 1)
+        return windows, df.index[spec["input_window"] - 1:]
+    return values[-spec["input_window"]:], df.index[-spec["input_window"]:]
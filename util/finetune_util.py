@@ -0,0 +1,180 @@
+import os
+import json
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import util.store_util as store_util
+import util.model_util as model_util
+import util.forecast_util as forecast_util
+import util.batch_forecast_util as batch_forecast_util
+
+# INCREMENTAL FINE-TUNING
+# Keeps the tuned 1-feature LSTMs current as new data lands, without retraining them:
+#   python -m util.finetune_util                  (every tuned 1-feature LSTM)
+#   python -m util.finetune_util --tickers GJGB5
+# Each model is warm-started from its newest version and trained for a few epochs on the
+# windows whose targets fall after its last training date. The result is written next to
+# it as models/<TICKER>/versions/<name>/v<N>/ with its scaler and metadata; the original
+# checkpoint is never overwritten, and model_util serves the newest version.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Last date of the data the shipped checkpoints were trained on (override with BASE_TRAINED_UNTIL)
+base_trained_until = os.getenv("BASE_TRAINED_UNTIL", "2024-10-31")
+
+# 1.2. Training settings: a small learning rate so a few epochs adapt without forgetting
+finetune_epochs = int(os.getenv("FINETUNE_EPOCHS", "5"))
+finetune_learning_rate = float(os.getenv("FINETUNE_LEARNING_RATE", "1e-4"))
+finetune_batch_size = 32
+
+# 1.3. Fewer new windows than this are not worth a new version
+min_new_windows = 5
+
+# 2. TRAINING DATA-------------------------------------
+# 2.1. Date the newest version of a model was trained up to
+def trained_until(spec):
+    versions = model_util.list_versions(spec)
+    return pd.Timestamp(versions[-1]["trained_until"] if versions else base_trained_until)
+
+# 2.2. (input, target) windows whose targets end after a date
+def new_windows(values, dates, input_window, output_window, since):
+    """
+    Returns:
+        tuple: (inputs, targets) of shape (n, input_window) and (n, output_window). The
+        inputs may reach back before `since`; every target has at least one new value.
+    """
+    span = input_window + output_window
+    if len(values) < span:
+        return np.empty((0, input_window)), np.empty((0, output_window))
+    windows = sliding_window_view(values, span)
+    target_ends = dates[span - 1:]
+    keep = target_ends > np.datetime64(since)
+    return windows[keep, :input_window], windows[keep, input_window:]
+
+# 2.3. Extend a fitted 1-column MinMaxScaler (the target scaler) to new values
+def extend_scaler(scaler, values):
+    """
+    partial_fit widens data_min_/data_max_ when the new values fall outside them. A wider
+    range changes scale_ and min_, so every value, old or new, then scales differently;
+    fine-tuning runs on the extended scaling and adapts the model to it. Values inside
+    the old range leave the scaler unchanged.
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+    # Same column name as at fit time, so scikit-learn does not warn
+    if hasattr(scaler, "feature_names_in_"):
+        values = pd.DataFrame(values, columns=scaler.feature_names_in_)
+    scaler.partial_fit(values)
+    return scaler
+
+# 3. FINE-TUNING-------------------------------------
+# 3.1. Fine-tune one model on its new windows (runs inside a worker process)
+def finetune_model(spec, epochs=None, learning_rate=None):
+    """
+    Returns:
+        dict: Metadata of the written version, or None if there was not enough new data.
+    """
+    from tensorflow import keras
+    import joblib
+
+    epochs = epochs or finetune_epochs
+    learning_rate = learning_rate or finetune_learning_rate
+    current = model_util.latest_version(spec)
+    since = trained_until(spec)
+
+    store = store_util.build_default_store()
+    column = f"{spec['ticker']}_{forecast_util.target_field}"
+    series = store.get(column)[column].dropna()
+    inputs, targets = new_windows(
+        series.to_numpy(dtype=np.float64), series.index.values, spec["input_window"], spec["output_window"], since
+    )
+    if len(inputs) < min_new_windows:
+        return None
+
+    # Fresh copies: the cached model and scalers may be serving forecasts in this process.
+    # 1-feature models read and predict the target close, so only y_scaler is extended
+    model = model_util.load_keras_model(current["path"])
+    scalers = model_util.load_scaler(current["scaler_path"])
+    y_scaler = extend_scaler(scalers.y_scaler, series[series.index > since])
+
+    scale, offset = model_util.input_scaling(scalers)
+    x = (inputs[..., None] * scale + offset).astype(np.float32)
+    y = (targets * y_scaler.scale_[0] + y_scaler.min_[0]).astype(np.float32).reshape((len(targets),) + tuple(model.output_shape[1:]))
+
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate), loss="mse")
+    loss_before = float(model.evaluate(x, y, verbose=0))
+    history = model.fit(x, y, epochs=epochs, batch_size=finetune_batch_size, shuffle=True, verbose=0)
+
+    version = current.get("version", 1) + 1
+    folder = os.path.join(model_util.versions_dir(spec), f"v{version}")
+    os.makedirs(folder, exist_ok=True)
+    model.save(os.path.join(folder, "model.keras"))
+    # Same (x_scaler, y_scaler) tuple as the shipped scalers, so model_util.load_scaler reads it
+    joblib.dump((scalers.x_scaler, y_scaler), os.path.join(folder, "scaler.pkl"))
+
+    metadata = {
+        "name": spec["name"],
+        "ticker": spec["ticker"],
+        "version": version,
+        "parent": current["path"],
+        "trained_from": str(since.date()),
+        "trained_until": str(series.index[-1].date()),
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        "windows": int(len(inputs)),
+        "epochs": epochs,
+        "learning_rate": learning_rate,
+        "loss_before": loss_before,
+        "loss_after": float(history.history["loss"][-1]),
+        "scaler_data_min": float(y_scaler.data_min_[0]),
+        "scaler_data_max": float(y_scaler.data_max_[0]),
+    }
+    # Written last: a version without metadata is ignored by model_util
+    with open(os.path.join(folder, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+# 3.2. Fine-tune every tuned 1-feature LSTM in parallel
+def run_finetune(tickers=None, epochs=None, learning_rate=None, max_workers=None):
+    """
+    A model that fails keeps its current version and is reported with its error.
+
+    Returns:
+        tuple: (pd.DataFrame of the metadata of the versions written, empty if no model had
+        new data; list of (spec, error) that failed).
+    """
+    specs = model_util.find_models(architecture="lstm", features="1-feature", tuned=True)
+    if tickers:
+        specs = specs[specs["ticker"].isin(tickers)]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=batch_forecast_util.limit_threads) as executor:
+        futures = [(spec, executor.submit(finetune_model, spec, epochs, learning_rate)) for spec in specs.to_dict("records")]
+        written, failed = [], []
+        for spec, future in futures:
+            try:
+                metadata = future.result()
+            except Exception as e:
+                failed.append((spec, e))
+                continue
+            if metadata is not None:
+                written.append(metadata)
+
+    return pd.DataFrame(written), failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune the tuned LSTMs on the data added since their training.")
+    parser.add_argument("--tickers", nargs="*", default=None, help="Only these tickers.")
+    parser.add_argument("--epochs", type=int, default=None, help=f"Epochs per model (default {finetune_epochs}).")
+    parser.add_argument("--learning-rate", type=float, default=None, help=f"Adam learning rate (default {finetune_learning_rate}).")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    args = parser.parse_args()
+
+    written, failed = run_finetune(args.tickers, args.epochs, args.learning_rate, args.workers)
+    if written.empty:
+        print("No model had enough new data.")
+    else:
+        print(written[["ticker", "name", "version", "trained_until", "windows", "loss_before", "loss_after"]].to_string(index=False))
+    for spec, error in failed:
+        print(f"Failed {spec['path']} (current version kept): {error}")
+    raise SystemExit(1 if failed else 0)
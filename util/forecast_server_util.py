@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import util.store_util as store_util
+import util.model_util as model_util
+import util.forecast_util as forecast_util
+import util.transformer_util as transformer_util
+import util.batch_forecast_util as batch_forecast_util
+
+# FORECAST SERVER
+# Runs the models in their own process, away from the Streamlit script thread:
+#   python -m util.forecast_server_util                     (local only, 127.0.0.1:8502)
+#   python -m util.forecast_server_util --host 0.0.0.0      (reachable by other machines)
+# Requests from all users are queued and a single worker runs them in micro-batches:
+# it waits up to batch_window_ms after the first request, then forecasts every 1-feature
+# LSTM of the same architecture in one call, each multi-feature LSTM from its country's
+# feature matrix, and every request on a transformer checkpoint in one generate(). The
+# server keeps no state besides its caches, so more instances can run behind a load
+# balancer. LSTMs give point forecasts only: their p5/p50/p95 are null, as in the nightly
+# table.
+#
+#   POST /forecast {"requests": [{"ticker": "GJGB5", "model": "lstm-1-feature-60i7o-tuned"}]}
+#   GET  /models   registry as JSON
+#   GET  /health   queue and batch counters
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Address of the server (override with FORECAST_SERVER_HOST / FORECAST_SERVER_PORT)
+server_host = os.getenv("FORECAST_SERVER_HOST", "127.0.0.1")
+server_port = int(os.getenv("FORECAST_SERVER_PORT", "8502"))
+
+# 1.2. URL the app calls (unset: the page reads the nightly forecast table)
+server_url = os.getenv("FORECAST_SERVER_URL")
+
+# 1.3. How long the worker waits to gather a batch, and its maximum size
+batch_window_ms = float(os.getenv("FORECAST_BATCH_WINDOW_MS", "20"))
+max_batch_size = int(os.getenv("FORECAST_MAX_BATCH", "256"))
+
+# 1.4. Seconds a client waits for an answer
+request_timeout = float(os.getenv("FORECAST_SERVER_TIMEOUT", "60"))
+
+# 2. MICRO-BATCHING-------------------------------------
+class MicroBatcher:
+    """
+    Queue of forecast requests served by one worker thread.
+
+    submit() returns a Future per request; the worker collects everything that arrives
+    within the batch window and resolves the futures with rows of the forecast table.
+    """
+
+    def __init__(self, registry, store=None, window_ms=None, max_size=None):
+        self.registry = registry
+        self.store = store or store_util.build_default_store()
+        self.window = (batch_window_ms if window_ms is None else window_ms) / 1000
+        self.max_size = max_size or max_batch_size
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    # 2.1. Queue one request
+    def submit(self, ticker, model):
+        future = Future()
+        self._queue.put(((ticker, model), future))
+        return future
+
+    # 2.2. Collect the requests that arrive within the window of the first one
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self.batches += 1
+            self.requests += len(batch)
+            try:
+                results = run_requests(self.registry, [request for request, _ in batch], self.store)
+            except Exception as e:
+                results = {request: e for request, _ in batch}
+            for request, future in batch:
+                result = results.get(request, KeyError(f"No forecast for {request}"))
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    # 2.3. Counters for /health
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+# 3. INFERENCE-------------------------------------
+# 3.1. Rows of the forecast table for one (ticker, model) (bands are NaN unless given)
+def forecast_rows(ticker, model, as_of, df, point, bands=None):
+    rows = pd.DataFrame({
+        "ticker": ticker,
+        "model": model,
+        "as_of": as_of,
+        "step": np.arange(1, len(df) + 1),
+        "Date": df.index,
+        "point": df[point].to_numpy(),
+    })
+    for band in ["p5", "p50", "p95"]:
+        rows[band] = df[band].to_numpy() if bands else np.nan
+    return rows[batch_forecast_util.forecast_columns]
+
+# 3.2. Run a batch of distinct (ticker, model name) requests
+def run_requests(registry, requests, store):
+    """
+    1-feature LSTM requests sharing an architecture run in one forecast_lstm call,
+    multi-feature LSTMs one forecast_feature_lstm call each, transformer requests in one
+    forecast_quantiles call (which samples each checkpoint once).
+
+    Returns:
+        dict: (ticker, model) -> pd.DataFrame of rows, or the exception of a failed request.
+    """
+    results = {}
+    lstm_groups = {}
+    feature_requests = []
+    transformer_requests = []
+
+    for request in dict.fromkeys(requests):
+        ticker, model = request
+        match = registry[(registry["ticker"] == ticker) & (registry["name"] == model)]
+        if match.empty:
+            results[request] = KeyError(f"Unknown model {model} for {ticker}")
+            continue
+        spec = match.iloc[0].to_dict()
+        spec["scaler_path"] = spec["scaler_path"] if isinstance(spec["scaler_path"], str) else None
+
+        if spec["architecture"] == "lstm" and spec["features"] == "1-feature":
+            key = (spec["input_window"], spec["output_window"], spec["tuned"])
+            lstm_groups.setdefault(key, []).append(request)
+        elif spec["architecture"] == "lstm":
+            feature_requests.append((ticker, spec))
+        elif spec["architecture"] == "time_series_transformer":
+            transformer_requests.append((ticker, spec))
+        else:
+            results[request] = ValueError(f"{model} has an unsupported architecture: {spec['architecture']}")
+
+    for (input_window, output_window, tuned), group in lstm_groups.items():
+        tickers = [ticker for ticker, _ in group]
+        try:
+            df = forecast_util.forecast_lstm(tickers, input_window, output_window, tuned=tuned, store=store)
+            _, last_dates = forecast_util.build_windows(store, tickers, input_window)
+        except Exception as e:
+            results.update({request: e for request in group})
+            continue
+        for (ticker, model), as_of in zip(group, last_dates):
+            column = f"{ticker}_{forecast_util.target_field}"
+            results[(ticker, model)] = forecast_rows(ticker, model, as_of, df[[column]].dropna(), column)
+
+    for ticker, spec in feature_requests:
+        column = f"{ticker}_{forecast_util.target_field}"
+        try:
+            df = forecast_util.forecast_feature_lstm(spec, store=store)
+        except Exception as e:
+            results[(ticker, spec["name"])] = e
+            continue
+        results[(ticker, spec["name"])] = forecast_rows(ticker, spec["name"], store.date_bounds(column)[1], df, column)
+
+    if transformer_requests:
+        try:
+            summaries = transformer_util.forecast_quantiles(transformer_requests, store)
+        except Exception as e:
+            summaries = {}
+            results.update({(ticker, spec["name"]): e for ticker, spec in transformer_requests})
+        for (ticker, model), df in summaries.items():
+            as_of = store.date_bounds(f"{ticker}_{forecast_util.target_field}")[1]
+            results[(ticker, model)] = forecast_rows(ticker, model, as_of, df, transformer_util.point_band, bands=True)
+
+    return results
+
+# 4. HTTP SERVER-------------------------------------
+# 4.1. JSON encoding of forecast rows
+def rows_to_json(df):
+    records = df.astype({"as_of": str, "Date": str}).replace({np.nan: None})
+    return records.to_dict("list")
+
+# 4.2. Request handler (one thread per connection; inference happens in the batcher)
+class ForecastHandler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok", **self.batcher.stats()})
+        elif self.path == "/models":
+            registry = self.batcher.registry.drop(columns=["path", "scaler_path"])
+            self._send(200, {"models": registry.to_dict("records")})
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/forecast":
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            requests = [(item["ticker"], item["model"]) for item in body["requests"]]
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": f"Malformed request: {e}"})
+            return
+
+        # Every item is queued separately so it can share a batch with other users' requests
+        futures = [self.batcher.submit(ticker, model) for ticker, model in requests]
+        forecasts = []
+        for (ticker, model), future in zip(requests, futures):
+            try:
+                forecasts.append(rows_to_json(future.result(timeout=request_timeout)))
+            except Exception as e:
+                forecasts.append({"ticker": ticker, "model": model, "error": str(e)})
+        self._send(200, {"forecasts": forecasts})
+
+    def log_message(self, format, *args):
+        pass
+
+# 4.3. Start the server (blocks)
+def serve(host=None, port=None, warm=False):
+    registry = model_util.get_registry()
+    if warm:
+        for spec in registry.to_dict("records"):
+            spec["scaler_path"] = spec["scaler_path"] if isinstance(spec["scaler_path"], str) else None
+            model_util.load_model(spec)
+
+    ForecastHandler.batcher = MicroBatcher(registry)
+    server = ThreadingHTTPServer((host or server_host, port or server_port), ForecastHandler)
+    print(f"Serving {len(registry)} models on http://{server.server_address[0]}:{server.server_address[1]}")
+    server.serve_forever()
+
+# 5. CLIENT-------------------------------------
+# 5.1. Requests run in the background while the page renders
+client_pool = ThreadPoolExecutor(max_workers=4)
+
+def _call(url, path, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url.rstrip("/") + path, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=request_timeout) as response:
+        return json.loads(response.read())
+
+# 5.2. Forecasts of some (ticker, model) pairs, in the schema of the forecast table
+def fetch_forecasts(requests, url=None):
+    """
+    Returns:
+        pd.DataFrame: Rows of every forecast the server returned (failed requests are left out).
+    """
+    body = {"requests": [{"ticker": ticker, "model": model} for ticker, model in requests]}
+    forecasts = [item for item in _call(url or server_url, "/forecast", body)["forecasts"] if "error" not in item]
+    if not forecasts:
+        return pd.DataFrame(columns=batch_forecast_util.forecast_columns)
+
+    df = pd.concat([pd.DataFrame(item) for item in forecasts], ignore_index=True)
+    df["as_of"] = pd.to_datetime(df["as_of"])
+    df["Date"] = pd.to_datetime(df["Date"])
+    df[["point", "p5", "p50", "p95"]] = df[["point", "p5", "p50", "p95"]].astype(float)
+    return df[batch_forecast_util.forecast_columns]
+
+# 5.3. Same, without blocking: returns a Future
+def submit_forecasts(requests, url=None):
+    return client_pool.submit(fetch_forecasts, requests, url)
+
+# 5.4. Registry of the server
+def fetch_models(url=None):
+    return pd.DataFrame(_call(url or server_url, "/models")["models"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve model forecasts over HTTP.")
+    parser.add_argument("--host", default=None, help=f"Interface to bind (default {server_host}: local only).")
+    parser.add_argument("--port", type=int, default=None, help=f"Port (default {server_port}).")
+    parser.add_argument("--warm", action="store_true", help="Load every model before serving.")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.warm)
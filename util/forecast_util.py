@@ -0,0 +1,210 @@
+import os
+import numpy as np
+import pandas as pd
+import util.query_util as query_util
+import util.store_util as store_util
+import util.model_util as model_util
+import util.onnx_util as onnx_util
+import util.feature_util as feature_util
+
+# BATCHED LSTM INFERENCE
+# Forecasts every tenor of a curve at once: the input windows of all tickers are cut
+# as one NumPy tensor, scaled with the stacked MinMaxScaler parameters, and run
+# through all the per-ticker LSTMs in a single compiled call. Outputs are mapped back
+# to yields with each model's target scaler.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Series the 1-feature models were trained on
+target_field = "Close"
+
+# 1.2. "onnx" (onnxruntime, no TensorFlow), "keras", or "auto" (onnx when every model is exported)
+forecast_backend = os.getenv("FORECAST_BACKEND", "auto")
+
+# 1.3. Compiled groups of models kept in memory
+group_cache = query_util.LRUCache(max_entries=32)
+
+# 2. INPUT WINDOWS-------------------------------------
+# 2.1. Last `window` valid values of every column of a matrix
+def last_windows(values, window):
+    """
+    Vectorized selection of each series' most recent valid values.
+
+    Args:
+        values (np.ndarray): Shape (rows, n_series), NaN where a series has no value.
+        window (int): Number of values per series.
+
+    Returns:
+        tuple: (windows, last_rows). windows has shape (n_series, window) in time order,
+        last_rows holds the row of each series' latest value.
+
+    Raises:
+        ValueError: If a series has fewer than `window` valid values.
+    """
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=0)
+    if (counts < window).any():
+        raise ValueError(f"Not enough data: need {window} values, got {counts.min()}")
+
+    # Rank of each valid value counted from the end; keep ranks 1..window
+    rank_from_end = np.cumsum(valid[::-1], axis=0)[::-1]
+    keep = (valid & (rank_from_end <= window)).T
+    windows = values.T[keep].reshape(values.shape[1], window)
+    last_rows = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+    return windows, last_rows
+
+# 2.2. Input windows of several tickers from the store
+def build_windows(store, tickers, input_window, end_date=None):
+    """
+    Returns:
+        tuple: (windows of shape (n_tickers, input_window), last date of each ticker)
+    """
+    columns = [f"{ticker}_{target_field}" for ticker in tickers]
+    df = store.get(columns, end=end_date)
+    windows, last_rows = last_windows(df.to_numpy(dtype=np.float64, na_value=np.nan), input_window)
+    return windows, df.index[last_rows]
+
+# 3. MODEL GROUPS-------------------------------------
+# 3.1. One compiled call running several Keras models on their own inputs
+def make_group_forward(models):
+    import tensorflow as tf # imported on first use, like the models themselves
+
+    @tf.function(reduce_retracing=True)
+    def forward(inputs):
+        # inputs: (n_models, batch, window, n_inputs) -> (n_models, batch, output_window)
+        outputs = []
+        for i, model in enumerate(models):
+            y = model(inputs[i], training=False)
+            outputs.append(tf.reshape(y, (tf.shape(y)[0], -1)))
+        return tf.stack(outputs)
+
+    return forward
+
+# 3.1.1. The same call on exported ONNX models
+def make_onnx_forward(sessions):
+    def forward(inputs):
+        return np.stack([onnx_util.run_session(loaded, inputs[i]) for i, loaded in enumerate(sessions)])
+
+    return forward
+
+# 3.2. Load the models of several tickers sharing one architecture
+def load_lstm_group(tickers, input_window, output_window, features="1-feature", tuned=True):
+    """
+    Returns:
+        dict: {"specs", "forward", "scale", "min", "target_scale", "target_min"}. scale and
+        min scale the inputs (model_util.input_scaling), shape (n_tickers, n_inputs);
+        target_scale and target_min invert the outputs, shape (n_tickers,).
+    """
+    specs = [
+        model_util.get_model_spec(ticker, "lstm", features, input_window, output_window, tuned)
+        for ticker in tickers
+    ]
+    use_onnx = forecast_backend == "onnx" or (
+        forecast_backend == "auto" and all(onnx_util.has_export(spec) for spec in specs)
+    )
+    key = (use_onnx, onnx_util.use_quantized) + tuple(model_util.model_version(spec) for spec in specs)
+
+    def compute():
+        if use_onnx:
+            sessions = [onnx_util.load_session(spec) for spec in specs]
+            return {
+                "specs": specs,
+                "forward": make_onnx_forward(sessions),
+                "scale": np.stack([loaded["scale"] for loaded in sessions]),
+                "min": np.stack([loaded["min"] for loaded in sessions]),
+                "target_scale": np.array([loaded["target_scale"][0] for loaded in sessions]),
+                "target_min": np.array([loaded["target_min"][0] for loaded in sessions]),
+            }
+
+        loaded = [model_util.load_model(spec) for spec in specs]
+        scaling = [model_util.input_scaling(item["scalers"]) for item in loaded]
+        return {
+            "specs": specs,
+            "forward": make_group_forward([item["model"] for item in loaded]),
+            "scale": np.stack([scale for scale, _ in scaling]),
+            "min": np.stack([offset for _, offset in scaling]),
+            "target_scale": np.array([item["scalers"].y_scaler.scale_[0] for item in loaded]),
+            "target_min": np.array([item["scalers"].y_scaler.min_[0] for item in loaded]),
+        }
+
+    return group_cache.get_or_compute(key, compute)
+
+# 3.3. Run a group on a batch of windows
+def predict_group(group, windows):
+    """
+    Args:
+        group (dict): From load_lstm_group.
+        windows (np.ndarray): Raw values, shape (n_tickers, window) or (n_tickers, batch,
+            window) for 1-feature models, (n_tickers, batch, window, n_inputs) otherwise.
+
+    Returns:
+        np.ndarray: Forecasts in the original units, shape (n_tickers, output_window)
+        or (n_tickers, batch, output_window).
+    """
+    single = windows.ndim == 2
+    if single:
+        windows = windows[:, None, :]
+    if windows.ndim == 3:
+        windows = windows[..., None]
+
+    # MinMaxScaler.transform for every ticker and input at once: x * scale_ + min_
+    scale, offset = group["scale"][:, None, None, :], group["min"][:, None, None, :]
+    scaled = (windows * scale + offset).astype(np.float32)
+
+    # Target scaler's inverse_transform: (y - min_) / scale_
+    predictions = np.asarray(group["forward"](scaled), dtype=np.float64)
+    predictions = (predictions - group["target_min"][:, None, None]) / group["target_scale"][:, None, None]
+
+    return predictions[:, 0, :] if single else predictions
+
+# 4. FORECASTS-------------------------------------
+# 4.1. Business days after a date
+def forecast_dates(last_date, steps):
+    return pd.bdate_range(pd.Timestamp(last_date) + pd.offsets.BDay(1), periods=steps, name="Date")
+
+# 4.2. Forecast several tickers with one call per architecture
+def forecast_lstm(tickers, input_window=60, output_window=7, end_date=None, features="1-feature", tuned=True, store=None):
+    """
+    Forecasts the next output_window business days of every ticker from its last
+    input_window closes (up to end_date).
+
+    Returns:
+        pd.DataFrame: Indexed by forecast Date, one "<TICKER>_Close" column per ticker.
+        Each ticker's forecast starts the business day after its own last close, so a
+        ticker whose data ends earlier has NaN on the dates past its horizon.
+    """
+    store = store or store_util.build_default_store()
+    windows, last_dates = build_windows(store, tickers, input_window, end_date)
+    group = load_lstm_group(tickers, input_window, output_window, features, tuned)
+    predictions = predict_group(group, windows)
+
+    return pd.concat(
+        [
+            pd.Series(predictions[i], index=forecast_dates(last_date, output_window), name=f"{ticker}_{target_field}")
+            for i, (ticker, last_date) in enumerate(zip(tickers, last_dates))
+        ],
+        axis=1,
+    )
+
+# 4.3. Forecast a whole yield curve (3M/2Y/5Y/10Y/30Y) of a country
+def forecast_curve(columns, input_window=60, output_window=7, end_date=None, store=None):
+    tickers = [col.split("_")[0] for col in columns]
+    return forecast_lstm(tickers, input_window, output_window, end_date, store=store)
+
+# 4.4. Forecast a multi-feature LSTM from the last window of its feature matrix
+def forecast_feature_lstm(spec, end_date=None, store=None):
+    """
+    Returns:
+        pd.DataFrame: Indexed by forecast Date, one "<TICKER>_Close" column.
+
+    Raises:
+        ValueError: If an input series has no value yet in the last window.
+    """
+    window, dates = feature_util.feature_windows(spec, end_date, store=store)
+    if np.isnan(window).any():
+        raise ValueError(f"Feature window of {spec['name']} has gaps up to {dates[-1].date()}")
+    group = load_lstm_group([spec["ticker"]], spec["input_window"], spec["output_window"], spec["features"], spec["tuned"])
+    predictions = predict_group(group, window[None, None])[0, 0]
+    return pd.DataFrame(
+        {f"{spec['ticker']}_{target_field}": predictions},
+        index=forecast_dates(dates[-1], spec["output_window"]),
+    )
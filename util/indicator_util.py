@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import util.query_util as query_util
+
+# ROLLING INDICATORS
+# Moving averages and rolling volatility computed from the stored prices instead of
+# the vendor "SMAVG (n)" columns. Every window is derived from one cumulative sum of
+# the series (O(n) whatever the window) and cached per ticker, field and window.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Windows drawn next to the price by default (trading days)
+default_ma_windows = [50, 100, 200]
+
+# 1.2. Indicator kinds and their column labels
+indicator_labels = {
+    "sma": "SMA",
+    "ema": "EMA",
+    "volatility": "Vol",
+}
+
+# 1.3. Computed indicators kept in memory (full history of one ticker, field and window)
+indicator_cache = query_util.LRUCache(max_entries=512)
+
+# 2. HELPERS-------------------------------------
+# 2.1. Column name of an indicator, e.g. "SMA (50)"
+def indicator_name(kind, window):
+    return f"{indicator_labels[kind]} ({window})"
+
+# 2.2. Whether a column holds an indicator rather than a price (vendor or computed)
+def is_indicator_column(col):
+    labels = ["SMAVG"] + [f"{label} (" for label in indicator_labels.values()]
+    return any(label in col for label in labels)
+
+# 2.3. Running sums with a leading zero, so the sum of values[i:j] is sums[j] - sums[i]
+def prefix_sums(values):
+    sums = np.empty(len(values) + 1, dtype=np.float64)
+    sums[0] = 0.0
+    np.cumsum(values, out=sums[1:])
+    return sums
+
+# 3. INDICATORS-------------------------------------
+# 3.1. Simple moving average over the last `window` values
+def rolling_mean(values, window, sums=None):
+    """
+    Vectorized SMA from prefix sums. The first window - 1 values are NaN.
+    Values are shifted by their first element first, which keeps the running sum small.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) < window:
+        return result
+
+    offset = values[0]
+    sums = prefix_sums(values - offset) if sums is None else sums
+    result[window - 1:] = (sums[window:] - sums[:-window]) / window + offset
+    return result
+
+# 3.2. Rolling sample standard deviation over the last `window` values
+def rolling_std(values, window):
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) < window or window < 2:
+        return result
+
+    shifted = values - values[0]
+    sums = prefix_sums(shifted)
+    squares = prefix_sums(shifted * shifted)
+    total = sums[window:] - sums[:-window]
+    total_sq = squares[window:] - squares[:-window]
+    variance = (total_sq - total * total / window) / (window - 1)
+    result[window - 1:] = np.sqrt(np.clip(variance, 0.0, None))
+    return result
+
+# 3.3. Exponential moving average (span = window), seeded after `window` values
+def exponential_mean(values, window):
+    # The recursion has no closed form that stays stable over long series,
+    # so this uses pandas' compiled O(n) loop
+    ema = pd.Series(values, dtype=np.float64).ewm(span=window, adjust=False, min_periods=window).mean()
+    return ema.to_numpy()
+
+# 3.4. Rolling volatility: standard deviation of daily changes
+def rolling_volatility(values, window):
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) > 1:
+        result[1:] = rolling_std(np.diff(values), window)
+    return result
+
+# 3.5. Several indicators of one series in a single pass
+def compute_indicators(series, sma=(), ema=(), volatility=()):
+    """
+    Computes the requested indicators over the valid values of a series.
+
+    Args:
+        series (pd.Series): Prices indexed by Date (NaN rows are skipped).
+        sma (list): SMA windows.
+        ema (list): EMA windows.
+        volatility (list): Rolling volatility windows.
+
+    Returns:
+        pd.DataFrame: One column per indicator (e.g. "SMA (50)"), indexed like the valid values.
+    """
+    series = series.dropna()
+    values = series.to_numpy(dtype=np.float64)
+
+    # One prefix sum serves every SMA window
+    sums = prefix_sums(values - values[0]) if len(values) else None
+    data = {}
+    for window in sma:
+        data[indicator_name("sma", window)] = rolling_mean(values, window, sums)
+    for window in ema:
+        data[indicator_name("ema", window)] = exponential_mean(values, window)
+    for window in volatility:
+        data[indicator_name("volatility", window)] = rolling_volatility(values, window)
+
+    return pd.DataFrame(data, index=series.index)
+
+# 4. CACHED ACCESS-------------------------------------
+# 4.1. Indicators of one ticker from the store, cached per (ticker, field, kind, window)
+def ticker_indicators(store, ticker, field="Close", sma=(), ema=(), volatility=()):
+    """
+    Each indicator is computed once over the full history, so a range starting late
+    still has values from its first day. Cached results are dropped when the source
+    file of the ticker changes.
+
+    Returns:
+        pd.DataFrame: One column per indicator over the full history, indexed by Date.
+    """
+    column = f"{ticker}_{field}"
+    version = store.version(column)
+
+    # On the first miss every requested indicator is computed together in one pass
+    computed = None
+    def compute(name):
+        nonlocal computed
+        if computed is None:
+            computed = compute_indicators(store.get(column)[column], sma=sma, ema=ema, volatility=volatility)
+        return computed[name]
+
+    requested = [("sma", w) for w in sma] + [("ema", w) for w in ema] + [("volatility", w) for w in volatility]
+    columns = {}
+    for kind, window in requested:
+        name = indicator_name(kind, window)
+        columns[name] = indicator_cache.get_or_compute((column, version, kind, window), lambda name=name: compute(name))
+
+    if not columns:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="Date"))
+    return pd.DataFrame(columns)
@@ -0,0 +1,272 @@
+import os
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import util.cache_util as cache_util
+import util.store_util as store_util
+import util.pyramid_util as pyramid_util
+import util.mapping_util as mapping_util
+
+# OFFLINE INGESTION
+# Rebuilds data/yields/*_cleaned.csv and data/combined_data/*.csv from the raw
+# Bloomberg exports. Run from the repository root:
+#   python -m util.ingestion_util            (append new dates only)
+#   python -m util.ingestion_util --full     (rebuild every table)
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Folders holding the raw exports
+yields_dir = "data/yields"
+others_dir = "data/others"
+
+# 1.2. Date format used by every CSV in data/
+date_format = "%Y-%m-%d"
+
+# 1.3. Per-ticker cleaned yield tables (one ticker, no prefix)
+cleaned_yield_tickers = [
+    "GJTB3MO", "GJGB2", "GJGB5", "GJGB10", "GJGB30",
+    "GCNY3M", "GCNY2YR", "GCNY5YR", "GCNY10YR", "GCNY30YR",
+    "GACGB3M", "GACGB2", "GACGB5", "GACGB10", "GACGB30",
+    "USGG3M", "USGG2YR", "USGG5YR", "USGG10YR", "USGG30YR",
+]
+
+# 1.4. Combined tables: wide outer join of "<TICKER>_<column>" columns
+combined_tables = {
+    "data/combined_data/japan_full_yields_only.csv": {
+        "source_dir": yields_dir,
+        "tickers": ["GJTB3MO", "GJGB2", "GJGB5", "GJGB10", "GJGB30"],
+        "clean_columns": True,
+        "start_date": "2000-01-04",
+    },
+    "data/combined_data/china_full_yields_only.csv": {
+        "source_dir": yields_dir,
+        "tickers": ["GCNY3M", "GCNY2YR", "GCNY5YR", "GCNY10YR", "GCNY30YR"],
+        "clean_columns": True,
+        "start_date": "2005-06-06",
+        "rolling_mean_window": 12,
+    },
+    "data/combined_data/australia_full_yields_only.csv": {
+        "source_dir": yields_dir,
+        "tickers": ["GACGB3M", "GACGB2", "GACGB5", "GACGB10", "GACGB30"],
+        "clean_columns": True,
+        "start_date": "2000-01-04",
+    },
+    "data/combined_data/japan_swap_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["JYSOC", "JYSO2", "JYSO5", "JYSO10", "JYSO30"],
+        "clean_columns": False,
+        "start_date": None,
+    },
+    "data/combined_data/china_swap_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["CCSWO10", "CCSWO2", "CCSWO5", "CCSWOC"],
+        "clean_columns": False,
+        "start_date": None,
+    },
+    "data/combined_data/australia_swap_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["ADSWAP10", "ADSWAP2", "ADSWAP30", "ADSWAP5"],
+        "clean_columns": False,
+        "start_date": "2000-01-01",
+    },
+    "data/combined_data/japan_tibor_fixing_rate_df_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["TI0001M", "TI0003M", "TI0006M", "TI0012M"],
+        "clean_columns": True,
+        "start_date": "2000-01-04",
+    },
+    "data/combined_data/china_shibor_fixing_rate_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["SHIF1Y", "SHIF3M"],
+        "clean_columns": False,
+        "start_date": None,
+    },
+    "data/combined_data/china_loan_prime_rate_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["CHLRLPR1", "CHLRLPR5"],
+        "clean_columns": True,
+        "start_date": None,
+    },
+    "data/combined_data/china_cpi_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["CNCPIMOM", "CNCPIYOY"],
+        "clean_columns": True,
+        "start_date": "2000-01-01",
+    },
+    "data/combined_data/china_gdp_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["CNGDPQOQ", "EHGDCN"],
+        "clean_columns": True,
+        "start_date": "2000-01-01",
+    },
+    "data/combined_data/australia_gdp_combined.csv": {
+        "source_dir": others_dir,
+        "tickers": ["AUNAGDPC", "AUNAGDPY"],
+        "clean_columns": True,
+        "start_date": "2000-01-01",
+    },
+}
+
+# 1.5. Cleaned per-ticker tables share the same spec format
+cleaned_tables = {
+    f"{yields_dir}/{ticker}_cleaned.csv": {
+        "source_dir": yields_dir,
+        "tickers": [ticker],
+        "clean_columns": True,
+        "start_date": "2000-01-04",
+        "prefix": False,
+    }
+    for ticker in cleaned_yield_tickers
+}
+
+# 2. READ RAW EXPORTS-------------------------------------
+# 2.1. Find the raw export of a ticker ("<TICKER> <description>.xlsx")
+def find_source_file(source_dir, ticker):
+    matches = sorted(glob.glob(os.path.join(source_dir, f"{ticker} *.xlsx")))
+    if not matches:
+        raise FileNotFoundError(f"No export found for {ticker} in {source_dir}")
+    return matches[0]
+
+# 2.2. Vendor moving averages are exported as "SMAVG (50)  on Close"
+def clean_column_name(col):
+    return col.replace("on Close", "").strip()
+
+# 2.3. Load one ticker (runs inside a worker process)
+def load_ticker(source_path, clean_columns):
+    """
+    Loads a raw export through the Arrow cache. The slow openpyxl parse only happens
+    the first time a workbook is seen (or after it changes).
+    """
+    df = cache_util.read_excel_cached(source_path)
+    df = df[~df.index.duplicated(keep="last")]
+    if clean_columns:
+        df.columns = [clean_column_name(col) for col in df.columns]
+    return df
+
+# 2.4. Load every ticker needed by the given tables in parallel
+def load_all_tickers(tables, max_workers=None):
+    jobs = {}
+    for spec in tables.values():
+        for ticker in spec["tickers"]:
+            source_path = find_source_file(spec["source_dir"], ticker)
+            jobs[(ticker, spec["clean_columns"])] = source_path
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            key: executor.submit(load_ticker, source_path, key[1])
+            for key, source_path in jobs.items()
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+# 3. BUILD TABLES-------------------------------------
+# 3.1. Wide outer join of the tickers of one table
+def combine_tickers(spec, frames, after_date=None):
+    parts = []
+    for ticker in spec["tickers"]:
+        df = frames[(ticker, spec["clean_columns"])]
+        if spec.get("start_date"):
+            df = df.loc[pd.Timestamp(spec["start_date"]):]
+        if spec.get("prefix", True):
+            df = df.add_prefix(f"{ticker}_")
+        parts.append(df)
+
+    combined = pd.concat(parts, axis=1, join="outer").sort_index()
+    combined.index.name = "Date"
+    combined = add_rolling_means(combined.dropna(how="all"), spec)
+    # Derived columns need the history, so new dates are cut after they are computed
+    return combined if after_date is None else combined[combined.index > after_date]
+
+# 3.1.1. "<TICKER>_12_month_rolling_mean": mean of the last 12 valid closes, after the ticker's columns
+def add_rolling_means(combined, spec):
+    window = spec.get("rolling_mean_window")
+    if not window:
+        return combined
+    order = []
+    for ticker in spec["tickers"]:
+        closes = combined[f"{ticker}_Close"].dropna()
+        combined[f"{ticker}_{window}_month_rolling_mean"] = closes.rolling(window).mean().reindex(combined.index)
+        order += [col for col in combined.columns if col.startswith(f"{ticker}_")]
+    return combined[order]
+
+# 3.2. Header and last date of an existing table, without parsing the whole file
+def read_table_tail(table_path):
+    with open(table_path, "r") as f:
+        header = f.readline().rstrip("\n").split(",")
+
+    with open(table_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        block = b""
+        # Walk backwards until the last complete line is in the buffer
+        while position > 0 and block.count(b"\n") < 2:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            block = f.read(step) + block
+    last_line = block.rstrip(b"\n").split(b"\n")[-1].decode("utf-8")
+    last_date = pd.Timestamp(last_line.split(",")[0]) if last_line and last_line != ",".join(header) else None
+
+    return header, last_date
+
+# 3.3. Write a table from scratch
+def write_full_table(table_path, combined):
+    os.makedirs(os.path.dirname(table_path), exist_ok=True)
+    tmp_path = f"{table_path}.tmp"
+    combined.to_csv(tmp_path, date_format=date_format)
+    os.replace(tmp_path, table_path)
+    return len(combined)
+
+# 3.4. Append only the dates after the last stored date
+def update_table(table_path, spec, frames, full=False):
+    """
+    Returns the number of rows written. Falls back to a full rebuild when the table is
+    missing or when the tickers now produce columns the stored header does not have.
+    """
+    if full or not os.path.exists(table_path):
+        return write_full_table(table_path, combine_tickers(spec, frames))
+
+    header, last_date = read_table_tail(table_path)
+    new_rows = combine_tickers(spec, frames, after_date=last_date)
+    if new_rows.empty:
+        return 0
+
+    stored_columns = header[1:]
+    if any(col not in stored_columns for col in new_rows.columns):
+        return write_full_table(table_path, combine_tickers(spec, frames))
+
+    # Stored columns the exports no longer produce are left empty
+    new_rows = new_rows.reindex(columns=stored_columns)
+    new_rows.to_csv(table_path, mode="a", header=False, date_format=date_format)
+    return len(new_rows)
+
+# 3.5. Pre-aggregate the weekly/monthly/quarterly pyramid of every chart series
+def update_pyramid(tickers=None):
+    store = store_util.build_default_store()
+    return pyramid_util.build_pyramid(store, tickers or mapping_util.chart_tickers())
+
+# 3.6. Run the whole pipeline
+def run_ingestion(full=False, max_workers=None, tables=None, with_pyramid=True):
+    if tables is None:
+        tables = {**cleaned_tables, **combined_tables}
+
+    frames = load_all_tickers(tables, max_workers=max_workers)
+    written = {
+        table_path: update_table(table_path, spec, frames, full=full)
+        for table_path, spec in tables.items()
+    }
+
+    if with_pyramid:
+        update_pyramid()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build combined CSV tables from the raw exports.")
+    parser.add_argument("--full", action="store_true", help="Rebuild every table instead of appending new dates.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--no-pyramid", action="store_true", help="Skip the pre-aggregated chart pyramid.")
+    args = parser.parse_args()
+
+    written = run_ingestion(full=args.full, max_workers=args.workers, with_pyramid=not args.no_pyramid)
+    for table_path, rows in written.items():
+        print(f"{table_path}: {rows} new rows")
@@ -0,0 +1,227 @@
+# SERIES MAPPINGS
+# Which series the app draws for each country and where they come from. Kept apart from
+# the chart code so offline jobs (ingestion, batch forecasts, feature matrices) can use
+# them without importing Streamlit.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Yield column names
+yield_columns = {
+    "Japan": ["GJTB3MO_Close", "GJGB2_Close", "GJGB5_Close", "GJGB10_Close", "GJGB30_Close"],
+    "China": ['GCNY3M_Close', 'GCNY2YR_Close', 'GCNY5YR_Close', 'GCNY10YR_Close', 'GCNY30YR_Close'],
+    "Australia": ['GACGB3M_Close', 'GACGB2_Close', 'GACGB5_Close', 'GACGB10_Close', 'GACGB30_Close'],
+}
+
+# 1.2. Additional graphs
+additional_graphs = {
+    "Japan": ['3M Gov Yield', '2Y Gov Yield', '5Y Gov Yield', '10Y Gov Yield', '30Y Gov Yield', 
+              'JPY Swap Rates', 'TONAR Rate', 'TIBOR Fixing Rates', 'CPI YoY', 'GDP YoY', 
+              'Gov Debt % GDP', 'USD/JPY Exchange Rate', 'Unemployment Rate', 'Nikkei 225 Index'],
+    "China": ['3M Gov Yield', '2Y Gov Yield', '5Y Gov Yield', '10Y Gov Yield', '30Y Gov Yield',
+              'CNY Swap Rates', 'Loan Prime Rate', 'SHIBOR Fixing Rate', 'CPI YoY', 'GDP YoY',
+              'Gov Debt % GDP', 'USD/CNY Exchange Rate', 'Unemployment Rate', 'CSI 300 Index'],
+    "Australia": ['3M Gov Yield', '2Y Gov Yield', '5Y Gov Yield', '10Y Gov Yield', '30Y Gov Yield',
+                  'AUD Swap Rates', 'Cash Rate Target', 'CPI YoY', 'GDP YoY','Gov Debt % GDP', 
+                  'USD/AUD Exchange Rate', 'Unemployment Rate', 'Wage Growth YoY', 'ASX 200 Index'],
+}
+
+# 1.3. Yield mapping
+yield_mapping = {
+    '3M Gov Yield': {
+        'Japan': 'GJTB3MO',
+        'China': 'GCNY3M',
+        'Australia': 'GACGB3M',
+        'title': '3-Month Government Bond Yield Over Time'
+    },
+    '2Y Gov Yield': {
+        'Japan': 'GJGB2',
+        'China': 'GCNY2YR',
+        'Australia': 'GACGB2',
+        'title': '2-Year Government Bond Yield Over Time'
+    },
+    '5Y Gov Yield': {
+        'Japan': 'GJGB5',
+        'China': 'GCNY5YR',
+        'Australia': 'GACGB5',
+        'title': '5-Year Government Bond Yield Over Time'
+    },
+    '10Y Gov Yield': {
+        'Japan': 'GJGB10',
+        'China': 'GCNY10YR',
+        'Australia': 'GACGB10',
+        'title': '10-Year Government Bond Yield Over Time'
+    },
+    '30Y Gov Yield': {
+        'Japan': 'GJGB30',
+        'China': 'GCNY30YR',
+        'Australia': 'GACGB30',
+        'title': '30-Year Government Bond Yield Over Time'
+    },
+}
+
+# 1.4. multiple lines mapping
+multiple_lines_mapping = {
+    'JPY Swap Rates': {
+        "title": "JPY Overnight Index Swap (OIS) Rates Across Maturities",
+        "file_path": "data/combined_data/japan_swap_combined.csv",
+        "required_columns": ["JYSOC_Close", "JYSO2_Close", "JYSO5_Close", "JYSO10_Close", "JYSO30_Close"]
+    },
+    'TIBOR Fixing Rates': {
+        "title": "Japan TIBOR Fixing Rates Across Maturities",
+        "file_path": "data/combined_data/japan_tibor_fixing_rate_df_combined.csv",
+        "required_columns": ["TI0001M_Ask Price", "TI0003M_Ask Price", "TI0006M_Ask Price", "TI0012M_Ask Price"]
+    },
+    'CNY Swap Rates': {
+        "title": "CNY Interest Rate Swaps (IRS) on 7-Day Repo",
+        "file_path": "data/combined_data/china_swap_combined.csv",
+        "required_columns": ["CCSWOC_Close", "CCSWO2_Close", "CCSWO5_Close", "CCSWO10_Close"]
+    },
+    'SHIBOR Fixing Rate': {
+        "title": "Shanghai Interbank Offered Rate (SHIBOR) Trends Over Time",
+        "file_path": "data/combined_data/china_shibor_fixing_rate_combined.csv",
+        "required_columns": ["SHIF1Y_Close", "SHIF3M_Close"]
+    },
+    'AUD Swap Rates': {
+        "title": "AUD Interest Rate Swaps (IRS) vs. 6M Benchmark",
+        "file_path": "data/combined_data/australia_swap_combined.csv",
+        "required_columns": ["ADSWAP2_Close", "ADSWAP5_Close", "ADSWAP10_Close", "ADSWAP30_Close"]
+    }
+}
+
+# 1.5. multiple lines mapping with MA
+multiple_lines_mapping_with_ma = {
+    'TONAR Rate': {
+        "title": "TONAR: Japan's Unsecured Overnight Call Rate Movements Over Time",
+        "file_path": "data/others/MUTKCALM Bank of Japan Final Result - Unsecured Overnight Call Rate TONAR.xlsx",
+        "ticker": "MUTKCALM",
+    },
+    'USD/JPY Exchange Rate': {
+        "title": "USD/JPY Exchange Rate",
+        "file_path": "data/others/USDJPY Exchange Rate USD-JPY.xlsx",
+        "ticker": "USDJPY",
+    },
+    'Nikkei 225 Index': {
+        "title": "Nikkei 225 Index",
+        "file_path": "data/others/NKY Nikkei 225.xlsx",
+        "ticker": "NKY",
+    },
+    'USD/CNY Exchange Rate': {
+        "title": "USD/CNY Exchange Rate",
+        "file_path": "data/others/USDCNY Exchange Rate USD-CNY.xlsx",
+        "ticker": "USDCNY",
+    },
+    'CSI 300 Index': {
+        "title": "CSI 300 Index",
+        "file_path": "data/others/SHSZ300 CSI 300 Index.xlsx",
+        "ticker": "SHSZ300",
+    },
+    'USD/AUD Exchange Rate': {
+        "title": "USD/AUD Exchange Rate",
+        "file_path": "data/others/AUDUSD Exchange Rate USD-AUD.xlsx",
+        "ticker": "AUDUSD",
+    },
+    'ASX 200 Index': {
+        "title": "ASX 200 Index",
+        "file_path": "data/others/AS51 ASX 200 Index.xlsx",
+        "ticker": "AS51",
+    }
+}
+
+# 1.6. others mapping
+others_mapping = {
+    'CPI YoY': {
+        "title": "Consumer Price Index (CPI) Year-on-Year Growth",
+        "Japan": {
+            "file_path": "data/others/EHPIJP Japan Consumer Price Index (YoY _).xlsx",
+            "col": "Mid Price",
+            "frequency": "quarterly"
+        },
+        "China": {
+            "file_path": "data/others/CNCPIYOY Daily China CPI YoY.xlsx",
+            "col": "Last Price",
+            "frequency": "monthly"
+        },
+        "Australia": {
+            "file_path": "data/others/AUCPIYOY Australia CPI All Items YoY (Quarterly).xlsx",
+            "col": "Last Price",
+            "frequency": "quarterly"
+        },
+    },
+    'GDP YoY': {
+        "title": "Gross Domestic Product (GDP) Year-on-Year Growth",
+        "Japan": {
+            "file_path": "data/others/JGDPNSAQ Japan GDP Real Chained NSA YoY_.xlsx",
+            "col": "Last Price",
+            "frequency": "quarterly"
+        },
+        "China": {
+            "file_path": "data/others/EHGDCN China Real Quarterly GDP (Annual YoY _).xlsx",
+            "col": "Mid Price",
+            "frequency": "quarterly"
+        },
+        "Australia": {
+            "file_path": "data/others/AUNAGDPY Australia GDP SA YoY.xlsx",
+            "col": "Last Price",
+            "frequency": "quarterly"
+        },
+    },
+    'Gov Debt % GDP': {
+        "title": "Government Debt as a Percentage of GDP",
+        "Japan": {
+            "file_path": "data/others/GDDBJAPN Japan Debt as a Percentage of GDP.xlsx",
+            "col": "Mid Price",
+            "frequency": "yearly"
+        },
+        "China": {
+            "file_path": "data/others/CHBGDGOP China Government Debt as Percentage of GDP.xlsx",
+            "col": "Mid Price",
+            "frequency": "yearly"
+        },
+        "Australia": {
+            "file_path": "data/others/GDDBAUSL Australia Debt as a Percentage of GDP.xlsx",
+            "col": "Mid Price",
+            "frequency": "yearly"
+        },
+    },
+    'Unemployment Rate': {
+        "title": "Unemployment Rate",
+        "Japan": {
+            "file_path": "data/others/EHUPJP Japan Unemployment Rate.xlsx",
+            "col": "Mid Price",
+            "frequency": "quarterly"
+        },
+        "China": {
+            "file_path": "data/others/EHSRUCN China Quarterly Surveyed Unemployment Rate.xlsx",
+            "col": "Mid Price",
+            "frequency": "quarterly"
+        },
+        "Australia": {
+            "file_path": "data/others/EHUPAU Australia Unemployment Rate.xlsx",
+            "col": "Mid Price",
+            "frequency": "quarterly"
+        },
+    },
+    'Wage Growth YoY': {
+        "title": "Hourly Wage Growth (Excluding Bonuses, Year-on-Year, Seasonally Adjusted)",
+        "Australia": {
+            "file_path": "data/others/AUWCYSA Australia Wage Cost Hourly Rates of Pay Ex Bonuses YoY SA.xlsx",
+            "col": "Last Price",
+            "frequency": "quarterly"
+        }
+    },
+    'Cash Rate Target': {
+        "title": "RBA Cash Rate Target",
+        "Australia": {
+            "file_path": "data/others/RBATCTR Australia RBA Cash Rate Target.xlsx",
+            "col": "Last Price",
+            "frequency": "monthly"
+        }
+    }
+}
+
+# 2. DERIVED LISTS-------------------------------------
+# 2.1. Tickers drawn as line charts (their pyramid is built by the ingestion job)
+def chart_tickers():
+    tickers = [col.split("_")[0] for cols in yield_columns.values() for col in cols]
+    tickers += [col.split("_")[0] for mapping in multiple_lines_mapping.values() for col in mapping["required_columns"]]
+    tickers += [mapping["ticker"] for mapping in multiple_lines_mapping_with_ma.values()]
+    return list(dict.fromkeys(tickers))
@@ -0,0 +1,269 @@
+import os
+import re
+import json
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import util.query_util as query_util
+
+# MODEL REGISTRY
+# Index of the trained artifacts under models/<TICKER>/, parsed from their names:
+#   lstm-1-feature-60i7o-tuned.keras (+ lstm-1-feature-60i7o-tuned-scaler.pkl)
+#   lstm-important-features-60i7o.keras
+#   time_series_transformer-60i-7o-tuned/ (Hugging Face checkpoint folder)
+#   time_series_transformer-1/            (windows read from its config.json)
+# Models and scalers are deserialized on first use and kept in a bounded LRU per process.
+# Fine-tuned versions of an LSTM live beside it (see util/finetune_util.py):
+#   versions/lstm-1-feature-60i7o-tuned/v2/ (model.keras, scaler.pkl, metadata.json)
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Where the trained models live (override with MODELS_DIR)
+models_dir = os.getenv("MODELS_DIR", "models")
+
+# 1.2. Number of deserialized models kept warm per process (override with MODEL_CACHE_SIZE)
+max_warm_models = int(os.getenv("MODEL_CACHE_SIZE", "16"))
+
+# 1.3. File name patterns
+lstm_pattern = re.compile(
+    r"^(?P<architecture>lstm)-(?P<features>[a-z0-9]+-features?)-"
+    r"(?P<input_window>\d+)i(?P<output_window>\d+)o(?P<tuned>-tuned)?\.keras$"
+)
+transformer_pattern = re.compile(
+    r"^(?P<architecture>time_series_transformer)-"
+    r"(?:(?P<input_window>\d+)i-(?P<output_window>\d+)o(?P<tuned>-tuned)?|(?P<version>\d+))$"
+)
+
+# 1.3.1. Which version of a model is served: "latest" or "base" (override with MODEL_VERSION)
+serve_version = os.getenv("MODEL_VERSION", "latest")
+
+# 1.4. Columns of the registry
+registry_columns = [
+    "name", "ticker", "architecture", "features", "input_window", "output_window", "tuned", "path", "scaler_path",
+]
+
+# 1.5. Scalers saved with each LSTM: inputs and target
+Scalers = namedtuple("Scalers", ["x_scaler", "y_scaler"])
+
+# 1.6. Loaded registries and models
+registry_cache = query_util.LRUCache(max_entries=4)
+model_cache = query_util.LRUCache(max_entries=max_warm_models)
+
+# 2. PARSING-------------------------------------
+# 2.1. Windows of a transformer checkpoint that does not carry them in its name
+def transformer_windows(checkpoint_dir):
+    with open(os.path.join(checkpoint_dir, "config.json"), "r") as f:
+        config = json.load(f)
+    # The model sees context_length steps plus the largest lag before them
+    input_window = config["context_length"] + max(config.get("lags_sequence", [0]))
+    return input_window, config["prediction_length"]
+
+# 2.2. Parse one entry of models/<TICKER>/ (returns None if it is not a model)
+def parse_model_name(ticker_dir, entry):
+    """
+    Returns a registry row (dict) for a .keras file or a transformer checkpoint folder.
+    Scaler files are not models: they are attached to their LSTM as scaler_path.
+    """
+    path = os.path.join(ticker_dir, entry)
+    ticker = os.path.basename(os.path.normpath(ticker_dir))
+
+    match = lstm_pattern.match(entry)
+    if match:
+        name = entry[: -len(".keras")]
+        scaler_path = os.path.join(ticker_dir, f"{name}-scaler.pkl")
+        return {
+            "name": name,
+            "ticker": ticker,
+            "architecture": match["architecture"],
+            "features": match["features"],
+            "input_window": int(match["input_window"]),
+            "output_window": int(match["output_window"]),
+            "tuned": match["tuned"] is not None,
+            "path": path,
+            "scaler_path": scaler_path if os.path.exists(scaler_path) else None,
+        }
+
+    match = transformer_pattern.match(entry)
+    if match and os.path.isdir(path):
+        if match["version"] is None:
+            input_window, output_window = int(match["input_window"]), int(match["output_window"])
+        else:
+            input_window, output_window = transformer_windows(path)
+        return {
+            "name": entry,
+            "ticker": ticker,
+            "architecture": match["architecture"],
+            "features": "1-feature",
+            "input_window": input_window,
+            "output_window": output_window,
+            "tuned": match["tuned"] is not None,
+            "path": path,
+            "scaler_path": None, # the transformer scales its inputs itself
+        }
+
+    return None
+
+# 3. REGISTRY-------------------------------------
+# 3.1. Walk models/ and index every model
+def scan_models(root=None):
+    root = root or models_dir
+    rows = []
+    for ticker in sorted(os.listdir(root)):
+        ticker_dir = os.path.join(root, ticker)
+        if not os.path.isdir(ticker_dir):
+            continue
+        for entry in sorted(os.listdir(ticker_dir)):
+            row = parse_model_name(ticker_dir, entry)
+            if row is not None:
+                rows.append(row)
+    return pd.DataFrame(rows, columns=registry_columns)
+
+# 3.2. Registry of a models folder, rescanned when a ticker folder changes
+def get_registry(root=None):
+    root = root or models_dir
+    signature = tuple(
+        (entry.name, entry.stat().st_mtime_ns)
+        for entry in sorted(os.scandir(root), key=lambda e: e.name)
+        if entry.is_dir()
+    )
+    return registry_cache.get_or_compute((os.path.abspath(root), signature), lambda: scan_models(root))
+
+# 3.3. Query the registry (None means "any")
+def find_models(ticker=None, architecture=None, features=None, input_window=None, output_window=None, tuned=None, root=None):
+    registry = get_registry(root)
+    filters = {
+        "ticker": ticker,
+        "architecture": architecture,
+        "features": features,
+        "input_window": input_window,
+        "output_window": output_window,
+        "tuned": tuned,
+    }
+    mask = pd.Series(True, index=registry.index)
+    for col, value in filters.items():
+        if value is not None:
+            mask &= registry[col] == value
+    return registry[mask]
+
+# 3.4. The single model matching a query
+def get_model_spec(ticker, architecture="lstm", features="1-feature", input_window=None, output_window=None, tuned=True, root=None):
+    """
+    Returns:
+        dict: The registry row. When several models match, the one with the longest
+        input window is returned.
+
+    Raises:
+        KeyError: If no model matches.
+    """
+    matches = find_models(ticker, architecture, features, input_window, output_window, tuned, root)
+    if matches.empty:
+        raise KeyError(f"No {architecture} model for {ticker} ({features}, {input_window}i{output_window}o, tuned={tuned})")
+    spec = matches.sort_values("input_window").iloc[-1].to_dict()
+    if pd.isna(spec["scaler_path"]):
+        spec["scaler_path"] = None
+    return latest_version(spec) if serve_version == "latest" else spec
+
+# 3.5. Folder holding the fine-tuned versions of a model
+def versions_dir(spec):
+    base_path = spec.get("base_path", spec["path"])
+    return os.path.join(os.path.dirname(base_path), "versions", spec["name"])
+
+# 3.6. Metadata of every fine-tuned version of a model, oldest first
+def list_versions(spec):
+    folder = versions_dir(spec)
+    if not os.path.isdir(folder):
+        return []
+    versions = []
+    for entry in os.listdir(folder):
+        meta_path = os.path.join(folder, entry, "metadata.json")
+        if re.fullmatch(r"v\d+", entry) and os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                versions.append(json.load(f))
+    return sorted(versions, key=lambda meta: meta["version"])
+
+# 3.7. The registry row pointed at the newest version of its model (unchanged if there is none)
+def latest_version(spec):
+    versions = list_versions(spec) if spec["architecture"] == "lstm" else []
+    if not versions:
+        return spec
+    folder = os.path.join(versions_dir(spec), f"v{versions[-1]['version']}")
+    return {
+        **spec,
+        "path": os.path.join(folder, "model.keras"),
+        "scaler_path": os.path.join(folder, "scaler.pkl"),
+        "base_path": spec["path"],
+        "version": versions[-1]["version"],
+    }
+
+# 4. LAZY LOADING-------------------------------------
+# TensorFlow, joblib and transformers are imported on first use only: importing them
+# costs seconds and hundreds of MB, and pages that never forecast should not pay it.
+
+# 4.1. Deserialize a Keras model
+def load_keras_model(path):
+    from tensorflow import keras
+    return keras.models.load_model(path, compile=False)
+
+# 4.2. Deserialize the scalers of an LSTM
+def load_scaler(path):
+    """
+    Every *-scaler.pkl holds a (feature scaler, target scaler) tuple of MinMaxScalers.
+
+    Returns:
+        Scalers: x_scaler was fitted on the input columns (feature_names_in_ lists them in
+        training order) and is left unfitted for 1-feature models; y_scaler was fitted on
+        the target "<TICKER>_Close" and inverts the model outputs.
+    """
+    import joblib
+    x_scaler, y_scaler = joblib.load(path)
+    return Scalers(x_scaler, y_scaler)
+
+# 4.2.1. MinMaxScaler parameters of every model input, in the order the model reads them
+def input_scaling(scalers):
+    """
+    1-feature models read their closes scaled with y_scaler (x_scaler is unfitted).
+    Multi-feature models read the x_scaler columns followed by the target close scaled
+    with y_scaler, so they take one input more than x_scaler has features.
+
+    Returns:
+        tuple: (scale, min) arrays of shape (n_inputs,): scaled = x * scale + min.
+    """
+    x_scaler, y_scaler = scalers
+    if not hasattr(x_scaler, "scale_"):
+        return y_scaler.scale_.copy(), y_scaler.min_.copy()
+    return np.concatenate([x_scaler.scale_, y_scaler.scale_]), np.concatenate([x_scaler.min_, y_scaler.min_])
+
+# 4.3. Deserialize a Hugging Face TimeSeriesTransformer checkpoint
+def load_transformer(path):
+    from transformers import TimeSeriesTransformerForPrediction
+    model = TimeSeriesTransformerForPrediction.from_pretrained(path)
+    model.eval()
+    return model
+
+# 4.4. Identity of a model's artifact: changes when the file is replaced
+def model_version(spec):
+    return spec["path"], os.stat(spec["path"]).st_mtime_ns
+
+# 4.5. Model (and scaler) of a registry row, loaded once per process
+def load_model(spec):
+    """
+    Returns:
+        dict: {"spec", "model", "scalers"}. scalers (see load_scaler) is None for transformers.
+    """
+
+    def compute():
+        if spec["architecture"] == "lstm":
+            model = load_keras_model(spec["path"])
+        else:
+            model = load_transformer(spec["path"])
+        scalers = load_scaler(spec["scaler_path"]) if spec["scaler_path"] else None
+        return {"spec": spec, "model": model, "scalers": scalers}
+
+    return model_cache.get_or_compute(model_version(spec), compute)
+
+# 4.6. Look up and load in one call
+def get_model(ticker, architecture="lstm", features="1-feature", input_window=None, output_window=None, tuned=True, root=None):
+    return load_model(get_model_spec(ticker, architecture, features, input_window, output_window, tuned, root))
+
+# 4.7. Hit/miss counters of the warm model cache
+def model_cache_stats():
+    return model_cache.stats()
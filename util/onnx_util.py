@@ -0,0 +1,227 @@
+import os
+import json
+import argparse
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import util.query_util as query_util
+import util.store_util as store_util
+import util.model_util as model_util
+
+# ONNX EXPORT AND SERVING
+# Converts the Keras LSTMs to ONNX (optionally int8 dynamic-quantized) so the app can
+# serve them with onnxruntime, without importing TensorFlow or scikit-learn:
+#   python -m util.onnx_util                 (export every LSTM)
+#   python -m util.onnx_util --quantize      (also write the int8 versions)
+#   python -m util.onnx_util --check         (compare ONNX outputs with Keras)
+# Exports live next to the models in models/<TICKER>/onnx/.
+#
+# The TimeSeriesTransformer checkpoints are not exported: their forecasts come from
+# generate(), an autoregressive loop drawing Student-t samples, and the sampling ops
+# have no ONNX equivalent. They stay on the lazily imported torch path.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Serve the int8 models instead of float32 (set ONNX_QUANTIZED=1)
+use_quantized = os.getenv("ONNX_QUANTIZED", "0") == "1"
+
+# 1.2. Threads per inference session (the app serves many small requests)
+session_threads = int(os.getenv("ONNX_THREADS", "1"))
+
+# 1.3. ONNX opset used for the export
+onnx_opset = 17
+
+# 1.4. Loaded sessions
+session_cache = query_util.LRUCache(max_entries=model_util.max_warm_models)
+
+# 2. PATHS-------------------------------------
+# 2.1. Files of an exported model: graph, int8 graph, scaler parameters
+def onnx_paths(spec):
+    folder = os.path.join(os.path.dirname(spec["path"]), "onnx")
+    base = os.path.join(folder, spec["name"])
+    return {
+        "model": base + ".onnx",
+        "quantized": base + "-int8.onnx",
+        "scaler": base + "-scaler.json",
+    }
+
+# 2.2. Whether a model has an up-to-date export
+def has_export(spec, quantized=None):
+    quantized = use_quantized if quantized is None else quantized
+    paths = onnx_paths(spec)
+    model_path = paths["quantized"] if quantized else paths["model"]
+    if not (os.path.exists(model_path) and os.path.exists(paths["scaler"])):
+        return False
+    return os.stat(model_path).st_mtime_ns >= os.stat(spec["path"]).st_mtime_ns
+
+# 3. EXPORT-------------------------------------
+# 3.1. MinMaxScaler parameters as JSON (read without scikit-learn)
+def export_scaler(spec, path):
+    """
+    Writes the scaling of every model input (see model_util.input_scaling) as scale/min
+    and the target scaler, which inverts the outputs, as target_scale/target_min.
+    """
+    scalers = model_util.load_scaler(spec["scaler_path"])
+    scale, offset = model_util.input_scaling(scalers)
+    params = {
+        "scale": scale.tolist(),
+        "min": offset.tolist(),
+        "target_scale": scalers.y_scaler.scale_.tolist(),
+        "target_min": scalers.y_scaler.min_.tolist(),
+        "feature_names": [str(name) for name in getattr(scalers.x_scaler, "feature_names_in_", [])],
+    }
+    with open(path, "w") as f:
+        json.dump(params, f)
+
+# 3.2. Convert one Keras LSTM to ONNX
+def export_lstm(spec, quantize=False):
+    """
+    Returns:
+        dict: The written paths (see onnx_paths).
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    paths = onnx_paths(spec)
+    os.makedirs(os.path.dirname(paths["model"]), exist_ok=True)
+
+    model = model_util.load_model(spec)["model"]
+    n_inputs = model.inputs[0].shape[-1]
+    signature = [tf.TensorSpec((None, spec["input_window"], n_inputs), tf.float32, name="input")]
+    # Traced as a function: tf2onnx.convert.from_keras does not support Keras 3 models
+    forward = tf.function(lambda inputs: model(inputs, training=False), input_signature=signature)
+    tf2onnx.convert.from_function(forward, input_signature=signature, opset=onnx_opset, output_path=paths["model"])
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(paths["model"], paths["quantized"], weight_type=QuantType.QInt8)
+
+    export_scaler(spec, paths["scaler"])
+    return paths
+
+# 3.3. Export every LSTM of the registry
+def export_all(quantize=False, tickers=None):
+    exported = []
+    registry = model_util.find_models(architecture="lstm")
+    for spec in registry.to_dict("records"):
+        if tickers and spec["ticker"] not in tickers:
+            continue
+        if not isinstance(spec["scaler_path"], str):
+            continue
+        # Export what is served: the newest fine-tuned version if there is one
+        if model_util.serve_version == "latest":
+            spec = model_util.latest_version(spec)
+        export_lstm(spec, quantize)
+        exported.append(spec["path"])
+    return exported
+
+# 4. SERVING-------------------------------------
+# 4.1. onnxruntime session of an exported model (cached per process)
+def load_session(spec, quantized=None):
+    quantized = use_quantized if quantized is None else quantized
+    paths = onnx_paths(spec)
+    model_path = paths["quantized"] if quantized else paths["model"]
+
+    def compute():
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = session_threads
+        options.inter_op_num_threads = 1
+        session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        with open(paths["scaler"], "r") as f:
+            scaler = json.load(f)
+        return {
+            "session": session,
+            "scale": np.array(scaler["scale"]),
+            "min": np.array(scaler["min"]),
+            "target_scale": np.array(scaler["target_scale"]),
+            "target_min": np.array(scaler["target_min"]),
+        }
+
+    return session_cache.get_or_compute((model_path, os.stat(model_path).st_mtime_ns), compute)
+
+# 4.2. Run an exported model on a batch of scaled windows
+def run_session(loaded, inputs):
+    session = loaded["session"]
+    name = session.get_inputs()[0].name
+    outputs = session.run(None, {name: np.ascontiguousarray(inputs, dtype=np.float32)})[0]
+    return outputs.reshape(len(inputs), -1)
+
+# 5. PARITY CHECK-------------------------------------
+# 5.1. The last n_windows complete input windows of a model, unscaled
+def parity_windows(spec, n_windows=64, store=None):
+    """
+    Returns:
+        np.ndarray: Shape (n_windows, input_window, n_inputs): the ticker's closes for a
+        1-feature model, its feature matrix (feature_util) for a multi-feature one.
+    """
+    import util.feature_util as feature_util # only the multi-feature models need it
+
+    store = store or store_util.build_default_store()
+    if spec["features"] == "1-feature":
+        column = f"{spec['ticker']}_Close"
+        values = store.get(column)[column].dropna().to_numpy()
+        return sliding_window_view(values, spec["input_window"])[-n_windows:, :, None]
+
+    windows, _ = feature_util.feature_windows(spec, all_origins=True, store=store)
+    complete = ~np.isnan(windows).any(axis=(1, 2))
+    return windows[complete][-n_windows:]
+
+# 5.2. Compare the ONNX outputs of a model with the Keras outputs on real windows
+def check_parity(spec, n_windows=64, quantized=False, store=None):
+    """
+    Runs both models on the last n_windows input windows of the model's history.
+
+    Returns:
+        dict: max and mean absolute difference, in scaled units and in yield units.
+    """
+    windows = parity_windows(spec, n_windows, store)
+    loaded = load_session(spec, quantized)
+    scaled = (windows * loaded["scale"] + loaded["min"]).astype(np.float32)
+
+    keras_model = model_util.load_model(spec)["model"]
+    expected = np.asarray(keras_model(scaled, training=False)).reshape(len(scaled), -1)
+    actual = run_session(loaded, scaled)
+
+    diff = np.abs(expected - actual)
+    return {
+        "model": spec["path"],
+        "quantized": quantized,
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "max_abs_diff_yield": float(diff.max() / loaded["target_scale"][0]),
+    }
+
+# 5.3. Parity of every exported model (fails loudly above the tolerance)
+def check_all(quantized=False, tolerance=None):
+    # float32 exports should match to rounding; int8 weights move outputs slightly
+    tolerance = tolerance if tolerance is not None else (5e-2 if quantized else 1e-4)
+    store = store_util.build_default_store()
+    results = []
+    for spec in model_util.find_models(architecture="lstm").to_dict("records"):
+        if model_util.serve_version == "latest":
+            spec = model_util.latest_version(spec)
+        if not has_export(spec, quantized):
+            continue
+        result = check_parity(spec, quantized=quantized, store=store)
+        result["ok"] = result["max_abs_diff"] <= tolerance
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the LSTM models to ONNX.")
+    parser.add_argument("--quantize", action="store_true", help="Also write int8 dynamic-quantized models.")
+    parser.add_argument("--check", action="store_true", help="Only compare exported models with Keras.")
+    parser.add_argument("--tickers", nargs="*", default=None, help="Only export these tickers.")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = 0
+        for quantized in ([False, True] if args.quantize else [False]):
+            for result in check_all(quantized):
+                failures += not result["ok"]
+                print(f"{'OK  ' if result['ok'] else 'FAIL'} {result['model']} (int8={quantized}): "
+                      f"max diff {result['max_abs_diff']:.2e} ({result['max_abs_diff_yield']:.4f} pts)")
+        raise SystemExit(1 if failures else 0)
+
+    for path in export_all(quantize=args.quantize, tickers=args.tickers):
+        print(f"Exported {path}")
@@ -2,10 +2,40 @@ import pandas as pd
 import openai
 from dotenv import load_dotenv
 import os
+import time
+import json
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import util.cache_util as cache_util
+import util.store_util as store_util
+import util.range_stats_util as range_stats_util
+import util.indicator_util as indicator_util
 # Load API key
 load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
+# Endpoint of the API (set OPENAI_BASE_URL to point the app at a local stub server)
+openai_base_url = os.getenv("OPENAI_BASE_URL")
+
+# Persistent response cache: answers are reused across users and restarts until they expire
+response_cache_path = os.getenv("AI_CACHE_PATH", os.path.join(cache_util.CACHE_DIR, "ai_responses.sqlite"))
+response_cache_ttl = float(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600)))
+response_cache_size = int(os.getenv("AI_CACHE_SIZE", "1000"))
+
+# Settings shared by every request
+system_prompt = (
+    "You are a financial analyst specializing in bond markets, monetary policy, and macroeconomics. "
+    "Summarize your analysis clearly and concisely within the given token limit. "
+    "Prioritize key insights, avoid excessive details, and structure responses effectively."
+)
+max_response_tokens = 500
+response_temperature = 0.2  # More factual responses
+
+# Maximum tokens of a multi-factor prompt (override with AI_PROMPT_TOKEN_BUDGET)
+prompt_token_budget = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "1200"))
+
 # Mapping of tickers to human-readable maturities
 ticker_mapping = {
     "GJTB3MO_Close": "3M Yield",
@@ -47,57 +77,66 @@ ticker_mapping = {
 }
 
 # 1. Summarize basic trends
-def summarize_basic_trends(df_filtered, start_date, end_date, title):
-    # Ensure Date is the index and filter for the given period
-    df_filtered = df_filtered.loc[start_date:end_date]
-
-    # Drop columns containing "SMAVG" (if applicable)
-    df_filtered = df_filtered.loc[:, ~df_filtered.columns.str.contains("SMAVG")]
-
-    # Handle empty data
-    if df_filtered.empty:
-        return "No data to analyze."
+# 1.1. One line of a trend summary from the statistics of a column
+def format_trend(col, stats):
+    """
+    stats (dict): count, first, last, first_date, min and max of the column over the period.
+    """
+    if stats is None:
+        return f"📈 **{col}**: No available data."
 
-    summary = [f"📊 **{title} Summary:**\n"]
+    if stats["count"] == 1:
+        date_str = pd.Timestamp(stats["first_date"]).strftime('%d/%m/%Y')
+        return f"📈 {ticker_mapping.get(col, '')} on {date_str}: {stats['first']:.2f}"
 
-    # Generate full summary
-    for col in df_filtered.columns:
-        series = df_filtered[col].dropna()
+    # Get first and last values
+    start = stats["first"]
+    end = stats["last"]
+    change = end - start
+    percent_change = (change / start) * 100 if start != 0 else "N/A"
 
-        if series.empty:
-            summary.append(f"📈 **{col}**: No available data.")
-            continue
+    # Determine overall trend direction
+    trend = "⬆️ Increased" if end > start else "⬇️ Decreased" if end < start else "➡️ Stable"
 
-        if len(series) == 1:
-            date_str = series.index[0].strftime('%d/%m/%Y')
-            summary.append(f"📈 {ticker_mapping.get(col, '')} on {date_str}: {series.iloc[0]:.2f}")
-            continue
+    # Detect significant fluctuations (if max-min difference is large)
+    fluctuation = stats["max"] - stats["min"]
+    volatility = "⚠️ High fluctuations" if fluctuation > (0.1 * abs(start)) else "🔹 Relatively stable"
 
-        # Get first and last values
-        start = series.iloc[0]
-        end = series.iloc[-1]
-        change = end - start
-        percent_change = (change / start) * 100 if start != 0 else "N/A"
+    if col in ticker_mapping:
+        col = ticker_mapping[col]
+    else:
+        col = ""
 
-        # Determine overall trend direction
-        trend = "⬆️ Increased" if end > start else "⬇️ Decreased" if end < start else "➡️ Stable"
+    # Format the summary
+    return f"{col} {trend} ({start:.2f} → {end:.2f}, Change: {change:+.2f}, {percent_change:+.2f}%). {volatility}.\n"
 
-        # Detect significant fluctuations (if max-min difference is large)
-        fluctuation = series.max() - series.min()
-        volatility = "⚠️ High fluctuations" if fluctuation > (0.1 * abs(start)) else "🔹 Relatively stable"
+# 1.2. Same summary for series of the store, read from their range-statistics index
+def summarize_trends(columns, start_date, end_date, title, store=None):
+    """
+    Costs a few binary searches per column whatever the length of the period.
 
-        if col in ticker_mapping:
-            col = ticker_mapping[col]
-        else:
-            col = ""
+    Returns:
+        str or None: The summary, None if no column has data in the period.
+    """
+    store = store or store_util.build_default_store()
+    columns = [col for col in columns if not indicator_util.is_indicator_column(col)]
+    try:
+        stats = range_stats_util.range_stats(store, columns, start_date, end_date)
+    except KeyError:
+        return None
+    if all(value is None for value in stats.values()):
+        return None
 
-        # Format the summary
-        summary.append(f"{col} {trend} ({start:.2f} → {end:.2f}, Change: {change:+.2f}, {percent_change:+.2f}%). {volatility}.\n")
-    
+    summary = [f"📊 **{title} Summary:**\n"]
+    summary += [format_trend(col, stats[col]) for col in columns]
     return "\n".join(summary)
 
 # 2. Generate prompt for yield curve of the selected prompt
-def generate_prompt_for_a_single_day(df, selected_date, country):
+def generate_prompt_for_a_single_day(df, selected_date, country, shape=None):
+    """
+    shape (str, optional): Shape of the curve from curve_shape_util. When given, the model
+    is told the shape instead of being asked for it and only writes the interpretation.
+    """
     if df.empty:
         return ""
     
@@ -109,6 +148,15 @@ def generate_prompt_for_a_single_day(df, selected_date, country):
     for col in df.columns:
         prompt.append(f"- {ticker_mapping[col]}: {df[col].values[0]:.4f}%")
 
+    if shape is not None:
+        prompt.append(f"- Shape of the curve: {shape}")
+        prompt.append("""
+        Analysis Questions (answer shortly):
+        1. What does this shape indicate about the economy? 
+        - Does it suggest economic expansion, slowdown, or uncertainty?
+        """)
+        return "\n".join(prompt)
+
     # Add analysis questions
     prompt.append("""
         Analysis Questions (answer shortly):
@@ -142,64 +190,351 @@ def generate_yield_curve_trend_prompt(country, start_date, end_date, trend_summa
     return prompt
 
 # 4. Generated prompt for additional data
-def generate_multi_data_prompt(country, start_date, end_date, summary_for_prompt):
-    # Yield Curve Summary (First Element)
-    yield_curve_summary = summary_for_prompt[0]
+# The yield curve and every selected indicator become rows of one compact table, the
+# questions are asked once for all of them, and the prompt is cut to a token budget by
+# dropping the indicator rows that moved the least.
 
-    # Additional Insights (If Any)
-    additional_summaries = summary_for_prompt[1:]
-
-    prompt = f"""
-    # Macroeconomic & Yield Curve Analysis for {country} ({start_date} - {end_date})
-
-    ## Yield Curve Key Trends:
-    {yield_curve_summary}
+# 4.1. Tokens of a text, counted locally (tiktoken when installed, ~4 characters per token otherwise)
+def count_tokens(text, model="gpt-4o"):
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text) // 4 + 1
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return len(encoding.encode(text))
 
+# 4.2. One table row per series with data in the period
+def trend_rows(sections, start_date, end_date, store=None):
     """
+    Args:
+        sections (list): (title, columns) of the yield curve first, then of each indicator.
+        store (TimeSeriesStore, optional): Data source. Defaults to the store under data/.
 
-    if additional_summaries:
-        prompt += "## **Additional Insights & Impact Analysis:**\n"
-        for summary in additional_summaries:
-            prompt += f"""
-            🔍 **Data Summary:**
-            {summary}
-
-            - How has this indicator evolved over the period?
-            - What does this trend suggest about {country}'s economy?
-            - Could this data have influenced the yield curve? If so, how?
-            """
+    Returns:
+        list: Dicts with section, series, first, last, change, percent change, range and
+        signal (relative size of the move, used to decide what to drop first).
+    """
+    store = store or store_util.build_default_store()
+    rows = []
+    for position, (title, columns) in enumerate(sections):
+        columns = [col for col in columns if not indicator_util.is_indicator_column(col)]
+        try:
+            stats = range_stats_util.range_stats(store, columns, start_date, end_date)
+        except KeyError:
+            continue
+        for col in columns:
+            if stats[col] is None:
+                continue
+            first, last = stats[col]["first"], stats[col]["last"]
+            change, spread = last - first, stats[col]["max"] - stats[col]["min"]
+            scale = abs(first) if first != 0 else 1.0
+            rows.append({
+                "section": title,
+                "series": ticker_mapping.get(col, col.replace("_", " ")),
+                "first": first,
+                "last": last,
+                "change": change,
+                "percent_change": change / first * 100 if first != 0 else None,
+                "range": spread,
+                "high_fluctuation": spread > 0.1 * abs(first),
+                "signal": max(abs(change), spread / 2) / scale,
+                "is_yield_curve": position == 0,
+            })
+    return rows
+
+# 4.3. Rows as a pipe-separated table (one header, short numbers)
+def format_trend_table(rows):
+    lines = ["indicator|series|first|last|chg|chg%|range"]
+    for row in rows:
+        percent = f"{row['percent_change']:+.1f}" if row["percent_change"] is not None else "n/a"
+        flag = "*" if row["high_fluctuation"] else ""
+        lines.append(
+            f"{row['section']}|{row['series']}|{row['first']:.2f}|{row['last']:.2f}|"
+            f"{row['change']:+.2f}|{percent}|{row['range']:.2f}{flag}"
+        )
+    return "\n".join(lines)
 
-    prompt += "\n**Please provide a concise, structured response.**"
-    
+# 4.4. Compact multi-factor prompt within a token budget
+def generate_multi_data_prompt(country, start_date, end_date, trend_sections, token_budget=None, store=None):
+    """
+    Args:
+        start_date, end_date (datetime): Period of the analysis.
+        trend_sections (list): (title, columns) of the yield curve first, then of each
+            selected indicator.
+        token_budget (int, optional): Maximum prompt tokens. Defaults to AI_PROMPT_TOKEN_BUDGET.
+        store (TimeSeriesStore, optional): Data source (pass the app's shared store).
+            Defaults to the store under data/.
+
+    Returns:
+        str: The prompt. Over the budget, indicator rows are dropped from the lowest signal
+        up; the yield curve rows are always kept.
+    """
+    token_budget = token_budget or prompt_token_budget
+    rows = trend_rows(trend_sections, start_date, end_date, store)
+
+    period = f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
+
+    def build(rows):
+        return "\n".join([
+            f"Macroeconomic & Yield Curve Analysis for {country} ({period})",
+            "Values over the period: first, last, change, % change, range (max - min); * = high fluctuation.",
+            format_trend_table(rows),
+            "",
+            "Questions:",
+            "1. How did the yield curve evolve over the period?",
+            f"2. For each other indicator: how did it evolve, what does it suggest about {country}'s economy, "
+            "and could it have influenced the yield curve? If so, how?",
+            "Please provide a concise, structured response.",
+        ])
+
+    prompt = build(rows)
+    droppable = sorted((row for row in rows if not row["is_yield_curve"]), key=lambda row: row["signal"])
+    while droppable and count_tokens(prompt) > token_budget:
+        dropped = droppable.pop(0)
+        rows = [row for row in rows if row is not dropped]
+        prompt = build(rows)
     return prompt
 
 
-# 5. Given any prompt, generate OpenAI's response
-def get_openai_response(prompt, basic=False):
+# 5. OpenAI layer: one pooled async client, a persistent cache, in-flight deduplication
+# All requests run on one background event loop, which owns the AsyncOpenAI client (and so
+# its connection pool). Streamlit script threads submit coroutines to it and wait.
+
+# 5.1. Persistent TTL/LRU cache of responses (SQLite, safe across threads and processes)
+class ResponseCache:
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self.path = path or response_cache_path
+        self.ttl = response_cache_ttl if ttl is None else ttl
+        self.max_entries = max_entries or response_cache_size
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, temperature REAL, response TEXT, created REAL, last_used REAL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # 5.1.1. Cached response (None if missing or expired)
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    # 5.1.2. Store a response, evicting the least recently used ones beyond max_entries
+    def put(self, key, model, temperature, response):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, temperature, response, now, now),
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    # 5.1.3. Drop every cached response
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+# 5.2. Cache key of a request: model, hash of the messages, temperature
+def response_key(model, prompt, temperature, max_tokens=None):
+    messages = json.dumps([system_prompt, prompt, max_tokens or max_response_tokens])
+    prompt_hash = hashlib.sha256(messages.encode("utf-8")).hexdigest()
+    return f"{model}:{prompt_hash}:{temperature}"
+
+# 5.3. Background event loop shared by every request of the process
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_response_cache = None
+_inflight = {}  # cache key -> SharedStream of a request still running
+_inflight_lock = threading.Lock()
+
+def get_event_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True, name="openai-loop").start()
+        return _loop
+
+# 5.3.1. Run a coroutine on the background loop (returns a concurrent.futures.Future)
+def run_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+# 5.3.2. Pooled client, created once inside the loop
+def get_client():
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(api_key=openai_api_key, base_url=openai_base_url)
+    return _client
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+# 5.4. Model of a request: GPT-3.5 for a cheaper response, otherwise GPT-4o
+def response_model(basic=False):
+    return "gpt-3.5-turbo" if basic else "gpt-4o"
+
+# 6. Streaming: tokens are rendered as they arrive, and a request can be cancelled
+# Identical requests share one upstream call: the first caller starts a SharedStream,
+# later ones join it through _inflight, and each reads it with its own StreamingResponse.
+# 6.1. Tokens of one request running on the background loop
+class SharedStream:
+    def __init__(self, key):
+        self.key = key
+        self.text = ""
+        self.error = None
+        self.future = None
+        self.readers = 0
+        self._changed = threading.Condition()
+
+    def _append(self, token):
+        with self._changed:
+            self.text += token
+            self._changed.notify_all()
+
+    def _finish(self, _):
+        with _inflight_lock:
+            if _inflight.get(self.key) is self:
+                del _inflight[self.key]
+        with self._changed:
+            self._changed.notify_all()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+# 6.2. One caller's view of a shared stream
+class StreamingResponse:
     """
-    basic (bool): If True, use GPT-3.5 for a cheaper response; otherwise, use GPT-4o.
+    The Streamlit script reads the tokens with stream(), and a rerun can pick the same
+    response up again.
     """
-    try:
-        client = openai.OpenAI(api_key=openai_api_key)
-        model = "gpt-3.5-turbo" if basic else "gpt-4o"
 
-        response = client.chat.completions.create(
+    def __init__(self, shared):
+        self.shared = shared
+        self._cancelled = False
+
+    def done(self):
+        return self._cancelled or self.shared.done()
+
+    def cancelled(self):
+        return self._cancelled or (self.shared.done() and self.shared.future.cancelled())
+
+    # 6.2.1. Stop reading; the request is cancelled (nothing is cached) once no caller reads it
+    def cancel(self):
+        shared = self.shared
+        with _inflight_lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            shared.readers -= 1
+            last = shared.readers == 0
+            if last and _inflight.get(shared.key) is shared:
+                del _inflight[shared.key]  # a new caller starts a new request
+        if last:
+            shared.future.cancel()
+        with shared._changed:
+            shared._changed.notify_all()
+
+    # 6.2.2. Text pieces as they arrive, from the beginning (for st.write_stream)
+    def stream(self, poll_interval=0.1):
+        shared = self.shared
+        sent = 0
+        while True:
+            with shared._changed:
+                if len(shared.text) == sent and not self.done():
+                    shared._changed.wait(poll_interval)
+                text, finished = shared.text, self.done()
+            if self._cancelled:
+                return
+            if len(text) > sent:
+                yield text[sent:]
+                sent = len(text)
+            if finished:
+                break
+        if shared.error is not None:
+            yield f"⚠️ Error: {str(shared.error)}"
+
+    # 6.2.3. Full text once finished (with the error message if it failed)
+    def result(self):
+        shared = self.shared
+        return shared.text.strip() if shared.error is None else f"⚠️ Error: {str(shared.error)}"
+
+# 6.3. Stream one chat completion into a SharedStream (cached responses arrive at once)
+async def stream_completion(shared, prompt, model, temperature=None, max_tokens=None):
+    temperature = response_temperature if temperature is None else temperature
+    max_tokens = max_tokens or max_response_tokens
+    key = response_key(model, prompt, temperature, max_tokens)
+
+    cached = get_response_cache().get(key)
+    if cached is not None:
+        shared._append(cached)
+        return
+
+    try:
+        stream = await get_client().chat.completions.create(
             model=model,
             messages=[
-                {
-                    "role": "system",
-                    "content": "You are a financial analyst specializing in bond markets, monetary policy, and macroeconomics. "
-                        "Summarize your analysis clearly and concisely within the given token limit. "
-                        "Prioritize key insights, avoid excessive details, and structure responses effectively."
-                },
-                {"role": "user", "content": prompt}
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
             ],
-            max_tokens=500,
-            temperature=0.2  # More factual responses
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
         )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    shared._append(chunk.choices[0].delta.content)
+        finally:
+            await stream.close()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        shared.error = e
+        return
 
-        # ✅ Extract and return the response text
-        return response.choices[0].message.content.strip()
+    get_response_cache().put(key, model, temperature, shared.text.strip())
 
-    except Exception as e:
-        return f"⚠️ Error: {str(e)}"
\ No newline at end of file
+# 6.4. Start streaming OpenAI's response to a prompt without waiting for it
+def start_openai_stream(prompt, basic=False):
+    """
+    basic (bool): If True, use GPT-3.5 for a cheaper response; otherwise, use GPT-4o.
+
+    Returns:
+        StreamingResponse: Read it with stream(), stop it with cancel(). A caller asking
+        a prompt that is already streaming joins that request instead of sending it again.
+    """
+    model = response_model(basic)
+    key = response_key(model, prompt, response_temperature)
+    with _inflight_lock:
+        shared = _inflight.get(key)
+        started = shared is None
+        if started:
+            shared = SharedStream(key)
+            shared.future = run_async(stream_completion(shared, prompt, model))
+            _inflight[key] = shared
+        shared.readers += 1
+    if started:
+        # Outside the lock: the callback takes it, and runs at once if the request already ended
+        shared.future.add_done_callback(shared._finish)
+    return StreamingResponse(shared)
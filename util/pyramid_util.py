@@ -0,0 +1,210 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import util.cache_util as cache_util
+import util.query_util as query_util
+
+# MULTI-RESOLUTION PYRAMID
+# Weekly, monthly and quarterly rollups of every chart series. For each period and
+# series we keep the first, last, min and max values together with their dates (M4
+# aggregation), so a line drawn from a coarse level still shows every spike and trough.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Levels from coarsest to finest, with their average length in days
+pyramid_levels = {
+    "quarterly": 91.31,
+    "monthly": 30.44,
+    "weekly": 7.0,
+}
+
+# 1.2. Statistics kept per series and period
+rollup_stats = ["first", "min", "max", "last"]
+
+# 1.3. Where the pyramid files live
+def pyramid_dir(cache_dir=None):
+    return os.path.join(cache_dir or cache_util.CACHE_DIR, "pyramid")
+
+# 1.4. Loaded levels kept in memory
+level_cache = query_util.LRUCache(max_entries=256)
+
+# 2. PERIODS-------------------------------------
+# 2.1. Period number of each date (dates are int64 nanoseconds)
+def period_codes(dates, level):
+    days = dates // (86_400 * 10**9)
+    if level == "weekly":
+        # 1970-01-01 is a Thursday: shift so weeks start on Monday
+        return (days + 3) // 7
+    months = dates.astype("datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+    if level == "monthly":
+        return months
+    if level == "quarterly":
+        return months // 3
+    raise ValueError(f"Unknown pyramid level: {level}")
+
+# 2.2. First day of each period
+def period_starts(codes, level):
+    if level == "weekly":
+        days = codes * 7 - 3
+        return days.astype("datetime64[D]").astype("datetime64[ns]")
+    months = codes if level == "monthly" else codes * 3
+    return months.astype("datetime64[M]").astype("datetime64[ns]")
+
+# 3. ROLLUPS-------------------------------------
+# 3.1. First/min/max/last (with dates) of one series for every period
+def rollup_series(dates, values, level):
+    """
+    Vectorized rollup of a sorted series.
+
+    Returns:
+        pd.DataFrame: Indexed by period code, with "<stat>" and "<stat>_date" columns.
+    """
+    valid = ~np.isnan(values)
+    dates, values = dates[valid], values[valid]
+    if len(values) == 0:
+        return pd.DataFrame(columns=[c for stat in rollup_stats for c in (stat, f"{stat}_date")])
+
+    codes = period_codes(dates, level)
+    starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+    ends = np.r_[starts[1:], len(codes)] - 1
+
+    # Sorting by (code, value) puts each period's min first and max last within its group
+    by_value = np.lexsort((values, codes))
+    min_positions = by_value[starts]
+    max_positions = by_value[ends]
+
+    rollup = pd.DataFrame({
+        "first": values[starts], "first_date": dates[starts],
+        "min": values[min_positions], "min_date": dates[min_positions],
+        "max": values[max_positions], "max_date": dates[max_positions],
+        "last": values[ends], "last_date": dates[ends],
+    }, index=codes[starts])
+    return rollup
+
+# 3.2. Rollup of several columns sharing one period axis
+def rollup_frame(df, level):
+    parts = {}
+    dates = df.index.values.astype("datetime64[ns]").view(np.int64)
+    for col in df.columns:
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        rollup = rollup_series(dates, values, level)
+        rollup.columns = [f"{col}|{stat}" for stat in rollup.columns]
+        parts[col] = rollup
+
+    table = pd.concat(parts.values(), axis=1).sort_index()
+    codes = table.index.to_numpy(dtype=np.int64)
+    table.insert(0, "End", period_starts(codes + 1, level))
+    table.insert(0, "Date", period_starts(codes, level))
+    return table.reset_index(drop=True)
+
+# 4. BUILD AND LOAD-------------------------------------
+# 4.1. Files of one ticker and level
+def pyramid_paths(ticker, level, cache_dir=None):
+    base = os.path.join(pyramid_dir(cache_dir), level, ticker)
+    return base + ".arrow", base + ".json"
+
+# 4.2. Build every level of one ticker from the store
+def build_ticker_pyramid(store, ticker, cache_dir=None):
+    columns = store.ticker_columns(ticker)
+    version = store.version(columns)
+    df = store.get(columns, dropna=False)
+
+    for level in pyramid_levels:
+        table = rollup_frame(df, level)
+        arrow_path, meta_path = pyramid_paths(ticker, level, cache_dir)
+        arrays = [pa.array(table[col].to_numpy(), from_pandas=True) for col in table.columns]
+        cache_util.write_arrow(pa.Table.from_arrays(arrays, names=list(table.columns)), arrow_path)
+        with open(meta_path, "w") as f:
+            json.dump({"ticker": ticker, "version": [list(v) for v in version]}, f)
+
+    return version
+
+# 4.3. Build the pyramid for a list of tickers (called by the ingestion job)
+def build_pyramid(store, tickers, cache_dir=None):
+    for ticker in tickers:
+        build_ticker_pyramid(store, ticker, cache_dir)
+    return list(tickers)
+
+# 4.4. Load one level of a ticker, rebuilding it if the source data changed
+def load_level(store, ticker, level, cache_dir=None):
+    version = store.version(store.ticker_columns(ticker))
+
+    def compute():
+        arrow_path, meta_path = pyramid_paths(ticker, level, cache_dir)
+        try:
+            with open(meta_path, "r") as f:
+                stored_version = tuple(tuple(v) for v in json.load(f)["version"])
+        except (OSError, ValueError, KeyError):
+            stored_version = None
+        if stored_version != version or not os.path.exists(arrow_path):
+            build_ticker_pyramid(store, ticker, cache_dir)
+        return cache_util.open_arrow(arrow_path).to_pandas()
+
+    return level_cache.get_or_compute((ticker, level, version, cache_dir), compute)
+
+# 5. CHART QUERIES-------------------------------------
+# 5.1. Coarsest level that still gives about target_points points for the range
+def choose_level(start_date, end_date, target_points):
+    span_days = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days + 1
+    # From the longest periods down, so the first level that is fine enough is the coarsest one
+    for level, period_days in sorted(pyramid_levels.items(), key=lambda item: item[1], reverse=True):
+        # Each period contributes at least its min and max
+        if 2 * span_days / period_days >= target_points:
+            return level
+    return None
+
+# 5.2. Points of one column from the periods of a level (each period's min and max)
+def level_points(table, column, stats=("min", "max")):
+    dates = np.concatenate([table[f"{column}|{stat}_date"].to_numpy() for stat in stats])
+    values = np.concatenate([table[f"{column}|{stat}"].to_numpy() for stat in stats])
+
+    valid = ~pd.isna(values)
+    points = pd.Series(values[valid].astype(np.float64), index=pd.DatetimeIndex(dates[valid]), name=column)
+    points = points[~points.index.duplicated(keep="first")].sort_index()
+    return points
+
+# 5.3. Chart-ready data for a date range, read from the pyramid when the range is long
+def chart_points(store, columns, start_date, end_date, target_points, cache_dir=None):
+    """
+    Returns the data to draw for the given columns and range.
+
+    Short ranges (at most target_points daily rows) come straight from the store. Longer
+    ranges use the coarsest pyramid level with enough periods: whole periods inside the
+    range come from the pyramid, and the partial periods at both edges from the daily data.
+
+    Returns:
+        pd.DataFrame: Indexed by Date. Columns may hold NaN where another column has a point.
+    """
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if store.row_count(columns, start_date, end_date) <= target_points:
+        return store.get(columns, start_date, end_date)
+
+    level = choose_level(start_date, end_date, target_points)
+    if level is None:
+        return store.get(columns, start_date, end_date)
+
+    # Group columns by ticker, since the pyramid is stored per ticker
+    by_ticker = {}
+    for col in columns:
+        by_ticker.setdefault(col.split("_")[0], []).append(col)
+
+    frames = []
+    for ticker, cols in by_ticker.items():
+        table = load_level(store, ticker, level, cache_dir)
+        lo = table["Date"].searchsorted(start_date, side="left")
+        hi = table["End"].searchsorted(end_date + pd.Timedelta(days=1), side="right")
+        full = table.iloc[lo:hi]
+        if full.empty:
+            frames.append(store.get(cols, start_date, end_date))
+            continue
+
+        first_start, last_end = full["Date"].iloc[0], full["End"].iloc[-1]
+        head = store.get(cols, start_date, first_start - pd.Timedelta(1, "ns"))
+        tail = store.get(cols, last_end, end_date)
+        middle = pd.concat([level_points(full, col) for col in cols], axis=1)
+        frames.append(pd.concat([head, middle, tail]))
+
+    df = pd.concat(frames, axis=1).sort_index() if len(frames) > 1 else frames[0]
+    df.index.name = "Date"
+    return df[list(columns)]
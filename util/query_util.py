@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Maximum number of query results kept in memory (override with QUERY_CACHE_SIZE)
+max_cached_queries = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+
+# 2. LRU CACHE-------------------------------------
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache keyed by plain tuples.
+
+    Keys are built from cheap identifiers (dataset id, version, tickers, dates, ...),
+    so looking up a result never hashes the content of a DataFrame.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # 2.1. Return the cached value, computing and storing it on a miss
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Compute outside the lock so slow queries don't block cache hits
+        value = compute()
+
+        self.put(key, value)
+        return value
+
+    # 2.2. Look up a value without computing it (None on a miss)
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    # 2.3. Store a value computed elsewhere (e.g. in a batch with other keys)
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # 2.4. Hit/miss counters
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    # 2.5. Drop every entry (counters are kept)
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+# 3. QUERY KEYS-------------------------------------
+# 3.1. Version of a dataset file: changes whenever the file is rewritten
+def dataset_version(file_path):
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except OSError:
+        return None
+
+# 3.2. Normalized, hashable key for a range query
+def query_key(dataset_id, version, tickers, start_date, end_date, frequency=None):
+    if tickers is not None and not isinstance(tickers, str):
+        tickers = tuple(tickers)
+    start = start_date.isoformat() if start_date is not None else None
+    end = end_date.isoformat() if end_date is not None else None
+    return (dataset_id, version, tickers, start, end, frequency)
+
+# 4. SHARED QUERY CACHE-------------------------------------
+query_cache = LRUCache(max_entries=max_cached_queries)
+
+# 4.1. Run a query through the shared cache
+def cached_query(dataset_id, version, tickers, start_date, end_date, compute, frequency=None):
+    key = query_key(dataset_id, version, tickers, start_date, end_date, frequency)
+    return query_cache.get_or_compute(key, compute)
+
+# 4.2. Counters of the shared cache
+def query_cache_stats():
+    return query_cache.stats()
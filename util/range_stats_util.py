@@ -0,0 +1,102 @@
+import numpy as np
+import util.query_util as query_util
+import util.store_util as store_util
+
+# RANGE STATISTICS INDEX
+# Answers "first/last valid value, min and max between two dates" for a series without
+# scanning it: the valid values are kept in date order, the range is found with two
+# binary searches (O(log n)), and min/max come from sparse tables in O(1).
+# Built once per series and dataset version, so a trend summary over 20 years costs
+# the same as one over a week.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Indexes kept in memory (one per series)
+index_cache = query_util.LRUCache(max_entries=512)
+
+# 2. SPARSE TABLE-------------------------------------
+class SparseTable:
+    """
+    Idempotent range query (min or max) in O(1) after an O(n log n) build.
+
+    Level k holds the result over every block of 2**k values; a range [lo, hi] is
+    covered by the two overlapping blocks of size 2**floor(log2(hi - lo + 1)).
+    """
+
+    def __init__(self, values, op):
+        self.op = op
+        self.levels = [np.asarray(values, dtype=np.float64)]
+        width = 1
+        while 2 * width <= len(values):
+            previous = self.levels[-1]
+            self.levels.append(op(previous[:-width], previous[width:]))
+            width *= 2
+
+    # 2.1. Result over values[lo..hi] (inclusive)
+    def query(self, lo, hi):
+        k = int(hi - lo + 1).bit_length() - 1
+        level = self.levels[k]
+        return float(self.op(level[lo], level[hi - (1 << k) + 1]))
+
+# 3. RANGE STATISTICS-------------------------------------
+class RangeStatsIndex:
+    """
+    Range statistics of one series.
+
+    Args:
+        dates (np.ndarray): Sorted int64 nanosecond dates (as stored in the Arrow cache).
+        values (np.ndarray): Values, NaN where the series is missing.
+    """
+
+    def __init__(self, dates, values):
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        self.dates = np.asarray(dates, dtype=np.int64)[valid]
+        self.values = values[valid]
+        self.min_table = SparseTable(self.values, np.minimum)
+        self.max_table = SparseTable(self.values, np.maximum)
+
+    # 3.1. Positions of the valid values between two dates (inclusive), None if there are none
+    def positions(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(self.dates, store_util.to_int64_date(start), side="left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, store_util.to_int64_date(end), side="right"))
+        return (lo, hi - 1) if hi > lo else None
+
+    # 3.2. Statistics of the valid values between two dates
+    def query(self, start=None, end=None):
+        """
+        Returns:
+            dict or None: count, first, last, first_date, last_date (int64 ns), min and max.
+            None if the series has no value in the range.
+        """
+        bounds = self.positions(start, end)
+        if bounds is None:
+            return None
+        lo, hi = bounds
+        return {
+            "count": hi - lo + 1,
+            "first": float(self.values[lo]),
+            "last": float(self.values[hi]),
+            "first_date": int(self.dates[lo]),
+            "last_date": int(self.dates[hi]),
+            "min": self.min_table.query(lo, hi),
+            "max": self.max_table.query(lo, hi),
+        }
+
+# 3.3. Index of a store column, built once per dataset version
+def column_index(store, column):
+    version = store.version(column)
+
+    def compute():
+        series = store.get(column, dropna=False)[column]
+        return RangeStatsIndex(series.index.values.astype("datetime64[ns]").view(np.int64), series.to_numpy(dtype=np.float64, na_value=np.nan))
+
+    return index_cache.get_or_compute((column, version), compute)
+
+# 3.4. Statistics of several store columns over one range
+def range_stats(store, columns, start=None, end=None):
+    """
+    Returns:
+        dict: column -> statistics (see RangeStatsIndex.query), None for a column
+        without values in the range.
+    """
+    return {col: column_index(store, col).query(start, end) for col in columns}
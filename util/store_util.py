@@ -0,0 +1,226 @@
+import os
+import glob
+import threading
+import numpy as np
+import pandas as pd
+import util.cache_util as cache_util
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Source files in priority order (the first source that provides a column wins)
+#      - combined tables already use "<TICKER>_<field>" column names
+#      - cleaned yields and raw exports get the ticker from their file name
+source_patterns = [
+    ("data/combined_data/*.csv", "combined"),
+    ("data/yields/*_cleaned.csv", "cleaned"),
+    ("data/others/*.xlsx", "export"),
+]
+
+# 2. HELPERS-------------------------------------
+# 2.1. Ticker of a raw export or cleaned file ("USDJPY Exchange Rate USD-JPY.xlsx" -> "USDJPY")
+def ticker_from_path(file_path):
+    name = os.path.basename(file_path)
+    if name.endswith("_cleaned.csv"):
+        return name[: -len("_cleaned.csv")]
+    return name.split(" ")[0]
+
+# 2.2. Vendor moving averages are exported as "SMAVG (50)  on Close"
+def clean_field_name(col):
+    return col.replace("on Close", "").strip()
+
+# 2.3. Dates as int64 nanoseconds since epoch
+def to_int64_date(date):
+    return pd.Timestamp(date).as_unit("ns").value
+
+# 3. STORE-------------------------------------
+class TimeSeriesStore:
+    """
+    One store for every series in data/. Each source file is memory-mapped from the
+    Arrow cache and indexed by a sorted int64 array of dates, so a range query is two
+    binary searches plus a slice of the requested columns: O(log n + k).
+
+    Columns are addressed as "<TICKER>_<field>", e.g. "GJGB2_Close" or "USDJPY_Close".
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._sources = {}         # file path -> {"kind", "ticker", "state"}
+        self._columns = {}         # column -> file path
+        self._ticker_sources = {}  # ticker -> file path (opened on first use)
+        self._lock = threading.Lock()
+
+    # 3.1. Register a source file without reading its data
+    def add_source(self, file_path, kind="combined"):
+        if file_path in self._sources:
+            return
+        ticker = None if kind == "combined" else ticker_from_path(file_path)
+        self._sources[file_path] = {"kind": kind, "ticker": ticker, "state": None}
+
+        if kind == "combined":
+            # Only the header line is needed to know which columns live here
+            with open(file_path, "r") as f:
+                header = f.readline().rstrip("\n").split(",")
+            with self._lock:
+                for col in header[1:]:
+                    self._columns.setdefault(col, file_path)
+                for col in header[1:]:
+                    self._ticker_sources.setdefault(col.split("_")[0], file_path)
+        else:
+            self._ticker_sources.setdefault(ticker, file_path)
+
+    # 3.2. Memory-map a source file (call with the lock held)
+    def _load(self, file_path):
+        source = self._sources[file_path]
+        table = cache_util.open_arrow(cache_util.ensure_cache(file_path, self.cache_dir))
+        dates = table.column("Date").to_numpy().astype("datetime64[ns]").view(np.int64)
+
+        # Map store column names to the field names inside the file
+        fields = {}
+        for name in table.column_names[1:]:
+            if source["kind"] == "combined":
+                fields[name] = name
+            else:
+                fields[f"{source['ticker']}_{clean_field_name(name)}"] = name
+        for col in fields:
+            self._columns.setdefault(col, file_path)
+
+        # Swapped in as one object so readers never mix old and new data
+        source["state"] = {
+            "table": table,
+            "dates": dates,
+            "fields": fields,
+            "mtime_ns": os.stat(file_path).st_mtime_ns,
+        }
+
+    # 3.2.1. Open a source on first use, and re-open it if its file was rewritten
+    def _open(self, file_path):
+        source = self._sources[file_path]
+        state = source["state"]
+        if state is not None and os.stat(file_path).st_mtime_ns == state["mtime_ns"]:
+            return state
+
+        with self._lock:
+            state = source["state"]
+            if state is None or os.stat(file_path).st_mtime_ns != state["mtime_ns"]:
+                self._load(file_path)
+            return source["state"]
+
+    # 3.3. Find the source file holding a column
+    def resolve(self, column):
+        # _load adds columns under the lock, so reads take it too
+        with self._lock:
+            file_path = self._columns.get(column)
+        if file_path is not None:
+            return file_path
+
+        ticker = column.split("_")[0]
+        if ticker in self._ticker_sources:
+            self._open(self._ticker_sources[ticker])
+            with self._lock:
+                file_path = self._columns.get(column)
+            if file_path is not None:
+                return file_path
+
+        raise KeyError(f"Unknown series: {column}")
+
+    # 3.4. List the columns of a ticker
+    def ticker_columns(self, ticker):
+        if ticker not in self._ticker_sources:
+            raise KeyError(f"Unknown ticker: {ticker}")
+        self._open(self._ticker_sources[ticker])
+        with self._lock:
+            columns = list(self._columns)
+        return [col for col in columns if col.startswith(f"{ticker}_")]
+
+    # 3.5. Row range [lo, hi) of a source for the given dates
+    @staticmethod
+    def _row_range(dates, start, end):
+        lo = 0 if start is None else int(np.searchsorted(dates, to_int64_date(start), side="left"))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, to_int64_date(end), side="right"))
+        return lo, max(lo, hi)
+
+    # 3.6. Slice some columns of one source
+    def _get_from_source(self, file_path, columns, start, end):
+        state = self._open(file_path)
+        lo, hi = self._row_range(state["dates"], start, end)
+
+        data = {}
+        for col in columns:
+            chunk = state["table"].column(state["fields"][col]).slice(lo, hi - lo)
+            data[col] = chunk.to_numpy()
+        index = pd.DatetimeIndex(state["dates"][lo:hi].view("datetime64[ns]"), name="Date")
+        return pd.DataFrame(data, index=index)
+
+    # 3.7. Range query over any set of series
+    def get(self, tickers, start=None, end=None, dropna=True):
+        """
+        Returns the requested series between start and end (inclusive).
+
+        Args:
+            tickers (list): Column names such as "GJGB2_Close" or "USDJPY_Close".
+            start (datetime, optional): First date to include. None means from the beginning.
+            end (datetime, optional): Last date to include. None means up to the latest date.
+            dropna (bool): Drop rows where every requested series is missing.
+
+        Returns:
+            pd.DataFrame: Only the requested rows and columns, indexed by Date.
+        """
+        if isinstance(tickers, str):
+            tickers = [tickers]
+
+        # Group the requested columns by source file
+        by_source = {}
+        for col in tickers:
+            by_source.setdefault(self.resolve(col), []).append(col)
+
+        frames = [self._get_from_source(file_path, cols, start, end) for file_path, cols in by_source.items()]
+        if len(frames) == 1:
+            df = frames[0]
+        else:
+            df = pd.concat(frames, axis=1, join="outer").sort_index()
+            df.index.name = "Date"
+        df = df[list(tickers)]
+
+        return df.dropna(how="all") if dropna else df
+
+    # 3.8. Range query for one ticker, returning field names without the ticker prefix
+    def get_ticker(self, ticker, start=None, end=None, fields=None, dropna=True):
+        columns = self.ticker_columns(ticker)
+        if fields is not None:
+            columns = [f"{ticker}_{field}" for field in fields]
+        df = self.get(columns, start, end, dropna=dropna)
+        df.columns = [col[len(ticker) + 1:] for col in df.columns]
+        return df
+
+    # 3.9. Number of daily rows a query would return (before dropping empty rows)
+    def row_count(self, columns, start=None, end=None):
+        if isinstance(columns, str):
+            columns = [columns]
+        counts = []
+        for file_path in {self.resolve(col) for col in columns}:
+            lo, hi = self._row_range(self._open(file_path)["dates"], start, end)
+            counts.append(hi - lo)
+        return max(counts) if counts else 0
+
+    # 3.10. Version of the data behind some columns (changes when a source file is rewritten)
+    def version(self, columns):
+        if isinstance(columns, str):
+            columns = [columns]
+        file_paths = sorted({self.resolve(col) for col in columns})
+        return tuple((file_path, os.stat(file_path).st_mtime_ns) for file_path in file_paths)
+
+    # 3.11. First and last date available for a column
+    def date_bounds(self, column):
+        dates = self._open(self.resolve(column))["dates"]
+        if len(dates) == 0:
+            return None, None
+        first, last = dates[0], dates[-1]
+        return pd.Timestamp(first), pd.Timestamp(last)
+
+# 4. DEFAULT STORE-------------------------------------
+# 4.1. Store with every source file under data/
+def build_default_store(cache_dir=None):
+    store = TimeSeriesStore(cache_dir=cache_dir)
+    for pattern, kind in source_patterns:
+        for file_path in sorted(glob.glob(pattern)):
+            store.add_source(file_path, kind)
+    return store
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import util.query_util as query_util
+import util.store_util as store_util
+import util.model_util as model_util
+import util.forecast_util as forecast_util
+
+# PROBABILISTIC TRANSFORMER FORECASTS
+# The TimeSeriesTransformer checkpoints predict a Student-t distribution per step and
+# forecast by drawing num_parallel_samples (100) autoregressive sample paths. Here every
+# request for one checkpoint is stacked into a single generate() call, the paths are
+# reduced to quantile bands, and the bands are cached per (ticker, model, last data date)
+# so a fan chart is sampled once per day of data, not on every rerun.
+
+# 1. GLOBAL VARIABLES-------------------------------------
+# 1.1. Quantile bands of a fan chart
+quantile_levels = {
+    "p5": 0.05,
+    "p50": 0.50,
+    "p95": 0.95,
+}
+
+# 1.2. Seed of the sample paths (same data, same bands)
+sampling_seed = 0
+
+# 1.3. Summary used as the point forecast (by the forecast table, the server and the backtest)
+point_band = "mean"
+
+# 1.4. Quantile summaries kept in memory
+quantile_cache = query_util.LRUCache(max_entries=256)
+
+# 2. MODEL INPUTS-------------------------------------
+# 2.1. Time features of a sequence of dates (must match the ones used in training)
+def time_features(dates, start_position=0):
+    """
+    Two features per step, as in the checkpoints' config (num_time_features = 2):
+    the day of the week scaled to [-0.5, 0.5] and the log-age of the step in the series.
+    """
+    dates = pd.DatetimeIndex(dates)
+    day_of_week = dates.dayofweek.to_numpy() / 4.0 - 0.5
+    age = np.log10(2.0 + start_position + np.arange(len(dates)))
+    return np.stack([day_of_week, age], axis=-1).astype(np.float32)
+
+# 2.2. Stack the past values and time features of several requests
+def build_inputs(windows, window_dates, prediction_length):
+    """
+    Args:
+        windows (np.ndarray): Shape (batch, past_length), raw values.
+        window_dates (list): The DatetimeIndex of each window.
+        prediction_length (int): Steps to forecast.
+
+    Returns:
+        dict: NumPy arrays for generate() plus the forecast dates of each request.
+    """
+    past_length = windows.shape[1]
+    future_dates = [forecast_util.forecast_dates(dates[-1], prediction_length) for dates in window_dates]
+    return {
+        "past_values": windows.astype(np.float32),
+        "past_observed_mask": np.ones_like(windows, dtype=np.float32),
+        "past_time_features": np.stack([time_features(dates) for dates in window_dates]),
+        "future_time_features": np.stack([time_features(dates, past_length) for dates in future_dates]),
+        "future_dates": future_dates,
+    }
+
+# 3. SAMPLING-------------------------------------
+# 3.1. Draw the sample paths of a batch of requests in one generate() call
+def sample_paths(model, inputs, seed=None):
+    """
+    Returns:
+        np.ndarray: Shape (batch, num_parallel_samples, prediction_length).
+    """
+    import torch # imported on first use, like the checkpoints themselves
+
+    torch.manual_seed(sampling_seed if seed is None else seed)
+    with torch.inference_mode():
+        outputs = model.generate(
+            past_values=torch.from_numpy(inputs["past_values"]),
+            past_observed_mask=torch.from_numpy(inputs["past_observed_mask"]),
+            past_time_features=torch.from_numpy(inputs["past_time_features"]),
+            future_time_features=torch.from_numpy(inputs["future_time_features"]),
+        )
+    return outputs.sequences.numpy()
+
+# 3.2. Quantile bands (and mean) of sample paths
+def summarize_samples(samples):
+    """
+    Returns:
+        dict: "<band>" -> array of shape (batch, prediction_length), plus "mean".
+    """
+    bands = np.quantile(samples, list(quantile_levels.values()), axis=1)
+    summary = dict(zip(quantile_levels, bands))
+    summary["mean"] = samples.mean(axis=1)
+    return summary
+
+# 4. FORECASTS-------------------------------------
+# 4.1. Quantile forecasts of several (ticker, model spec) requests
+def forecast_quantiles(requests, store=None):
+    """
+    Args:
+        requests (list): (ticker, spec) pairs, spec being a registry row of a transformer.
+        store (TimeSeriesStore, optional): Data source. Defaults to the store under data/.
+
+    Returns:
+        dict: (ticker, model name) -> pd.DataFrame indexed by forecast Date with p5/p50/p95/mean.
+    """
+    store = store or store_util.build_default_store()
+    results = {}
+    pending = {}
+
+    for ticker, spec in requests:
+        column = f"{ticker}_{forecast_util.target_field}"
+        series = store.get(column)[column].dropna()
+        key = (ticker, spec["name"], series.index[-1], model_util.model_version(spec))
+        summary = quantile_cache.get(key)
+        if summary is not None:
+            results[(ticker, spec["name"])] = summary
+        else:
+            # Requests on the same checkpoint are sampled together
+            pending.setdefault(spec["path"], []).append((ticker, spec, key, series.iloc[-spec["input_window"]:]))
+
+    for items in pending.values():
+        spec = items[0][1]
+        model = model_util.load_model(spec)["model"]
+        windows = np.stack([window.to_numpy() for _, _, _, window in items])
+        inputs = build_inputs(windows, [window.index for _, _, _, window in items], spec["output_window"])
+        summary = summarize_samples(sample_paths(model, inputs))
+
+        for i, (ticker, _, key, _) in enumerate(items):
+            df = pd.DataFrame({band: values[i] for band, values in summary.items()}, index=inputs["future_dates"][i])
+            quantile_cache.put(key, df)
+            results[(ticker, spec["name"])] = df
+
+    return results
+
+# 4.2. Fan chart data of one ticker (the tuned checkpoint when there is one)
+def forecast_fan(ticker, name=None, store=None):
+    matches = model_util.find_models(ticker, architecture="time_series_transformer")
+    if name is not None:
+        matches = matches[matches["name"] == name]
+    if matches.empty:
+        raise KeyError(f"No transformer model for {ticker}")
+    spec = matches.sort_values(["tuned", "input_window"]).iloc[-1].to_dict()
+    return forecast_quantiles([(ticker, spec)], store)[(ticker, spec["name"])]
+
+# 4.3. Tickers of a curve that have a transformer checkpoint
+def transformer_tickers(columns):
+    tickers = set(model_util.find_models(architecture="time_series_transformer")["ticker"])
+    return [col.split("_")[0] for col in columns if col.split("_")[0] in tickers]
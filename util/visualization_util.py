@@ -1,222 +1,46 @@
+import os
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
+import util.cache_util as cache_util
+import util.store_util as store_util
+import util.query_util as query_util
+import util.pyramid_util as pyramid_util
+import util.indicator_util as indicator_util
+import util.mapping_util as mapping_util
 
 # 1. GLOBAL VARIABLES-------------------------------------
-# 1.1. Yield column names
-yield_columns = {
-    "Japan": ["GJTB3MO_Close", "GJGB2_Close", "GJGB5_Close", "GJGB10_Close", "GJGB30_Close"],
-    "China": ['GCNY3M_Close', 'GCNY2YR_Close', 'GCNY5YR_Close', 'GCNY10YR_Close', 'GCNY30YR_Close'],
-    "Australia": ['GACGB3M_Close', 'GACGB2_Close', 'GACGB5_Close', 'GACGB10_Close', 'GACGB30_Close'],
-}
-
-# 1.2. Additional graphs
-additional_graphs = {
-    "Japan": ['3M Gov Yield', '2Y Gov Yield', '5Y Gov Yield', '10Y Gov Yield', '30Y Gov Yield', 
-              'JPY Swap Rates', 'TONAR Rate', 'TIBOR Fixing Rates', 'CPI YoY', 'GDP YoY', 
-              'Gov Debt % GDP', 'USD/JPY Exchange Rate', 'Unemployment Rate', 'Nikkei 225 Index'],
-    "China": ['3M Gov Yield', '2Y Gov Yield', '5Y Gov Yield', '10Y Gov Yield', '30Y Gov Yield',
-              'CNY Swap Rates', 'Loan Prime Rate', 'SHIBOR Fixing Rate', 'CPI YoY', 'GDP YoY',
-              'Gov Debt % GDP', 'USD/CNY Exchange Rate', 'Unemployment Rate', 'CSI 300 Index'],
-    "Australia": ['3M Gov Yield', '2Y Gov Yield', '5Y Gov Yield', '10Y Gov Yield', '30Y Gov Yield',
-                  'AUD Swap Rates', 'Cash Rate Target', 'CPI YoY', 'GDP YoY','Gov Debt % GDP', 
-                  'USD/AUD Exchange Rate', 'Unemployment Rate', 'Wage Growth YoY', 'ASX 200 Index'],
-}
-
-# 1.3. Predefined Plotly color cycle
+# 1.1. Series mappings (defined in util/mapping_util.py, shared with the offline jobs)
+yield_columns = mapping_util.yield_columns
+additional_graphs = mapping_util.additional_graphs
+yield_mapping = mapping_util.yield_mapping
+multiple_lines_mapping = mapping_util.multiple_lines_mapping
+multiple_lines_mapping_with_ma = mapping_util.multiple_lines_mapping_with_ma
+others_mapping = mapping_util.others_mapping
+
+# 1.2. Share one read-only copy of each dataset across sessions (set SHARED_DATA=0 to disable)
+shared_data = os.getenv("SHARED_DATA", "1") != "0"
+
+# 1.3. Chart width used to size downsampling (points per chart ~ pixels across)
+chart_width_px = int(os.getenv("CHART_WIDTH_PX", "800"))
+
+# 1.3.1. Line chart rendering: "webgl" (Scattergl, binary arrays) or "svg" (plain Scatter)
+chart_render_mode = os.getenv("CHART_RENDER_MODE", "webgl")
+
+# 1.3.2. Maximum size of the trace data sent for one line chart, in bytes
+chart_max_bytes = int(os.getenv("CHART_MAX_BYTES", "256000"))
+
+# 1.4. Frames kept by the animated yield curve
+animation_max_frames = 300
+
+# 1.5. Predefined Plotly color cycle
 plotly_colors = [
     "blue", "green", "red", "purple", "orange", "brown", "pink", "gray", "cyan", "magenta"
 ]
 
-# 1.4. Yield mapping
-yield_mapping = {
-    '3M Gov Yield': {
-        'Japan': 'GJTB3MO',
-        'China': 'GCNY3M',
-        'Australia': 'GACGB3M',
-        'title': '3-Month Government Bond Yield Over Time'
-    },
-    '2Y Gov Yield': {
-        'Japan': 'GJGB2',
-        'China': 'GCNY2YR',
-        'Australia': 'GACGB2',
-        'title': '2-Year Government Bond Yield Over Time'
-    },
-    '5Y Gov Yield': {
-        'Japan': 'GJGB5',
-        'China': 'GCNY5YR',
-        'Australia': 'GACGB5',
-        'title': '5-Year Government Bond Yield Over Time'
-    },
-    '10Y Gov Yield': {
-        'Japan': 'GJGB10',
-        'China': 'GCNY10YR',
-        'Australia': 'GACGB10',
-        'title': '10-Year Government Bond Yield Over Time'
-    },
-    '30Y Gov Yield': {
-        'Japan': 'GJGB30',
-        'China': 'GCNY30YR',
-        'Australia': 'GACGB30',
-        'title': '30-Year Government Bond Yield Over Time'
-    },
-}
-
-# 1.5. multiple lines mapping
-multiple_lines_mapping = {
-    'JPY Swap Rates': {
-        "title": "JPY Overnight Index Swap (OIS) Rates Across Maturities",
-        "file_path": "data/combined_data/japan_swap_combined.csv",
-        "required_columns": ["JYSOC_Close", "JYSO2_Close", "JYSO5_Close", "JYSO10_Close", "JYSO30_Close"]
-    },
-    'TIBOR Fixing Rates': {
-        "title": "Japan TIBOR Fixing Rates Across Maturities",
-        "file_path": "data/combined_data/japan_tibor_fixing_rate_df_combined.csv",
-        "required_columns": ["TI0001M_Ask Price", "TI0003M_Ask Price", "TI0006M_Ask Price", "TI0012M_Ask Price"]
-    },
-    'CNY Swap Rates': {
-        "title": "CNY Interest Rate Swaps (IRS) on 7-Day Repo",
-        "file_path": "data/combined_data/china_swap_combined.csv",
-        "required_columns": ["CCSWOC_Close", "CCSWO2_Close", "CCSWO5_Close", "CCSWO10_Close"]
-    },
-    'SHIBOR Fixing Rate': {
-        "title": "Shanghai Interbank Offered Rate (SHIBOR) Trends Over Time",
-        "file_path": "data/combined_data/china_shibor_fixing_rate_combined.csv",
-        "required_columns": ["SHIF1Y_Close", "SHIF3M_Close"]
-    },
-    'AUD Swap Rates': {
-        "title": "AUD Interest Rate Swaps (IRS) vs. 6M Benchmark",
-        "file_path": "data/combined_data/australia_swap_combined.csv",
-        "required_columns": ["ADSWAP2_Close", "ADSWAP5_Close", "ADSWAP10_Close", "ADSWAP30_Close"]
-    }
-}
-
-# 1.6. multiple lines mapping with MA
-multiple_lines_mapping_with_ma = {
-    'TONAR Rate': {
-        "title": "TONAR: Japan's Unsecured Overnight Call Rate Movements Over Time",
-        "file_path": "data/others/MUTKCALM Bank of Japan Final Result - Unsecured Overnight Call Rate TONAR.xlsx",
-    },
-    'USD/JPY Exchange Rate': {
-        "title": "USD/JPY Exchange Rate",
-        "file_path": "data/others/USDJPY Exchange Rate USD-JPY.xlsx",
-    },
-    'Nikkei 225 Index': {
-        "title": "Nikkei 225 Index",
-        "file_path": "data/others/NKY Nikkei 225.xlsx",
-    },
-    'USD/CNY Exchange Rate': {
-        "title": "USD/CNY Exchange Rate",
-        "file_path": "data/others/USDCNY Exchange Rate USD-CNY.xlsx",
-    },
-    'CSI 300 Index': {
-        "title": "CSI 300 Index",
-        "file_path": "data/others/SHSZ300 CSI 300 Index.xlsx",
-    },
-    'USD/AUD Exchange Rate': {
-        "title": "USD/AUD Exchange Rate",
-        "file_path": "data/others/AUDUSD Exchange Rate USD-AUD.xlsx",
-    },
-    'ASX 200 Index': {
-        "title": "ASX 200 Index",
-        "file_path": "data/others/AS51 ASX 200 Index.xlsx",
-    }
-}
-
-# 1.7. others mapping
-others_mapping = {
-    'CPI YoY': {
-        "title": "Consumer Price Index (CPI) Year-on-Year Growth",
-        "Japan": {
-            "file_path": "data/others/EHPIJP Japan Consumer Price Index (YoY _).xlsx",
-            "col": "Mid Price",
-            "frequency": "quarterly"
-        },
-        "China": {
-            "file_path": "data/others/CNCPIYOY Daily China CPI YoY.xlsx",
-            "col": "Last Price",
-            "frequency": "monthly"
-        },
-        "Australia": {
-            "file_path": "data/others/AUCPIYOY Australia CPI All Items YoY (Quarterly).xlsx",
-            "col": "Last Price",
-            "frequency": "quarterly"
-        },
-    },
-    'GDP YoY': {
-        "title": "Gross Domestic Product (GDP) Year-on-Year Growth",
-        "Japan": {
-            "file_path": "data/others/JGDPNSAQ Japan GDP Real Chained NSA YoY_.xlsx",
-            "col": "Last Price",
-            "frequency": "quarterly"
-        },
-        "China": {
-            "file_path": "data/others/EHGDCN China Real Quarterly GDP (Annual YoY _).xlsx",
-            "col": "Mid Price",
-            "frequency": "quarterly"
-        },
-        "Australia": {
-            "file_path": "data/others/AUNAGDPY Australia GDP SA YoY.xlsx",
-            "col": "Last Price",
-            "frequency": "quarterly"
-        },
-    },
-    'Gov Debt % GDP': {
-        "title": "Government Debt as a Percentage of GDP",
-        "Japan": {
-            "file_path": "data/others/GDDBJAPN Japan Debt as a Percentage of GDP.xlsx",
-            "col": "Mid Price",
-            "frequency": "yearly"
-        },
-        "China": {
-            "file_path": "data/others/CHBGDGOP China Government Debt as Percentage of GDP.xlsx",
-            "col": "Mid Price",
-            "frequency": "yearly"
-        },
-        "Australia": {
-            "file_path": "data/others/GDDBAUSL Australia Debt as a Percentage of GDP.xlsx",
-            "col": "Mid Price",
-            "frequency": "yearly"
-        },
-    },
-    'Unemployment Rate': {
-        "title": "Unemployment Rate",
-        "Japan": {
-            "file_path": "data/others/EHUPJP Japan Unemployment Rate.xlsx",
-            "col": "Mid Price",
-            "frequency": "quarterly"
-        },
-        "China": {
-            "file_path": "data/others/EHSRUCN China Quarterly Surveyed Unemployment Rate.xlsx",
-            "col": "Mid Price",
-            "frequency": "quarterly"
-        },
-        "Australia": {
-            "file_path": "data/others/EHUPAU Australia Unemployment Rate.xlsx",
-            "col": "Mid Price",
-            "frequency": "quarterly"
-        },
-    },
-    'Wage Growth YoY': {
-        "title": "Hourly Wage Growth (Excluding Bonuses, Year-on-Year, Seasonally Adjusted)",
-        "Australia": {
-            "file_path": "data/others/AUWCYSA Australia Wage Cost Hourly Rates of Pay Ex Bonuses YoY SA.xlsx",
-            "col": "Last Price",
-            "frequency": "quarterly"
-        }
-    },
-    'Cash Rate Target': {
-        "title": "RBA Cash Rate Target",
-        "Australia": {
-            "file_path": "data/others/RBATCTR Australia RBA Cash Rate Target.xlsx",
-            "col": "Last Price",
-            "frequency": "monthly"
-        }
-    }
-}
-
 # 2. MANIPULATE DATA-------------------------------------
 # 2.1. Map ticket to maturity
 def get_maturity_name(col_name):
@@ -234,14 +58,28 @@ def get_maturity_name(col_name):
     return col_name  # Return original if no match
 
 # 2.2. Load data from file path
-@st.cache_data
 def load_data(file_path):
+    """
+    Loads a CSV/Excel file as a DataFrame indexed by Date.
+
+    With SHARED_DATA enabled (default), every session receives the same read-only frame,
+    loaded once per server process. Set SHARED_DATA=0 to give each caller its own copy.
+    """
+    if shared_data:
+        # The version makes a rewritten file (e.g. after ingestion) load again
+        return load_shared_data(file_path, query_util.dataset_version(file_path))
+    return load_data_copy(file_path)
+
+# 2.2.1. Per-caller copy (st.cache_data pickles and copies the result for every caller)
+@st.cache_data
+def load_data_copy(file_path):
     try:
         # Determine file type
         if file_path.endswith(".csv"):
             df = pd.read_csv(file_path)
         elif file_path.endswith(".xlsx") or file_path.endswith(".xls"):
-            df = pd.read_excel(file_path)
+            # Workbooks are converted once to a memory-mapped Arrow file, already indexed by Date
+            return cache_util.read_excel_cached(file_path)
         else:
             st.error("Unsupported file format. Please use CSV or Excel.")
             return None
@@ -258,20 +96,37 @@ def load_data(file_path):
         st.error(f"File not found: {file_path}")
         return None
 
-# 2.3. For some data, the columns are prefixed with the ticker symbol 
-@st.cache_data
-def filter_ticker_columns(df, ticker):
-    """
-    Extracts columns containing the given ticker and removes the ticker prefix from column names.
-    """
-    selected_columns = [col for col in df.columns if ticker in col]
-    df_filtered = df[selected_columns].copy()
-    df_filtered.columns = [col.replace(f"{ticker}_", "") for col in selected_columns]
+# 2.2.2. One read-only frame per server process, shared by all sessions
+@st.cache_resource(max_entries=128)
+def load_shared_data(file_path, version=None):
+    if not file_path.endswith((".csv", ".xlsx", ".xls")):
+        st.error("Unsupported file format. Please use CSV or Excel.")
+        return None
 
-    return df_filtered
+    try:
+        # Columns are zero-copy views over the memory-mapped Arrow cache
+        df = cache_util.read_arrow(cache_util.ensure_cache(file_path))
+    except FileNotFoundError:
+        st.error(f"File not found: {file_path}")
+        return None
 
-# 2.4. Filter data based on selected date range and columns
-@st.cache_data
+    return make_read_only(df)
+
+# 2.2.3. Lock the underlying arrays so no session can modify the shared data in place
+def make_read_only(df):
+    # A write to a frame that shares its blocks is copied instead of rejected under copy-on-write,
+    # so rebuild the frame over read-only views of its columns: writes to it then raise
+    arrays = {}
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i].to_numpy() if isinstance(df.dtypes.iloc[i], np.dtype) else df.iloc[:, i].array
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+        arrays[i] = values
+    locked = pd.DataFrame(arrays, index=df.index, copy=False)
+    locked.columns = df.columns
+    return locked
+
+# 2.3. Filter data based on selected date range and columns
 def filter_dataframe(df, start_date, end_date, required_columns=None):
     """
     Filters data based on selected date range and keeps only the specified columns.
@@ -301,72 +156,163 @@ def filter_dataframe(df, start_date, end_date, required_columns=None):
 
     return df_filtered
 
-# 2.5. Find moving average columns (column names are not consistent)
-def find_moving_average_columns(df):
-    ma_patterns = ["SMAVG (50)", "SMAVG (100)", "SMAVG (200)"]
-    ma_columns = {}
+# 2.4. Names of the moving average columns drawn next to a price
+def moving_average_columns(windows=None):
+    windows = windows or indicator_util.default_ma_windows
+    return [indicator_util.indicator_name("sma", window) for window in windows]
 
-    for ma in ma_patterns:
-        matching_cols = [col for col in df.columns if ma in col]
-        if matching_cols:
-            ma_columns[ma] = matching_cols[0]  # Take the first match (assuming no duplicates)
+# 2.5. Downsampling that keeps the extremes of every column
+# 2.5.1. Number of points worth sending for a chart of the given pixel width
+def chart_target_points(width_px=None, points_per_px=1.0):
+    width_px = width_px or chart_width_px
+    return max(4, int(width_px * points_per_px))
 
-    return ma_columns
+# 2.5.2. Positions of the min and max of each bucket, plus the first and last valid values
+def minmax_indices(values, n_buckets):
+    """
+    Vectorized min/max-per-bucket selection: the series is cut into n_buckets equal
+    buckets and the positions of each bucket's minimum and maximum are kept, so spikes
+    and troughs survive downsampling. NaN values are ignored.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    valid_positions = np.flatnonzero(~np.isnan(values))
+    if len(valid_positions) == 0:
+        return valid_positions
+    if n <= 2 * n_buckets:
+        return valid_positions
+
+    bucket_size = -(-n // n_buckets)  # ceil division
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = values
+    buckets = padded.reshape(n_buckets, bucket_size)
+
+    valid = ~np.isnan(buckets)
+    has_data = valid.any(axis=1)
+    offsets = np.arange(n_buckets) * bucket_size
+    min_positions = offsets + np.where(valid, buckets, np.inf).argmin(axis=1)
+    max_positions = offsets + np.where(valid, buckets, -np.inf).argmax(axis=1)
+
+    picked = np.concatenate([
+        min_positions[has_data],
+        max_positions[has_data],
+        valid_positions[[0, -1]],
+    ])
+    return np.unique(picked)
+
+# 2.5.3. Downsample a DataFrame to about target_points rows per column
+def downsample_minmax(df, target_points=None, columns=None):
+    """
+    Keeps the rows holding the min and max of every bucket for each column (union over columns).
 
-# 2.6. Dynamic downsampling based on length of data
-@st.cache_data
-def adaptive_downsampling(df):
-    num_rows = len(df)
-    
-    # Dynamically determine downsampling factor
-    if num_rows > 5000:
-        step = max(2, num_rows // 500)  # Keeps about 500 rows
-    elif num_rows > 2000:
-        step = max(2, num_rows // 400)  # Keeps about 400 rows
-    elif num_rows > 1000:
-        step = max(2, num_rows // 300)  # Keeps about 300 rows
-    else:
-        return df  # No downsampling needed
-    
-    return df.iloc[::step]
+    Args:
+        df (pd.DataFrame): Data indexed by Date.
+        target_points (int, optional): Points to keep per column. Defaults to chart_target_points().
+        columns (list, optional): Columns whose extremes must be kept. If None, uses all columns.
 
-# 2.7. Filter data based on selected frequency
-@st.cache_data
-def filter_data_by_frequency(df, start_date, end_date, frequency):
-    """Filter data based on selected frequency (monthly, quarterly, or yearly)."""
-    df_filtered = df.copy()
-    
-    # Ensure the index is in datetime format
-    df_filtered.index = pd.to_datetime(df_filtered.index)
-    
-    # Filter based on frequency
+    Returns:
+        pd.DataFrame: The selected rows, in the original order.
+    """
+    target_points = target_points or chart_target_points()
+    if df is None or len(df) <= target_points:
+        return df
+
+    columns = columns if columns is not None else df.columns
+    n_buckets = max(1, target_points // 2)
+    positions = [minmax_indices(df[col].to_numpy(dtype=np.float64, na_value=np.nan), n_buckets) for col in columns]
+    positions = np.unique(np.concatenate(positions)) if positions else np.arange(0)
+
+    return df.iloc[positions]
+
+# 2.5.4. Points per trace that keep a chart within its byte budget
+def budget_points(n_traces, max_bytes=None):
+    """
+    Each point is sent as a float64 epoch-ms x value and a float32 y value, base64
+    encoded (4 bytes of text per 3 bytes of data).
+    """
+    max_bytes = max_bytes or chart_max_bytes
+    bytes_per_point = (8 + 4) * 4 / 3
+    return max(4, int(max_bytes / (max(1, n_traces) * bytes_per_point)))
+
+# 2.5.5. Line trace with compact x/y arrays
+def line_trace(series, name, color):
+    """
+    Builds the trace of one series. x values are epoch milliseconds (float64, exact for
+    dates) and y values float32; Plotly sends both as binary typed arrays instead of
+    lists of date strings and floats.
+    """
+    x = series.index.values.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+    y = series.to_numpy(dtype=np.float32, na_value=np.nan)
+    trace_type = go.Scattergl if chart_render_mode == "webgl" else go.Scatter
+    return trace_type(
+        x=x,
+        y=y,
+        mode="lines",
+        name=name,
+        line=dict(color=color),
+        showlegend=True # Always show legend
+    )
+
+# 2.6. Filter data based on selected frequency
+# 2.6.1. Date bounds [lower, upper) covering every period touched by start_date and end_date
+def frequency_bounds(start_date, end_date, frequency):
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize()
+
+    if frequency == "daily":
+        return start, end + pd.Timedelta(days=1)
+    if frequency == "weekly":
+        # Weeks run Monday to Sunday
+        lower = start - pd.Timedelta(days=start.dayofweek)
+        upper = end + pd.Timedelta(days=7 - end.dayofweek)
+        return lower, upper
+    if frequency == "monthly":
+        lower = pd.Timestamp(start.year, start.month, 1)
+        upper = pd.Timestamp(end.year + end.month // 12, end.month % 12 + 1, 1)
+        return lower, upper
+    if frequency == "quarterly":
+        start_qtr_month = 3 * ((start.month - 1) // 3) + 1
+        end_qtr_month = 3 * ((end.month - 1) // 3) + 1
+        lower = pd.Timestamp(start.year, start_qtr_month, 1)
+        upper = pd.Timestamp(end.year + (end_qtr_month + 2) // 12, (end_qtr_month + 2) % 12 + 1, 1)
+        return lower, upper
     if frequency == "yearly":
-        df_filtered = df_filtered[(df_filtered.index.year >= start_date.year) & 
-                                  (df_filtered.index.year <= end_date.year)]
-    
-    elif frequency == "monthly":
-        # Convert start_date and end_date to pandas Timestamp
-        start_date_pd = pd.Timestamp(start_date)
-        end_date_pd = pd.Timestamp(end_date)
+        return pd.Timestamp(start.year, 1, 1), pd.Timestamp(end.year + 1, 1, 1)
 
-        df_filtered = df_filtered[
-            (df_filtered.index.to_period("M") >= start_date_pd.to_period("M")) & 
-            (df_filtered.index.to_period("M") <= end_date_pd.to_period("M"))
-        ]
+    return None, None
 
-    
-    elif frequency == "quarterly":
-        start_qtr = (start_date.month - 1) // 3 + 1
-        end_qtr = (end_date.month - 1) // 3 + 1
-        df_filtered = df_filtered[(df_filtered.index.year >= start_date.year) & 
-                                  (df_filtered.index.year <= end_date.year)]
-        df_filtered = df_filtered[df_filtered.index.to_period("Q").isin(pd.period_range(
-            f"{start_date.year}Q{start_qtr}", f"{end_date.year}Q{end_qtr}", freq="Q"
-        ))]
-    
-    return df_filtered
+# 2.6.2. Keep the rows of every period between start_date and end_date
+def filter_data_by_frequency(df, start_date, end_date, frequency):
+    """
+    Filter data based on selected frequency (daily, weekly, monthly, quarterly, or yearly).
+
+    The period bounds are turned into two timestamps and the sorted index is sliced with
+    one searchsorted call each, so no copy is made and no Period objects are created.
+    """
+    lower, upper = frequency_bounds(start_date, end_date, frequency)
+    if lower is None:
+        return df  # Unknown frequency: nothing to filter on
+
+    index = df.index
+    if not isinstance(index, pd.DatetimeIndex):
+        df = df.set_axis(pd.to_datetime(index), axis=0)
+        index = df.index
+    if not index.is_monotonic_increasing:
+        df = df.sort_index()
+        index = df.index
+
+    lo = index.searchsorted(lower, side="left")
+    hi = index.searchsorted(upper, side="left")
+    return df.iloc[lo:hi]
 
-# 2.8. Format date/index column
+# 2.6.3. Same periods as an inclusive [first, last] date range, for range-statistics queries
+def frequency_range(start_date, end_date, frequency):
+    lower, upper = frequency_bounds(start_date, end_date, frequency)
+    if lower is None:
+        return None, None  # Unknown frequency: the whole series, as filter_data_by_frequency keeps
+    return lower, upper - pd.Timedelta(days=1)
+
+# 2.7. Format date/index column
 def format_date_column(df):
     df_copy = df.copy()
     try:
@@ -381,15 +327,134 @@ def format_date_column(df):
 
     return df_copy
 
-# 2.9. Select yield curve for 1 day
-@st.cache_data
+# 2.8. Select yield curve for 1 day
 def select_yield_for_one_day(df, selected_date, country):
-    df_filtered = df[df.index == pd.to_datetime(selected_date)]
+    # Label slice on the sorted index: binary search instead of comparing every date
+    selected_date = pd.Timestamp(selected_date)
+    df_filtered = df.loc[selected_date:selected_date]
     selected_columns = [col for col in yield_columns[country] if col in df_filtered.columns]
     df_filtered = df_filtered[selected_columns]
 
     return df_filtered
-    
+
+# 2.9. One time-series store per server process (memory-mapped, shared by all sessions)
+@st.cache_resource
+def get_store():
+    return store_util.build_default_store()
+
+# 2.10. Load only the requested series and dates from the store
+def load_series(columns, start_date, end_date):
+    """
+    Range query on the shared store. Only the requested rows and columns are materialized,
+    and results are kept in the keyed query cache (no DataFrame hashing).
+
+    Args:
+        columns (list): Column names such as "GJGB2_Close" or "JYSO5_Close".
+        start_date (datetime): Start date for filtering.
+        end_date (datetime): End date for filtering.
+
+    Returns:
+        pd.DataFrame or None: Read-only filtered data indexed by Date, None if a series is unknown.
+    """
+    store = get_store()
+    try:
+        version = store.version(columns)
+    except KeyError as e:
+        st.error(f"Missing required columns: {e}")
+        return None
+
+    def compute():
+        return make_read_only(store.get(columns, start_date, end_date))
+
+    return query_util.cached_query("store", version, columns, start_date, end_date, compute)
+
+# 2.11. Load a date range of a file, optionally following its publication frequency
+def query_data(file_path, start_date, end_date, columns=None, frequency=None):
+    """
+    Keyed query on (file, file version, columns, start, end, frequency).
+
+    Args:
+        file_path (str): Path to the CSV/Excel file.
+        start_date (datetime): Start date for filtering.
+        end_date (datetime): End date for filtering.
+        columns (list, optional): Columns to keep. If None, keeps all columns.
+        frequency (str, optional): Use filter_data_by_frequency (e.g. "monthly") instead of a plain date range.
+
+    Returns:
+        pd.DataFrame or None: Read-only filtered data.
+    """
+    def compute():
+        df = load_data(file_path)
+        if df is None:
+            return None
+        if frequency is None:
+            df_filtered = filter_dataframe(df, start_date, end_date, columns)
+        else:
+            df_filtered = filter_data_by_frequency(df, start_date, end_date, frequency)
+            if df_filtered is not None and columns is not None:
+                df_filtered = df_filtered[columns]
+        return make_read_only(df_filtered) if df_filtered is not None else None
+
+    version = query_util.dataset_version(file_path)
+    return query_util.cached_query(file_path, version, columns, start_date, end_date, compute, frequency=frequency)
+
+# 2.12. Hit/miss counters of the query cache
+def query_cache_stats():
+    return query_util.query_cache_stats()
+
+# 2.13. Data to draw for a date range (long ranges are read from the pre-aggregated pyramid)
+def load_chart_series(columns, start_date, end_date, target_points=None):
+    """
+    Like load_series, but sized for a chart: ranges longer than target_points days are
+    read from the coarsest weekly/monthly/quarterly rollup that still gives enough points,
+    keeping each period's min and max. Use load_series for exact daily values.
+    """
+    store = get_store()
+    target_points = target_points or chart_target_points()
+    try:
+        version = store.version(columns)
+    except KeyError as e:
+        st.error(f"Missing required columns: {e}")
+        return None
+
+    def compute():
+        return make_read_only(pyramid_util.chart_points(store, columns, start_date, end_date, target_points))
+
+    return query_util.cached_query(f"chart:{target_points}", version, columns, start_date, end_date, compute)
+
+# 2.14. Chart data for some fields of one ticker, without the ticker prefix
+def load_chart_ticker_series(ticker, fields, start_date, end_date):
+    df = load_chart_series([f"{ticker}_{field}" for field in fields], start_date, end_date)
+    if df is None:
+        return None
+    return df.rename(columns=lambda col: col[len(ticker) + 1:])
+
+# 2.15. Chart data of a price with its moving averages (computed, not read from the file)
+def load_chart_with_moving_averages(ticker, start_date, end_date, windows=None, field="Close"):
+    """
+    Returns the price (from load_chart_ticker_series) next to its SMAs, outer-joined on
+    Date. plot_multiple_lines drops the NaN of each trace and downsamples it on its own.
+    """
+    windows = windows or indicator_util.default_ma_windows
+    df_price = load_chart_ticker_series(ticker, [field], start_date, end_date)
+    if df_price is None:
+        return None
+
+    try:
+        df_ma = indicator_util.ticker_indicators(get_store(), ticker, field, sma=windows)
+    except KeyError as e:
+        st.error(f"Missing required columns: {e}")
+        return None
+
+    return pd.concat([df_price, df_ma.loc[start_date:end_date]], axis=1).sort_index()
+
+# 2.16. Tickers drawn as line charts (their pyramid is built by the ingestion job)
+chart_tickers = mapping_util.chart_tickers
+
+# 2.17. Store columns of a single-ticker source file (e.g. the Excel files under data/others)
+def file_columns(file_path):
+    return get_store().ticker_columns(store_util.ticker_from_path(file_path))
+
 
 # 3. VISUALIZATION-------------------------------------
 # 3.1. Plot the bond yield curve for a selected day
@@ -489,8 +554,9 @@ def plot_animated_yield_curve(df, country, start_date, end_date, selected_date):
     maturity_labels = ["3M", "2Y", "5Y", "10Y", "30Y"]
     df_filtered = df_filtered.rename(columns=lambda col: get_maturity_name(col))
 
-    # If too long, downsample to reduce frames
-    df_filtered = adaptive_downsampling(df_filtered)
+    # If too long, downsample to reduce frames (keeping the dates where any maturity peaks or bottoms)
+    n_columns = max(1, len(df_filtered.columns))
+    df_filtered = downsample_minmax(df_filtered, target_points=max(4, animation_max_frames // n_columns))
 
     # Convert to long format for Plotly
     df_long = df_filtered.reset_index().melt(id_vars="Date", var_name="Maturity", value_name="Yield")
@@ -647,9 +713,6 @@ def plot_multiple_lines(df, start_date, end_date, required_columns, title, is_fi
         st.dataframe(format_date_column(df_filtered[required_columns]))
         return
     
-    # If too long, downsample to reduce frames
-    df_filtered = adaptive_downsampling(df_filtered)
-    
     # Initialize session state for checkboxes
     for key in required_columns:
         session_key = f"{key}_{title}"
@@ -671,23 +734,23 @@ def plot_multiple_lines(df, start_date, end_date, required_columns, title, is_fi
         with cols[idx % num_cols]:  # Cycle through available columns
             checkbox_states[col] = st.checkbox(f"{col}", key=f"{col}_{title}")
 
+    # Points per trace: the chart width, capped by the byte budget shared by the visible traces
+    n_visible = sum(checkbox_states.values())
+    target_points = min(chart_target_points(), budget_points(n_visible))
+
     # Add traces dynamically with different colors
     for idx, (col, state) in enumerate(checkbox_states.items()):
         if state:
-            fig.add_trace(go.Scatter(
-                x=df_filtered.index, 
-                y=df_filtered[col], 
-                mode="lines", 
-                name=col,
-                line=dict(color=plotly_colors[idx % len(plotly_colors)]),  # Cycle colors
-                showlegend=True # Always show legend
-            ))
+            # Each trace keeps its own minima and maxima (and skips dates it has no value for)
+            df_trace = downsample_minmax(df_filtered[[col]].dropna(), target_points)
+            fig.add_trace(line_trace(df_trace[col], col, plotly_colors[idx % len(plotly_colors)]))  # Cycle colors
 
     # Only show the plot if at least one trace is present
     if len(fig.data) > 0:
         # Update layout for better appearance
         fig.update_layout(
             xaxis_title="Date",
+            xaxis_type="date", # x values are epoch milliseconds
             height=500,
             margin=dict(t=40, b=40, l=30, r=30),
             legend_title="Legend",
@@ -718,11 +781,12 @@ def plot_or_show_table(df, column_name, start_date, end_date, frequency, is_filt
         # Not enough data points. Show DataFrame instead of plotting
         st.dataframe(format_date_column(df_filtered[[column_name]]))
     else:
-        # Plot normal line chart
+        # Plot normal line chart (long daily series keep their extremes)
+        df_plot = downsample_minmax(df_filtered[[column_name]])
         fig = go.Figure()
         fig.add_trace(go.Scatter(
-            x=df_filtered.index, 
-            y=df_filtered[column_name], 
+            x=df_plot.index, 
+            y=df_plot[column_name], 
             mode="lines", 
             name=column_name
         ))
@@ -733,3 +797,27 @@ def plot_or_show_table(df, column_name, start_date, end_date, frequency, is_filt
         )
         st.plotly_chart(fig, use_container_width=True)
 
+
+# 3.7. Plot the shape regimes of the yield curve over a period
+def plot_shape_regimes(regimes, shape_names=None):
+    """
+    regimes (pd.DataFrame): start, end, shape and days of each regime (see curve_shape_util.shape_regimes).
+    """
+    if regimes is None or regimes.empty:
+        st.warning("No data available for the selected period.")
+        return
+
+    df_plot = regimes.assign(
+        end=regimes["end"] + pd.Timedelta(days=1),  # a one-day regime still gets a visible bar
+        shape=regimes["shape"].map(lambda shape: (shape_names or {}).get(shape, shape)),
+    )
+    fig = px.timeline(df_plot, x_start="start", x_end="end", y="shape", color="shape", hover_data=["days"],
+                      color_discrete_sequence=plotly_colors)
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="",
+        height=350,
+        margin=dict(t=40, b=40, l=30, r=30),
+        showlegend=False,
+    )
+    st.plotly_chart(fig, use_container_width=True)